@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Locator Micro-Benchmark
+=======================
+Times every element of the locator registry (whatsapp.UI_ELEMENTS) with its compiled strategy
+(resource id / accessibility id / UiSelector) against the equivalent XPath the old selector lists
+used, so the cost of each strategy can be compared on a real phone.
+
+On a device the current screen is measured, open the screen you care about first:
+    python benchmark_locators.py --port 4723 --udid R58M123ABC
+Against the fake server the script walks the fake screens itself (home, search results,
+conversation, attach sheet, caption). Those numbers only reflect the fake latency profile:
+    python benchmark_locators.py --fake
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from datetime import datetime
+
+import whatsapp
+
+FAKE_CONTACTS = ["Alice", "Alice Shop", "Bob"]
+
+
+def time_locator(driver, by, value, repeats):
+    """Median find_elements time in milliseconds and how many elements matched"""
+    durations = []
+    found = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        try:
+            found = len(driver.find_elements(by, value))
+        except Exception:
+            return None, 0  # Strategy not supported by this server
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations), found
+
+
+def measure_screen(driver, screen, repeats):
+    """Time each registry alternative compiled and as XPath on the current screen"""
+    rows = []
+    for name, specs in whatsapp.UI_ELEMENTS.items():
+        for spec in specs:
+            compiled_by, compiled_value = whatsapp.compile_locator(spec)
+            compiled_ms, found = time_locator(driver, compiled_by, compiled_value, repeats)
+            xpath = whatsapp.spec_to_xpath(spec)
+            xpath_ms, xpath_found = time_locator(driver, whatsapp.AppiumBy.XPATH, xpath, repeats)
+            rows.append({
+                'screen': screen,
+                'element': name,
+                'strategy': compiled_by,
+                'locator': compiled_value,
+                'ms': round(compiled_ms, 1) if compiled_ms is not None else None,
+                'found': found,
+                'xpath': xpath,
+                'xpath_ms': round(xpath_ms, 1) if xpath_ms is not None else None,
+                'xpath_found': xpath_found,
+            })
+    return rows
+
+
+def print_rows(rows, show_misses):
+    print(f"\n{'element':<20} {'strategy':<22} {'ms':>7} {'xpath ms':>9} {'found':>6}")
+    for row in rows:
+        if not show_misses and not row['found'] and not row['xpath_found']:
+            continue
+        mismatch = "  (xpath found %d)" % row['xpath_found'] if row['found'] != row['xpath_found'] else ""
+        ms = f"{row['ms']:.1f}" if row['ms'] is not None else "n/a"
+        xpath_ms = f"{row['xpath_ms']:.1f}" if row['xpath_ms'] is not None else "n/a"
+        print(f"{row['element']:<20} {row['strategy']:<22} {ms:>7} {xpath_ms:>9} {row['found']:>6}{mismatch}")
+
+
+def set_fake_screen(device, screen):
+    """Put the fake device on one of the screens the registry elements live on"""
+    with device.lock:
+        device.reset()
+        if screen == 'search_results':
+            device.screen = 'search'
+            device.fields['search'] = FAKE_CONTACTS[0]
+            device.query_changed_at = 0
+        elif screen in ('conversation', 'attach', 'caption'):
+            device.open_chat(FAKE_CONTACTS[0])
+            device.sent_messages.append({'chat': FAKE_CONTACTS[0], 'text': "hello", 'photo': False, 'ts': time.time()})
+            device.screen = screen
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare compiled locators with XPath on a device or the fake server')
+    parser.add_argument('--port', type=int, default=4723, help='Appium server port (default: 4723)')
+    parser.add_argument('--udid', help='Device serial (adb devices)')
+    parser.add_argument('--fake', action='store_true', help='Run against an in-process fake server instead')
+    parser.add_argument('--repeats', type=int, default=5, help='Finds per locator, the median is reported')
+    parser.add_argument('--show-misses', action='store_true', help='Also list locators that matched nothing')
+    args = parser.parse_args()
+
+    server = None
+    if args.fake:
+        import fake_appium_server
+        server = fake_appium_server.start_fake_server(0, FAKE_CONTACTS, results_delay=0)
+        args.port = server.server_address[1]
+        screens = ['home', 'search_results', 'conversation', 'attach', 'caption']
+    else:
+        screens = ['current']
+
+    whatsapp.APPIUM_PORT = args.port
+    whatsapp.SELECTED_ADB_DEVICE = args.udid
+    driver = whatsapp.setup_driver()
+    rows = []
+    try:
+        for screen in screens:
+            if server is not None:
+                set_fake_screen(server.device, screen)
+            print(f"\n[LOCATORS] Screen: {screen}")
+            screen_rows = measure_screen(driver, screen, args.repeats)
+            print_rows(screen_rows, args.show_misses)
+            rows.extend(screen_rows)
+    finally:
+        driver.quit()
+        if server is not None:
+            server.shutdown()
+
+    hits = [row for row in rows if row['found'] and row['ms'] is not None and row['xpath_ms'] is not None]
+    if hits:
+        compiled_total = sum(row['ms'] for row in hits)
+        xpath_total = sum(row['xpath_ms'] for row in hits)
+        print(f"\n[LOCATORS] Matching finds: compiled {compiled_total:.0f}ms vs XPath {xpath_total:.0f}ms "
+              f"({len(hits)} locators, {xpath_total / max(compiled_total, 0.001):.1f}x)")
+
+    os.makedirs('txt', exist_ok=True)
+    report_file = f"txt/locator_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(report_file, 'w', encoding='utf-8') as file:
+        json.dump({'created': datetime.now().isoformat(timespec='seconds'), 'fake': args.fake,
+                   'repeats': args.repeats, 'rows': rows}, file, indent=2, ensure_ascii=False)
+    print(f"[LOCATORS] Report saved to {report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Throughput Benchmark (chats/hour)
+=================================
+Runs whatsapp.py end-to-end against fake_appium_server.py over synthetic chat lists and reports
+chats/hour, per-step latency (from the metrics JSONL), WebDriver commands per chat and host CPU/RSS.
+
+Each scenario runs in its own temporary folder (own txt/ and daily_photos/) so the real campaign
+store, caches and logs are never touched. whatsapp.py runs as a normal multi-device worker
+(--worker) pulling from a queue the benchmark fills beforehand.
+
+Usage:
+    python benchmark_throughput.py                              # 100 chats, text and photo
+    python benchmark_throughput.py --sizes 100,1000,10000       # long run
+    python benchmark_throughput.py --save-baseline              # store results as the new baseline
+    python benchmark_throughput.py --max-regression-pct 10      # exit 1 if chats/hour drops > 10%
+    python benchmark_throughput.py --forward                    # forward-to-many mode (--forward-via)
+    python benchmark_throughput.py --fault-every 5 --standby    # drop the session every 5 sends, warm standby failover
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import fake_appium_server
+
+try:
+    from PIL import Image  # Real JPEG for the daily photo, so the photo optimizer is exercised
+except ImportError:
+    Image = None
+
+try:
+    import resource  # Unix only, used for the worker's CPU time and peak RSS
+except ImportError:
+    resource = None
+
+WHATSAPP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'whatsapp.py')
+DEFAULT_BASELINE_FILE = "txt/benchmark_baseline.json"
+CHAT_NAME_PREFIX = "NepalWin🇳🇵"
+STAGING_CHAT = "benchstaging"  # Staging chat on the fake phone for --forward
+# Multi-line with quotes and non-Latin text, like real daily messages (every path must keep it intact)
+BENCH_MESSAGE = "Benchmark message 🎉 नमस्ते\nPromo \"today only\"\n\nSee you!"
+
+# Share of each kind of row in the synthetic list
+DEFAULT_MIX = {
+    'found': 0.70,       # One exact search result
+    'multi': 0.10,       # Several results, the exact name has to be picked
+    'not_found': 0.10,   # "No results found"
+    'phone': 0.10,       # Phone number rows (half of them are on WhatsApp)
+}
+
+
+def parse_mix(text):
+    """'found=0.7,multi=0.1,not_found=0.1,phone=0.1' -> dict"""
+    mix = dict(DEFAULT_MIX)
+    if text:
+        for part in text.split(','):
+            key, value = part.split('=')
+            mix[key.strip()] = float(value)
+    total = sum(mix.values())
+    return {key: value / total for key, value in mix.items()}
+
+
+def build_synthetic_campaign(size, mix, seed=0):
+    """Synthetic chat list plus the contacts/phones that exist on the fake phone"""
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=size)
+    entries, contacts, phones = [], [], []
+    expected = {'found': 0, 'not_found': 0}
+
+    for index, kind in enumerate(kinds, 1):
+        if kind == 'phone':
+            number = f"98{rng.randrange(10**8):08d}"
+            if rng.random() < 0.5:
+                phones.append(number)
+                expected['found'] += 1
+            else:
+                expected['not_found'] += 1
+            entries.append((index, number))
+            continue
+
+        name = f"bench{kind.replace('_', '')}{index:05d}"
+        entries.append((index, CHAT_NAME_PREFIX + name))
+        if kind == 'found':
+            contacts.append(name)
+        elif kind == 'multi':
+            contacts.extend([f"{name} Family", name, f"{name} Shop"])
+        if kind == 'not_found':
+            expected['not_found'] += 1
+        else:
+            expected['found'] += 1
+
+    rng.shuffle(contacts)
+    return entries, contacts, phones, expected
+
+
+def prepare_workdir(workdir, entries, with_photo, photo_kb):
+    """Write txt/chat_name.txt, txt/daily_message.txt and (optionally) a daily photo"""
+    os.makedirs(os.path.join(workdir, 'txt'), exist_ok=True)
+    with open(os.path.join(workdir, 'txt', 'chat_name.txt'), 'w', encoding='utf-8') as file:
+        for row, name in entries:
+            file.write(f"  - Row {row}: {name}\n")
+    with open(os.path.join(workdir, 'txt', 'daily_message.txt'), 'w', encoding='utf-8') as file:
+        file.write(BENCH_MESSAGE)
+    if with_photo:
+        os.makedirs(os.path.join(workdir, 'daily_photos'), exist_ok=True)
+        with open(os.path.join(workdir, 'daily_photos', 'benchmark.jpg'), 'wb') as file:
+            file.write(make_photo_bytes(photo_kb))
+
+
+def make_photo_bytes(photo_kb):
+    """A 12MP camera-sized JPEG close to photo_kb (random bytes without Pillow, the optimizer is off then anyway)"""
+    if Image is None:
+        return b"\xff\xd8\xff\xe0" + os.urandom(photo_kb * 1024) + b"\xff\xd9"
+    # Upscaled noise: smooth enough to compress like a photo, random so every run's file differs
+    image = Image.frombytes('RGB', (8, 6), os.urandom(8 * 6 * 3)).resize((4032, 3024), Image.BICUBIC)
+    data = b""
+    for quality in (95, 85, 75, 60, 45, 30):
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=quality)
+        data = buffer.getvalue()
+        if len(data) <= photo_kb * 1024:
+            break
+    return data
+
+
+def fill_queue(workdir, entries):
+    """Put all entries into today's campaign queue of the workdir's store"""
+    import whatsapp
+    conn = whatsapp.open_campaign_store(os.path.join(workdir, whatsapp.CAMPAIGN_STORE_FILE))
+    campaign_id = whatsapp.get_campaign_id(conn)
+    whatsapp.fill_work_queue(conn, campaign_id, entries)
+    conn.close()
+
+
+def read_queue_counts(workdir):
+    import whatsapp
+    conn = whatsapp.open_campaign_store(os.path.join(workdir, whatsapp.CAMPAIGN_STORE_FILE))
+    counts = whatsapp.get_queue_counts(conn, whatsapp.get_campaign_id(conn))
+    conn.close()
+    return counts
+
+
+def read_metric_events(workdir):
+    events = []
+    txt_dir = os.path.join(workdir, 'txt')
+    for filename in sorted(os.listdir(txt_dir)):
+        if filename.startswith('metrics_') and filename.endswith('.jsonl'):
+            with open(os.path.join(txt_dir, filename), 'r', encoding='utf-8') as file:
+                events.extend(json.loads(line) for line in file if line.strip())
+    return events
+
+
+def quantile(sorted_values, q):
+    index = min(len(sorted_values) - 1, max(math.ceil(q * len(sorted_values)) - 1, 0))
+    return sorted_values[index]
+
+
+def summarize_steps(events):
+    """step -> count / mean / p50 / p95 / p99 over all outcomes"""
+    samples = {}
+    for event in events:
+        samples.setdefault(event['step'], []).append(event['duration'])
+    summary = {}
+    for step, durations in sorted(samples.items()):
+        durations.sort()
+        summary[step] = {
+            'count': len(durations),
+            'mean': round(sum(durations) / len(durations), 4),
+            'p50': quantile(durations, 0.5),
+            'p95': quantile(durations, 0.95),
+            'p99': quantile(durations, 0.99),
+        }
+    return summary
+
+
+def run_worker(workdir, port, device_config, timeout, forward_via=None, standby=False):
+    """Run whatsapp.py as a queue worker, returns (exit code, cpu seconds, peak rss MB)"""
+    cmd = [sys.executable, '-u', WHATSAPP_SCRIPT, '--worker', '--udid', 'benchmark',
+           '--port', str(port), '--device-config', device_config]
+    if forward_via:
+        cmd += ['--forward-via', forward_via]
+    if standby:
+        cmd.append('--standby')
+    env = dict(os.environ, PYTHONIOENCODING='utf-8')
+    with open(os.path.join(workdir, 'worker.log'), 'w', encoding='utf-8') as log:
+        process = subprocess.Popen(cmd, cwd=workdir, stdout=log, stderr=subprocess.STDOUT, env=env)
+        deadline = time.time() + timeout
+        while True:
+            if resource is not None:
+                # wait4 gives the rusage of this worker only
+                pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+                if pid:
+                    process.returncode = os.waitstatus_to_exitcode(status)
+                    cpu = usage.ru_utime + usage.ru_stime
+                    return process.returncode, round(cpu, 2), round(usage.ru_maxrss / 1024, 1)
+            elif process.poll() is not None:
+                return process.returncode, None, None
+            if time.time() > deadline:
+                print(f"[BENCH] Worker timed out after {timeout}s, stopping it")
+                process.kill()
+                deadline = float('inf')
+            time.sleep(0.5)
+
+
+def start_servers(contacts, phones, width, height, latency, args):
+    """Fake server for the worker, plus a standby server for the same phone on port + offset with --standby"""
+    import whatsapp
+    while True:
+        server = fake_appium_server.start_fake_server(0, contacts, phones, width, height, latency, args.jitter_ms,
+                                                      args.results_delay_ms / 1000.0, seed=args.seed)
+        if not args.standby:
+            return [server]
+        try:
+            standby = fake_appium_server.start_fake_server(server.server_address[1] + whatsapp.STANDBY_PORT_OFFSET,
+                                                           latency=latency, jitter_ms=args.jitter_ms,
+                                                           seed=args.seed, device=server.device)
+            return [server, standby]
+        except OSError:
+            server.shutdown()  # Standby port taken, try another primary port
+
+
+def inject_faults(servers, every, layer, stop_event):
+    """Break the layer on the server holding the session after every N sent messages"""
+    next_fault = every
+    while not stop_event.wait(0.2):
+        if len(servers[0].device.sent_messages) < next_fault:
+            continue
+        next_fault += every
+        for server in servers:
+            if not server.sessions:
+                continue
+            if layer == 'uiautomator2':
+                server.uia2_crashed = True
+            else:
+                server.sessions.clear()
+        print(f"[BENCH] Injected '{layer}' fault after {len(servers[0].device.sent_messages)} sends")
+
+
+def run_scenario(size, with_photo, args):
+    name = f"{size}_{'photo' if with_photo else 'text'}{'_forward' if args.forward else ''}"
+    if args.fault_every:
+        name += f"_fault{args.fault_every}{'_standby' if args.standby else ''}"
+    entries, contacts, phones, expected = build_synthetic_campaign(size, args.mix, args.seed)
+    if args.forward:
+        contacts.append(STAGING_CHAT)
+    workdir = tempfile.mkdtemp(prefix=f"wa_bench_{name}_")
+    prepare_workdir(workdir, entries, with_photo, args.photo_kb)
+    fill_queue(workdir, entries)
+
+    width, height = (int(value) for value in args.window.lower().split('x'))
+    latency = {}
+    if args.latency_ms is not None:
+        latency['default'] = args.latency_ms
+    if args.source_latency_ms is not None:
+        latency['source'] = args.source_latency_ms
+    servers = start_servers(contacts, phones, width, height, latency, args)
+    server = servers[0]
+    port = server.server_address[1]
+    stop_faults = threading.Event()
+    if args.fault_every:
+        threading.Thread(target=inject_faults, args=(servers, args.fault_every, args.fault_layer, stop_faults),
+                         daemon=True).start()
+
+    print(f"\n[BENCH] Scenario {name}: {size} chats ({len(contacts)} contacts, {len(phones)} phones on WhatsApp), "
+          f"fake server on port {port}, workdir {workdir}")
+    start = time.time()
+    exit_code, cpu_seconds, max_rss_mb = run_worker(workdir, port, args.device_config, size * args.timeout_per_chat + 120,
+                                                    STAGING_CHAT if args.forward else None, args.standby)
+    wall_seconds = time.time() - start
+    stop_faults.set()
+    for running_server in servers:
+        running_server.shutdown()
+
+    events = read_metric_events(workdir)
+    chat_events = [event for event in events if event['step'] == 'chat_total']
+    if chat_events:
+        first_start = chat_events[0]['ts'] - chat_events[0]['duration']
+        processing_seconds = max(chat_events[-1]['ts'] - first_start, 0.001)
+    else:
+        processing_seconds = wall_seconds
+    attempted = len(chat_events)
+    command_counts = {}
+    for running_server in servers:
+        for command, count in running_server.command_counts.items():
+            command_counts[command] = command_counts.get(command, 0) + count
+    total_commands = sum(command_counts.values())
+    counts = read_queue_counts(workdir)
+    sent = server.device.sent_messages
+
+    result = {
+        'scenario': name,
+        'size': size,
+        'photo': with_photo,
+        'exit_code': exit_code,
+        'chats_attempted': attempted,
+        'queue_counts': counts,
+        'expected': expected,
+        'messages_sent': len(sent),
+        'photos_sent': sum(1 for message in sent if message['photo']),
+        'messages_garbled': sum(1 for message in sent if BENCH_MESSAGE not in message['text']),
+        'wall_seconds': round(wall_seconds, 2),
+        'processing_seconds': round(processing_seconds, 2),
+        'chats_per_hour': round(attempted / processing_seconds * 3600, 1),
+        'sent_per_hour': round(len(sent) / processing_seconds * 3600, 1),
+        'commands_total': total_commands,
+        'commands_per_chat': round(total_commands / max(attempted, 1), 1),
+        'commands_by_type': dict(sorted(command_counts.items(), key=lambda item: -item[1])),
+        'cpu_seconds': cpu_seconds,
+        'cpu_seconds_per_chat': round(cpu_seconds / max(attempted, 1), 4) if cpu_seconds is not None else None,
+        'max_rss_mb': max_rss_mb,
+        'steps': summarize_steps(events),
+    }
+
+    if args.keep_workdirs:
+        print(f"[BENCH] Kept workdir: {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def print_result(result):
+    print(f"[BENCH] {result['scenario']}: {result['chats_per_hour']:.0f} chats/hour "
+          f"({result['chats_attempted']} chats in {result['processing_seconds']:.1f}s, "
+          f"{result['messages_sent']} sent, expected found {result['expected']['found']})")
+    print(f"   - Queue: {result['queue_counts']}")
+    if result['messages_garbled']:
+        print(f"   - [WARNING] {result['messages_garbled']} sent messages don't contain the daily message as written")
+    print(f"   - WebDriver commands/chat: {result['commands_per_chat']}  "
+          f"(top: {', '.join(f'{k}={v}' for k, v in list(result['commands_by_type'].items())[:5])})")
+    if result['cpu_seconds'] is not None:
+        print(f"   - Host CPU: {result['cpu_seconds']:.1f}s ({result['cpu_seconds_per_chat'] * 1000:.0f}ms/chat), "
+              f"peak RSS: {result['max_rss_mb']:.0f}MB")
+    print(f"   - Steps (p50 / p95 / p99, seconds):")
+    for step, stats in result['steps'].items():
+        print(f"     {step:<22} n={stats['count']:<6} {stats['p50']:6.2f} / {stats['p95']:6.2f} / {stats['p99']:6.2f}")
+
+
+def compare_with_baseline(results, baseline, max_regression_pct):
+    """Return the list of scenarios whose chats/hour dropped more than allowed"""
+    regressions = []
+    baseline_by_name = {result['scenario']: result for result in baseline.get('results', [])}
+    print(f"\n[BENCH] Comparison with baseline from {baseline.get('created', '?')} (max drop {max_regression_pct}%):")
+    for result in results:
+        previous = baseline_by_name.get(result['scenario'])
+        if not previous or not previous.get('chats_per_hour'):
+            print(f"   - {result['scenario']}: no baseline")
+            continue
+        change = (result['chats_per_hour'] - previous['chats_per_hour']) / previous['chats_per_hour'] * 100
+        status = "OK"
+        if change < -max_regression_pct:
+            status = "REGRESSION"
+            regressions.append(result['scenario'])
+        print(f"   - {result['scenario']}: {previous['chats_per_hour']:.0f} -> {result['chats_per_hour']:.0f} chats/hour "
+              f"({change:+.1f}%), commands/chat {previous.get('commands_per_chat')} -> {result['commands_per_chat']} [{status}]")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end throughput benchmark against the fake Appium server')
+    parser.add_argument('--sizes', default='100', help='Comma separated list sizes (e.g. 100,1000,10000)')
+    parser.add_argument('--photo-modes', default='text,photo', help='Comma separated: text, photo')
+    parser.add_argument('--mix', type=parse_mix, default=dict(DEFAULT_MIX),
+                        help='Row mix, e.g. found=0.7,multi=0.1,not_found=0.1,phone=0.1')
+    parser.add_argument('--device-config', default='Redmi Note 13 Pro', help='DEVICE_CONFIGS entry to use')
+    parser.add_argument('--window', default='1080x2400', help='Fake screen size matching the device config')
+    parser.add_argument('--latency-ms', type=float, default=None, help='Fake per-command latency')
+    parser.add_argument('--source-latency-ms', type=float, default=None, help='Fake page_source latency')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='Fake latency jitter')
+    parser.add_argument('--results-delay-ms', type=float, default=fake_appium_server.DEFAULT_RESULTS_DELAY * 1000,
+                        help='Fake search result rendering delay')
+    parser.add_argument('--photo-kb', type=int, default=300, help='Size of the synthetic daily photo')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the synthetic list and jitter')
+    parser.add_argument('--timeout-per-chat', type=float, default=60, help='Worker timeout budget per chat (seconds)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_FILE, help=f'Baseline JSON (default: {DEFAULT_BASELINE_FILE})')
+    parser.add_argument('--save-baseline', action='store_true', help='Save this run as the new baseline')
+    parser.add_argument('--max-regression-pct', type=float, default=10,
+                        help='Fail when chats/hour drops more than this vs the baseline (default: 10)')
+    parser.add_argument('--keep-workdirs', action='store_true', help='Keep the temporary scenario folders')
+    parser.add_argument('--forward', action='store_true',
+                        help=f"Forward-to-many mode: stage the message in '{STAGING_CHAT}' and forward it in batches")
+    parser.add_argument('--fault-every', type=int, default=0,
+                        help='Break the worker session after every N sent messages (0 = never)')
+    parser.add_argument('--fault-layer', choices=['session', 'uiautomator2'], default='session',
+                        help='What --fault-every breaks (default: session)')
+    parser.add_argument('--standby', action='store_true',
+                        help='Run the worker with --standby against a second fake server for the same phone')
+    args = parser.parse_args()
+
+    results = []
+    for size in (int(value) for value in args.sizes.split(',')):
+        for mode in (value.strip() for value in args.photo_modes.split(',')):
+            result = run_scenario(size, mode == 'photo', args)
+            print_result(result)
+            results.append(result)
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'device_config': args.device_config,
+        'fake_server': {'latency_ms': args.latency_ms, 'source_latency_ms': args.source_latency_ms,
+                        'jitter_ms': args.jitter_ms, 'results_delay_ms': args.results_delay_ms},
+        'mix': args.mix,
+        'results': results,
+    }
+    os.makedirs('txt', exist_ok=True)
+    report_file = f"txt/benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(report_file, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+    print(f"\n[BENCH] Report saved to {report_file}")
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            regressions = compare_with_baseline(results, json.load(file), args.max_regression_pct)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+        print(f"[BENCH] Baseline saved to {args.baseline}")
+
+    if regressions:
+        print(f"[BENCH] FAILED: throughput regression in {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1571 @@
+#!/usr/bin/env python3
+"""
+Fake Appium / UiAutomator2 Server
+=================================
+A local stand-in for Appium + a phone running WhatsApp, so whatsapp.py can be benchmarked and
+regression-tested without a real device.
+
+It speaks the WebDriver endpoints whatsapp.py uses (find_element(s), page_source, tap, press_keycode,
+push/pull_file, get_window_size, activate_app, send_keys, execute_script 'mobile: ...') and walks a
+small WhatsApp screen model: home -> search -> results / no results -> conversation -> attach ->
+gallery -> caption -> send, plus long-press -> forward -> forward picker (search, tick, send).
+
+Screens are generated with the same resource ids / classes as the real app dumps
+(txt/whatsapp_boot_page_source_*.xml). Recorded hierarchies can replace any screen:
+    --home-xml txt/whatsapp_boot_page_source_20260113_181818.xml
+    --recordings DIR        (DIR/home.xml, DIR/search_results.xml, DIR/no_results.xml,
+                             DIR/conversation.xml, DIR/attach.xml, DIR/gallery.xml, DIR/caption.xml)
+
+Usage:
+    python fake_appium_server.py --port 4799 --latency-ms 80 --jitter-ms 40
+    python whatsapp.py --worker --udid fake --port 4799 --device-config "Redmi 9A"
+
+Extra endpoints for tests/benchmarks:
+    GET  /fake/state   current screen, sent messages, command counts
+    POST /fake/reset   reset device state and counters
+    POST /fake/fault   {"layer": "app" | "uiautomator2" | "session"} - WhatsApp leaves the foreground,
+                       the UiAutomator2 server crashes, or all sessions are dropped
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+W3C_ELEMENT_KEY = "element-6066-11e4-a52e-4f735466cecf"
+WA = "com.whatsapp:id/"
+
+# Default per-command latency profile (milliseconds)
+DEFAULT_LATENCY = {
+    'default': 60,        # Simple commands (click, keycode, window size...)
+    'source': 250,        # page_source serializes the whole hierarchy
+    'find': 120,          # find_element(s), xpath is slower than id
+    'find_xpath': 250,
+    'session': 2500,      # New session (UiAutomator2 server start)
+    'session_fast': 1000, # New session with skipServerInstallation / skipDeviceInitialization
+    'push_file': 400,
+    'pull_file': 400,
+    'shell': 150,         # 'mobile: shell' (adb shell round trip)
+    'type_char': 15,      # 'mobile: type' keyboard injection, per character
+}
+
+# Search result rendering delay after typing (seconds)
+DEFAULT_RESULTS_DELAY = 0.8
+
+# versionName reported by 'dumpsys package com.whatsapp'
+FAKE_WHATSAPP_VERSION = "2.25.10.72"
+
+# Commands Appium answers itself or over adb; everything else is proxied to the UiAutomator2
+# server and fails while it is crashed
+ADB_BACKED_HANDLERS = {'status', 'fake_state', 'fake_reset', 'fake_fault', 'new_session', 'delete_session',
+                       'execute', 'activate_app', 'current_package', 'current_activity'}
+ADB_BACKED_SCRIPTS = {'shell', 'query_app_state', 'activate_app', 'terminate_app', 'start_activity',
+                      'push_file', 'pull_file', 'get_current_package', 'get_current_activity'}
+
+# WhatsApp lets a message be forwarded to at most 5 chats at once
+FORWARD_LIMIT = 5
+
+CHAT_NAME_PREFIX_TO_REMOVE = "NepalWin🇳🇵"
+
+
+class WebDriverError(Exception):
+    """Error returned to the client as a W3C error response"""
+
+    def __init__(self, error, message, status=404):
+        super().__init__(message)
+        self.error = error
+        self.message = message
+        self.status = status
+
+
+UIA2_CRASHED_ERROR = WebDriverError(
+    'unknown error', "'POST /source' cannot be proxied to UiAutomator2 server because the instrumentation "
+    "process is not running (probably crashed). Check the server log and/or the logcat output for more details", 500)
+
+
+# ---------------------------------------------------------------------------
+# Hierarchy helpers
+# ---------------------------------------------------------------------------
+
+def parse_bounds(bounds):
+    """Parse '[l,t][r,b]' into (l, t, r, b)"""
+    match = re.match(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]", bounds or "")
+    if not match:
+        return None
+    return tuple(int(value) for value in match.groups())
+
+
+def iter_with_paths(node, path=()):
+    """Yield (node, path) in document order, path is the tuple of child indices from the root"""
+    yield node, path
+    for index, child in enumerate(list(node)):
+        yield from iter_with_paths(child, path + (index,))
+
+
+def node_at_path(root, path):
+    """Resolve a child-index path, None if the hierarchy no longer has it"""
+    node = root
+    for index in path:
+        children = list(node)
+        if index >= len(children):
+            return None
+        node = children[index]
+    return node
+
+
+class ScreenBuilder:
+    """Small helper to build UiAutomator2-style hierarchies"""
+
+    def __init__(self, width, height, package="com.whatsapp"):
+        self.width = width
+        self.height = height
+        self.package = package
+        self.root = ET.Element('hierarchy', {'index': '0', 'class': 'hierarchy', 'rotation': '0',
+                                              'width': str(width), 'height': str(height)})
+        self.frame = self.add(self.root, 'android.widget.FrameLayout', (0, 0, width, height))
+
+    def add(self, parent, class_name, bounds, resource_id=None, text="", content_desc=None,
+            clickable=False, focused=False):
+        attributes = {
+            'index': str(len(list(parent))),
+            'package': self.package,
+            'class': class_name,
+            'text': text,
+            'checkable': 'false',
+            'checked': 'false',
+            'clickable': 'true' if clickable else 'false',
+            'enabled': 'true',
+            'focusable': 'true' if clickable else 'false',
+            'focused': 'true' if focused else 'false',
+            'long-clickable': 'false',
+            'password': 'false',
+            'scrollable': 'false',
+            'selected': 'false',
+            'bounds': "[%d,%d][%d,%d]" % bounds,
+            'displayed': 'true',
+        }
+        if resource_id:
+            attributes['resource-id'] = resource_id if ':' in resource_id else WA + resource_id
+        if content_desc is not None:
+            attributes['content-desc'] = content_desc
+        return ET.SubElement(parent, class_name, attributes)
+
+
+# ---------------------------------------------------------------------------
+# Minimal XPath 1.0 subset (the forms used by whatsapp.py)
+# ---------------------------------------------------------------------------
+
+def split_top_level(expr, separator):
+    """Split on a separator that is outside quotes, brackets and parentheses"""
+    parts, depth, quote, current = [], 0, None, ""
+    i = 0
+    while i < len(expr):
+        char = expr[i]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in ("'", '"'):
+            quote = char
+        elif char in "[(":
+            depth += 1
+        elif char in "])":
+            depth -= 1
+        elif depth == 0 and expr.startswith(separator, i):
+            parts.append(current)
+            current = ""
+            i += len(separator)
+            continue
+        current += char
+        i += 1
+    parts.append(current)
+    return parts
+
+
+def parse_xpath_steps(path):
+    """Parse '//a[@x]/b' style paths into (relative, [(axis, nodetest, [predicates])])"""
+    path = path.strip()
+    relative = path.startswith('.')
+    if relative:
+        path = path[1:]
+    steps = []
+    i = 0
+    while i < len(path):
+        if path.startswith('//', i):
+            axis, i = 'descendant', i + 2
+        elif path.startswith('/', i):
+            axis, i = 'child', i + 1
+        else:
+            axis = 'child'
+        start = i
+        while i < len(path) and path[i] not in '[/':
+            i += 1
+        nodetest = path[start:i].strip()
+        predicates = []
+        while i < len(path) and path[i] == '[':
+            depth, quote, start = 0, None, i + 1
+            while i < len(path):
+                char = path[i]
+                if quote:
+                    if char == quote:
+                        quote = None
+                elif char in ("'", '"'):
+                    quote = char
+                elif char == '[':
+                    depth += 1
+                elif char == ']':
+                    depth -= 1
+                    if depth == 0:
+                        break
+                i += 1
+            predicates.append(path[start:i])
+            i += 1
+        steps.append((axis, nodetest, predicates))
+    return relative, steps
+
+
+XPATH_TOKEN = re.compile(r"""\s*(?:(!=|=|\(|\)|,)|('[^']*'|"[^"]*")|(@[\w:-]+)|(\d+(?:\.\d+)?)|(text\(\))|(and|or)\b|([\w.:-]+(?=\s*\()))""")
+
+
+def tokenize_predicate(expr):
+    tokens, pos = [], 0
+    expr = expr.strip()
+    while pos < len(expr):
+        match = XPATH_TOKEN.match(expr, pos)
+        if not match or match.end() == pos:
+            raise WebDriverError('invalid selector', f"Unsupported XPath predicate: {expr}", 400)
+        op, string, attr, number, text_func, keyword, func = match.groups()
+        if op:
+            tokens.append(('op', op))
+        elif string:
+            tokens.append(('str', string[1:-1]))
+        elif attr:
+            tokens.append(('attr', attr[1:]))
+        elif number:
+            tokens.append(('num', number))
+        elif func:
+            tokens.append(('func', func))
+        elif keyword:
+            tokens.append(('op', keyword))
+        elif text_func:
+            tokens.append(('attr', 'text'))
+        pos = match.end()
+    return tokens
+
+
+class PredicateParser:
+    """Recursive descent parser for XPath predicates -> callable(node)"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        expr = self.parse_or()
+        if self.pos != len(self.tokens):
+            raise WebDriverError('invalid selector', "Trailing tokens in XPath predicate", 400)
+        return expr
+
+    def parse_or(self):
+        left = self.parse_and()
+        while self.peek() == ('op', 'or'):
+            self.take()
+            right = self.parse_and()
+            left = (lambda a, b: lambda node: truthy(a(node)) or truthy(b(node)))(left, right)
+        return left
+
+    def parse_and(self):
+        left = self.parse_comparison()
+        while self.peek() == ('op', 'and'):
+            self.take()
+            right = self.parse_comparison()
+            left = (lambda a, b: lambda node: truthy(a(node)) and truthy(b(node)))(left, right)
+        return left
+
+    def parse_comparison(self):
+        left = self.parse_value()
+        if self.peek() in (('op', '='), ('op', '!=')):
+            operator = self.take()[1]
+            right = self.parse_value()
+            if operator == '=':
+                return (lambda a, b: lambda node: str(a(node)) == str(b(node)))(left, right)
+            return (lambda a, b: lambda node: str(a(node)) != str(b(node)))(left, right)
+        return left
+
+    def parse_value(self):
+        kind, value = self.take()
+        if kind == 'op' and value == '(':
+            expr = self.parse_or()
+            self.take()  # ')'
+            return expr
+        if kind == 'str':
+            return lambda node, value=value: value
+        if kind == 'num':
+            return lambda node, value=value: value
+        if kind == 'attr':
+            return lambda node, value=value: node.get(value, '')
+        if kind == 'func':
+            self.take()  # '('
+            args = []
+            while self.peek() != ('op', ')'):
+                args.append(self.parse_or())
+                if self.peek() == ('op', ','):
+                    self.take()
+            self.take()  # ')'
+            return make_xpath_function(value, args)
+        raise WebDriverError('invalid selector', f"Unexpected token {value!r} in XPath predicate", 400)
+
+
+def truthy(value):
+    return bool(value) and value != 'false'
+
+
+def make_xpath_function(name, args):
+    if name == 'contains':
+        return lambda node: str(args[1](node)) in str(args[0](node))
+    if name == 'starts-with':
+        return lambda node: str(args[0](node)).startswith(str(args[1](node)))
+    if name == 'translate':
+        def translate(node):
+            source, from_chars, to_chars = (str(arg(node)) for arg in args)
+            table = {ord(c): (to_chars[i] if i < len(to_chars) else None) for i, c in enumerate(from_chars)}
+            return source.translate(table)
+        return translate
+    if name == 'normalize-space':
+        return lambda node: " ".join(str(args[0](node)).split())
+    if name == 'not':
+        return lambda node: not truthy(args[0](node))
+    if name == 'text':
+        return lambda node: node.get('text', '')
+    raise WebDriverError('invalid selector', f"Unsupported XPath function: {name}()", 400)
+
+
+def xpath_find(document, context, expr):
+    """Evaluate a union of paths, returns matching nodes in document order"""
+    matched = []
+    for path in split_top_level(expr, '|'):
+        relative, steps = parse_xpath_steps(path)
+        current = [context if relative else document]
+        for axis, nodetest, predicates in steps:
+            compiled = []
+            for predicate in predicates:
+                if predicate.strip().isdigit():
+                    compiled.append(int(predicate.strip()))
+                else:
+                    compiled.append(PredicateParser(tokenize_predicate(predicate)).parse())
+            next_nodes = []
+            for node in current:
+                if axis == 'descendant':
+                    candidates = [n for n in node.iter() if n is not node]
+                else:
+                    candidates = list(node)
+                if nodetest not in ('*', 'node()'):
+                    candidates = [n for n in candidates if n.tag == nodetest or n.get('class') == nodetest]
+                for predicate in compiled:
+                    if isinstance(predicate, int):
+                        candidates = candidates[predicate - 1:predicate]
+                    else:
+                        candidates = [n for n in candidates if truthy(predicate(n))]
+                next_nodes.extend(candidates)
+            current = next_nodes
+        matched.extend(current)
+    order = {id(node): index for index, node in enumerate(document.iter())}
+    unique = {id(node): node for node in matched}
+    return sorted(unique.values(), key=lambda node: order.get(id(node), 0))
+
+
+UISELECTOR_CALL = re.compile(r"\.(\w+)\(\s*(\"(?:[^\"\\]|\\.)*\"|\d+|true|false)\s*\)")
+
+
+def uiselector_find(root, selector):
+    """Evaluate a 'new UiSelector()...' chain"""
+    checks = []
+    instance = None
+    for method, raw_arg in UISELECTOR_CALL.findall(selector):
+        arg = json.loads(raw_arg) if raw_arg.startswith('"') else raw_arg
+        attribute = {'resourceId': 'resource-id', 'resourceIdMatches': 'resource-id', 'text': 'text',
+                     'textContains': 'text', 'textStartsWith': 'text', 'textMatches': 'text',
+                     'className': 'class', 'classNameMatches': 'class', 'description': 'content-desc',
+                     'descriptionContains': 'content-desc', 'descriptionMatches': 'content-desc',
+                     'descriptionStartsWith': 'content-desc', 'clickable': 'clickable',
+                     'enabled': 'enabled'}.get(method)
+        if method == 'instance':
+            instance = int(arg)
+        elif attribute is None:
+            raise WebDriverError('invalid selector', f"Unsupported UiSelector method: {method}", 400)
+        elif method.endswith('Matches'):
+            checks.append(lambda node, a=attribute, v=arg: re.fullmatch(v, node.get(a, '')) is not None)
+        elif method.endswith('Contains'):
+            checks.append(lambda node, a=attribute, v=arg: v in node.get(a, ''))
+        elif method.endswith('StartsWith'):
+            checks.append(lambda node, a=attribute, v=arg: node.get(a, '').startswith(v))
+        else:
+            checks.append(lambda node, a=attribute, v=str(arg): node.get(a, '') == v)
+    nodes = [node for node in root.iter() if node.tag != 'hierarchy' and all(check(node) for check in checks)]
+    if instance is not None:
+        nodes = nodes[instance:instance + 1]
+    return nodes
+
+
+def find_nodes(document, context, using, value):
+    """Find nodes with any supported locator strategy"""
+    if using == 'xpath':
+        return xpath_find(document, context, value)
+    if using == '-android uiautomator':
+        return uiselector_find(context, value)
+    candidates = [node for node in context.iter() if node is not context and node.tag != 'document']
+    if using == 'id':
+        full_id = value if ':id/' in value else WA + value
+        return [node for node in candidates if node.get('resource-id') == full_id]
+    if using == 'accessibility id':
+        return [node for node in candidates if node.get('content-desc') == value]
+    if using == 'class name':
+        return [node for node in candidates if node.get('class') == value]
+    if using == 'css selector':
+        match = re.fullmatch(r'\[id="(.+)"\]', value) or re.fullmatch(r'#(.+)', value)
+        if match:
+            return find_nodes(document, context, 'id', match.group(1))
+    raise WebDriverError('invalid selector', f"Unsupported locator strategy: {using}", 400)
+
+
+# ---------------------------------------------------------------------------
+# Device / WhatsApp screen model
+# ---------------------------------------------------------------------------
+
+class FakeWhatsAppDevice:
+    """State machine for the WhatsApp screens used by whatsapp.py"""
+
+    def __init__(self, contacts, phones, width=1080, height=2400, results_delay=DEFAULT_RESULTS_DELAY,
+                 recordings=None):
+        self.contacts = list(contacts)
+        self.phones = set(phones)
+        self.width = width
+        self.height = height
+        self.results_delay = results_delay
+        self.recordings = recordings or {}
+        self.app_version = FAKE_WHATSAPP_VERSION
+        self.stay_on_while_plugged_in = "0"
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.screen = 'home'
+            self.back_stack = []
+            self.query = ""
+            self.query_changed_at = 0
+            self.chat = None
+            self.fields = {'search': "", 'entry': "", 'caption': "", 'picker': ""}
+            self.focused_field = None
+            self.selected_message = None
+            self.forward_message = None
+            self.picker_search = False
+            self.picker_selected = []
+            self.message_nodes = {}
+            self.sent_messages = []
+            self.files = {}
+            self.clipboard = ""
+            self.events = []
+
+    # -- navigation -------------------------------------------------------
+
+    def go(self, screen, push=True):
+        if push:
+            self.back_stack.append(self.screen)
+        self.screen = screen
+        self.focused_field = {'search': 'search', 'caption': None, 'conversation': None}.get(screen)
+
+    def back(self):
+        if self.screen == 'conversation' and self.selected_message is not None:
+            self.selected_message = None  # first BACK only clears the message selection
+            return
+        if self.screen == 'forward_picker' and self.picker_search:
+            self.picker_search = False
+            self.fields['picker'] = ""
+            self.focused_field = None
+            return
+        if self.screen == 'search' and self.fields['search']:
+            # Like WhatsApp: first BACK closes the keyboard/search, returning home
+            self.fields['search'] = ""
+        if self.back_stack:
+            self.screen = self.back_stack.pop()
+        elif self.screen != 'launcher':
+            self.screen = 'launcher'
+        if self.screen in ('home', 'launcher'):
+            self.back_stack = []
+            self.fields['search'] = ""
+        self.focused_field = 'search' if self.screen == 'search' else None
+
+    def screen_key(self):
+        """Identity of the current screen, elements found on another screen are stale"""
+        return f"{self.screen}:{self.chat or ''}"
+
+    def search_matches(self, field='search'):
+        query = self.fields[field].strip().lower()
+        if not query or time.time() - self.query_changed_at < self.results_delay:
+            return None
+        return [name for name in self.contacts if query in name.lower()]
+
+    def set_field(self, field, text):
+        self.fields[field] = text
+        if field in ('search', 'picker'):
+            self.query_changed_at = time.time()
+
+    def type_text(self, text):
+        """'mobile: type' / keyboard input into the focused field"""
+        field = self.focused_field or {'search': 'search', 'forward_picker': 'picker'}.get(self.screen)
+        if field is None and self.screen == 'conversation':
+            field = 'entry'
+        if field is None:
+            return
+        self.set_field(field, self.fields[field] + text)
+
+    def open_chat(self, name):
+        self.chat = name
+        self.fields['entry'] = ""
+        self.go('conversation')
+
+    def send(self, with_photo):
+        text = self.fields['caption'] if with_photo else self.fields['entry']
+        self.sent_messages.append({'chat': self.chat, 'text': text, 'photo': with_photo, 'ts': time.time()})
+        self.fields['caption'] = ""
+        self.fields['entry'] = ""
+
+    def forward(self):
+        """Forward picker send: copy the selected message to every ticked chat"""
+        message = self.forward_message or {'text': "", 'photo': False}
+        recipients = list(self.picker_selected)
+        for name in recipients:
+            self.sent_messages.append({'chat': name, 'text': message['text'], 'photo': message['photo'],
+                                       'ts': time.time(), 'forwarded': True})
+        self.picker_selected = []
+        self.picker_search = False
+        self.fields['picker'] = ""
+        if len(recipients) == 1:
+            # WhatsApp opens the chat when forwarding to a single recipient
+            self.chat = recipients[0]
+            self.back_stack = ['home']
+            self.screen = 'conversation'
+        else:
+            self.back()
+        self.focused_field = None
+
+    def start_view_intent(self, uri):
+        """whatsapp://send?phone=... deep link"""
+        match = re.search(r"phone=(\d+)", uri or "")
+        phone = match.group(1) if match else None
+        if self.screen == 'launcher':
+            self.screen = 'home'
+        if self.is_whatsapp_phone(phone):
+            self.back_stack = ['home']
+            self.chat = phone
+            self.fields['entry'] = ""
+            self.screen = 'conversation'
+        else:
+            self.go('dialog')
+
+    def is_whatsapp_phone(self, phone):
+        return bool(phone) and (phone in self.phones or phone[-10:] in self.phones)
+
+    def resolve_media_uri(self, uri):
+        """content://media/.../<id> or file:// URI -> pushed file path"""
+        if uri.startswith('file://'):
+            path = uri[len('file://'):]
+            return path if path in self.files else None
+        match = re.search(r"/media/(\d+)$", uri)
+        if match:
+            paths = list(self.files)
+            index = int(match.group(1)) - 1
+            return paths[index] if 0 <= index < len(paths) else None
+        return None
+
+    def media_id(self, path):
+        return list(self.files).index(path) + 1 if path in self.files else None
+
+    def start_send_intent(self, extras):
+        """ACTION_SEND: with a jid WhatsApp opens that chat's media preview, caption from EXTRA_TEXT"""
+        values = {key: value for _, key, value in extras}
+        media_path = self.resolve_media_uri(values.get('android.intent.extra.STREAM', ''))
+        phone = values.get('jid', '').split('@')[0]
+        self.events.append(('send_intent', phone, media_path))
+        if media_path is None:
+            return
+        if self.screen == 'launcher':
+            self.screen = 'home'
+        if phone:
+            if not self.is_whatsapp_phone(phone):
+                return  # WhatsApp only shows a toast
+            if self.screen != 'conversation' or self.chat != phone:
+                self.back_stack = ['home', 'conversation']
+            else:
+                self.back_stack.append('conversation')
+            self.chat = phone
+            # Like 'am start' through the device shell: line breaks and quotes don't survive
+            self.fields['caption'] = re.sub(r'\s+', ' ', values.get('android.intent.extra.TEXT', '')).replace('"', '')
+            self.screen = 'caption'
+            self.focused_field = None
+
+    # -- actions ----------------------------------------------------------
+
+    def activate(self, node, long_press=False):
+        """Click/tap on a node: walk up to the first ancestor with a known action"""
+        parents = {child: parent for parent in self.current_root.iter() for child in parent}
+        while node is not None:
+            if self.activate_single(node, long_press):
+                return True
+            node = parents.get(node)
+        return False
+
+    def activate_single(self, node, long_press):
+        resource_id = (node.get('resource-id') or '').replace(WA, '')
+        text = node.get('text') or ''
+        if self.screen == 'home' and resource_id in ('my_search_bar', 'search_bar_inner_layout', 'search_icon',
+                                                       'search_text', 'menuitem_search'):
+            self.set_field('search', "")
+            self.go('search')
+            return True
+        if self.screen == 'search':
+            if resource_id == 'contact_row_container':
+                names = [n.get('text') for n in node.iter() if 'contact_name' in (n.get('resource-id') or '')]
+                self.open_chat(names[0] if names else "Unknown")
+                return True
+            if resource_id == 'search_src_text':
+                self.focused_field = 'search'
+                return True
+        if self.screen == 'conversation':
+            if long_press and node in self.message_nodes:
+                self.selected_message = self.message_nodes[node]
+                return True
+            if self.selected_message is not None and resource_id == 'menuitem_forward':
+                self.forward_message = self.selected_message
+                self.selected_message = None
+                self.picker_selected = []
+                self.picker_search = False
+                self.fields['picker'] = ""
+                self.go('forward_picker')
+                return True
+            if resource_id == 'attach':
+                self.go('attach')
+                return True
+            if resource_id == 'entry':
+                self.focused_field = 'entry'
+                return True
+            if resource_id == 'send':
+                self.send(with_photo=False)
+                return True
+        if self.screen == 'forward_picker':
+            if resource_id == 'menuitem_search':
+                self.picker_search = True
+                self.set_field('picker', "")
+                self.focused_field = 'picker'
+                return True
+            if resource_id == 'search_src_text':
+                self.focused_field = 'picker'
+                return True
+            if resource_id == 'contactpicker_row':
+                names = [n.get('text') for n in node.iter() if n.get('resource-id') == WA + 'contactpicker_row_name']
+                name = names[0] if names else None
+                if name in self.picker_selected:
+                    self.picker_selected.remove(name)
+                elif name and len(self.picker_selected) < FORWARD_LIMIT:
+                    self.picker_selected.append(name)
+                else:
+                    self.events.append(('forward_limit', name))
+                return True
+            if resource_id == 'send' and self.picker_selected:
+                self.forward()
+                return True
+        if self.screen == 'attach' and (text == 'Gallery' or resource_id == 'pickfiletype_gallery'):
+            self.go('gallery')
+            return True
+        if self.screen == 'gallery' and resource_id == 'gallery_thumb':
+            self.screen = 'caption'
+            self.focused_field = None
+            return True
+        if self.screen == 'caption':
+            if resource_id == 'caption':
+                self.focused_field = 'caption'
+                return True
+            if resource_id == 'send':
+                self.send(with_photo=True)
+                # Back to the conversation the photo was sent from
+                while self.back_stack and self.screen != 'conversation':
+                    self.screen = self.back_stack.pop()
+                self.screen = 'conversation'
+                self.focused_field = None
+                return True
+        if self.screen == 'dialog' and resource_id in ('android:id/button1', 'android:id/button2'):
+            self.back()
+            return True
+        return False
+
+    def tap(self, x, y, long_press=False):
+        """Hit-test the deepest node containing the point and activate it"""
+        root = self.build_root()
+        hit = None
+        for node in root.iter():
+            bounds = parse_bounds(node.get('bounds'))
+            if bounds and bounds[0] <= x < bounds[2] and bounds[1] <= y < bounds[3]:
+                hit = node  # document order: later (deeper/on top) nodes win
+        self.events.append(('tap', x, y, self.screen))
+        if hit is not None:
+            self.activate(hit, long_press)
+
+    def press_keycode(self, keycode):
+        self.events.append(('keycode', keycode, self.screen))
+        if keycode == 4:       # BACK
+            self.back()
+        elif keycode == 3:     # HOME
+            self.screen = 'launcher'
+            self.back_stack = []
+
+    def shell(self, command, args):
+        """Tiny subset of the device shell (file checks used by whatsapp.py)"""
+        paths = [arg for arg in args if arg.startswith('/')]
+        missing = [path for path in paths if path not in self.files]
+        if command in ('sha256sum', 'stat', 'ls') and missing:
+            raise WebDriverError('unknown error', f"{command}: {missing[0]}: No such file or directory", 500)
+        if command == 'sha256sum':
+            return "".join(f"{hashlib.sha256(self.files[path]).hexdigest()}  {path}\n" for path in paths)
+        if command == 'stat':
+            return "".join(f"{len(self.files[path])}\n" for path in paths)
+        if command == 'ls':
+            return "".join(f"{path}\n" for path in paths)
+        if command == 'content' and args[:1] == ['query']:
+            where = args[args.index('--where') + 1].strip('"') if '--where' in args else ''
+            match = re.search(r"_data='([^']+)'", where)
+            media_id = self.media_id(match.group(1)) if match else None
+            return f"Row: 0 _id={media_id}\n" if media_id else "No result found.\n"
+        if command == 'content' and args[:1] == ['call']:
+            return "Result: Bundle[{}]\n"
+        if command == 'getprop' and args == ['ro.build.version.sdk']:
+            return "34\n"
+        if command == 'dumpsys' and args[:1] == ['package']:
+            return f"Packages:\n  Package [com.whatsapp]\n    versionCode=251072000 minSdk=21 targetSdk=34\n    versionName={self.app_version}\n"
+        if command == 'am' and args[:3] == ['broadcast', '-a', 'ADB_INPUT_B64'] and '--es' in args:
+            # ADBKeyBoard: the IME commits the decoded text into the focused field
+            self.type_text(base64.b64decode(args[args.index('--es') + 2]).decode('utf-8'))
+            return "Broadcasting: Intent { act=ADB_INPUT_B64 }\nBroadcast completed: result=0\n"
+        if command == 'am' and args[:1] == ['broadcast']:
+            return "Broadcasting: Intent { act=%s }\nBroadcast completed: result=0\n" % (args[2] if len(args) > 2 else '')
+        if command == 'settings' and args[1:3] == ['global', 'stay_on_while_plugged_in']:
+            if args[0] == 'put':
+                self.stay_on_while_plugged_in = args[3]
+                return ""
+            return f"{self.stay_on_while_plugged_in}\n"
+        if command == 'svc' and args[:2] == ['power', 'stayon']:
+            self.stay_on_while_plugged_in = {'true': "7", 'usb': "2", 'ac': "1", 'wireless': "4"}.get(args[2], "0")
+            return ""
+        if command == 'touch':
+            for path in paths:
+                # Re-inserted: newest file, like a fresh mtime in the gallery's date order
+                self.files[path] = self.files.pop(path, b"")
+            return ""
+        if command == 'rm':
+            for path in paths:
+                self.files.pop(path, None)
+            return ""
+        raise WebDriverError('unknown error', f"/system/bin/sh: {command}: not found in the fake device", 500)
+
+    # -- hierarchy --------------------------------------------------------
+
+    def build_root(self):
+        """Current hierarchy as an ElementTree root (recorded screens win over generated ones)"""
+        recording_key = self.screen
+        if self.screen == 'search':
+            matches = self.search_matches()
+            recording_key = 'search_results' if matches else ('no_results' if matches == [] else 'search')
+        if recording_key in self.recordings:
+            root = ET.fromstring(self.recordings[recording_key])
+        else:
+            root = getattr(self, f"build_{self.screen}")()
+        self.current_root = root
+        return root
+
+    def page_source(self):
+        root = self.build_root()
+        return "<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>\r\n" + ET.tostring(root, encoding='unicode')
+
+    def build_launcher(self):
+        builder = ScreenBuilder(self.width, self.height, package="com.miui.home")
+        builder.add(builder.frame, 'android.widget.TextView', (100, 600, 300, 800), text="WhatsApp",
+                    content_desc="WhatsApp", clickable=True)
+        return builder.root
+
+    def build_home(self):
+        w, h = self.width, self.height
+        b = ScreenBuilder(w, h)
+        toolbar = b.add(b.frame, 'android.view.ViewGroup', (0, int(h * 0.04), w, int(h * 0.08)), 'toolbar')
+        b.add(toolbar, 'android.widget.ImageView', (40, int(h * 0.045), w // 2, int(h * 0.075)), 'toolbar_logo',
+              content_desc="WhatsApp")
+        b.add(toolbar, 'android.widget.ImageButton', (w - 200, int(h * 0.045), w - 100, int(h * 0.075)),
+              'menuitem_camera', content_desc="Camera", clickable=True)
+        bar = b.add(b.frame, 'android.widget.FrameLayout', (0, int(h * 0.08), w, int(h * 0.17)), 'my_search_bar',
+                    clickable=True)
+        inner = b.add(bar, 'androidx.appcompat.widget.LinearLayoutCompat', (30, int(h * 0.08), w - 30, int(h * 0.17)),
+                      'search_bar_inner_layout')
+        b.add(inner, 'android.widget.TextView', (180, int(h * 0.1), w - 30, int(h * 0.15)), 'search_text', text="Search…")
+        chat_list = b.add(b.frame, 'androidx.recyclerview.widget.RecyclerView', (0, int(h * 0.17), w, int(h * 0.9)),
+                          'android:id/list')
+        row_height = int(h * 0.085)
+        for index, name in enumerate(self.contacts[:8]):
+            top = int(h * 0.17) + index * row_height
+            row = b.add(chat_list, 'android.widget.RelativeLayout', (0, top, w, top + row_height),
+                        'contact_row_container', clickable=True)
+            b.add(row, 'android.widget.TextView', (200, top + 20, w - 200, top + row_height // 2),
+                  'conversations_row_contact_name', text=name)
+        b.add(b.frame, 'android.widget.ImageButton', (w - 200, int(h * 0.82), w - 40, int(h * 0.89)), 'fab',
+              content_desc="New chat", clickable=True)
+        return b.root
+
+    def build_search(self):
+        """Inline search of the home screen: the query box replaces the search bar, the fab stays"""
+        w, h = self.width, self.height
+        b = ScreenBuilder(w, h)
+        header = b.add(b.frame, 'android.widget.LinearLayout', (0, int(h * 0.08), w, int(h * 0.17)), 'search_holder')
+        b.add(header, 'android.widget.EditText', (30, int(h * 0.08), w - 30, int(h * 0.17)), 'search_src_text',
+              text=self.fields['search'], clickable=True, focused=self.focused_field == 'search')
+        results = b.add(b.frame, 'androidx.recyclerview.widget.RecyclerView', (0, int(h * 0.17), w, h),
+                        'result_list')
+        matches = self.search_matches()
+        if matches == []:
+            b.add(results, 'android.widget.TextView', (0, int(h * 0.2), w, int(h * 0.25)), 'search_no_matches',
+                  text=f"No results found for '{self.fields['search']}'")
+        elif matches:
+            top = int(h * 0.17)
+            b.add(results, 'android.widget.TextView', (40, top, w, top + 80), 'title', text="Chats")
+            top += 80
+            row_height = int(h * 0.085)
+            for name in matches[:10]:
+                if top + row_height > int(h * 0.8):
+                    break
+                row = b.add(results, 'android.widget.RelativeLayout', (0, top, w, top + row_height),
+                            'contact_row_container', clickable=True)
+                b.add(row, 'android.widget.TextView', (200, top + 20, w - 200, top + row_height // 2),
+                      'conversations_row_contact_name', text=name)
+                top += row_height
+        b.add(b.frame, 'android.widget.ImageButton', (w - 200, int(h * 0.82), w - 40, int(h * 0.89)), 'fab',
+              content_desc="New chat", clickable=True)
+        return b.root
+
+    def build_conversation(self):
+        w, h = self.width, self.height
+        b = ScreenBuilder(w, h)
+        toolbar = b.add(b.frame, 'android.view.ViewGroup', (0, int(h * 0.04), w, int(h * 0.1)), 'toolbar')
+        b.add(toolbar, 'android.widget.TextView', (160, int(h * 0.05), w - 300, int(h * 0.09)),
+              'conversation_contact_name', text=self.chat or "")
+        if self.selected_message is not None:
+            # Selection mode replaces the chat toolbar with the message actions
+            b.add(toolbar, 'android.widget.TextView', (160, int(h * 0.05), 300, int(h * 0.09)), text="1")
+            for index, action in enumerate(("Reply", "Star", "Delete", "Forward")):
+                left = w - 480 + index * 120
+                b.add(toolbar, 'android.widget.ImageButton', (left, int(h * 0.05), left + 110, int(h * 0.09)),
+                      f'menuitem_{action.lower()}', content_desc=action, clickable=True)
+        messages = b.add(b.frame, 'android.widget.ListView', (0, int(h * 0.1), w, int(h * 0.9)), 'android:id/list')
+        chat_messages = [m for m in self.sent_messages if m['chat'] == self.chat][-5:]
+        self.message_nodes = {}
+        for index, message in enumerate(chat_messages):
+            top = int(h * 0.12) + index * 160
+            bubble = b.add(messages, 'android.widget.LinearLayout', (200, top, w - 40, top + 140))
+            text_top = top
+            if message['photo']:
+                self.message_nodes[b.add(bubble, 'android.widget.ImageView', (200, top, w - 40, top + 90),
+                                         'image')] = message
+                text_top = top + 90
+            self.message_nodes[b.add(bubble, 'android.widget.TextView', (200, text_top, w - 40, top + 140),
+                                     'message_text', text=message['text'])] = message
+            self.message_nodes[bubble] = message
+        bottom = b.add(b.frame, 'android.widget.LinearLayout', (0, int(h * 0.92), w, h), 'footer')
+        b.add(bottom, 'android.widget.EditText', (40, int(h * 0.925), w - 400, int(h * 0.985)), 'entry',
+              text=self.fields['entry'], clickable=True, focused=self.focused_field == 'entry')
+        b.add(bottom, 'android.widget.ImageButton', (w - 400, int(h * 0.925), w - 280, int(h * 0.985)), 'attach',
+              content_desc="Attach", clickable=True)
+        b.add(bottom, 'android.widget.ImageButton', (w - 160, int(h * 0.925), w - 20, int(h * 0.985)), 'send',
+              content_desc="Send", clickable=True)
+        return b.root
+
+    def build_attach(self):
+        root = self.build_conversation()
+        w, h = self.width, self.height
+        sheet = ET.SubElement(root[0], 'android.widget.LinearLayout', {
+            'class': 'android.widget.LinearLayout', 'package': 'com.whatsapp', 'text': '',
+            'resource-id': WA + 'attach_sheet', 'bounds': "[0,%d][%d,%d]" % (int(h * 0.6), w, int(h * 0.9)),
+            'displayed': 'true', 'clickable': 'false', 'enabled': 'true'})
+        builder = ScreenBuilder(w, h)
+        for index, label in enumerate(("Document", "Camera", "Gallery", "Audio")):
+            left = 40 + index * (w - 80) // 4
+            item = builder.add(sheet, 'android.widget.LinearLayout',
+                               (left, int(h * 0.65), left + (w - 80) // 4, int(h * 0.75)),
+                               f'pickfiletype_{label.lower()}', clickable=True)
+            builder.add(item, 'android.widget.TextView', (left, int(h * 0.72), left + (w - 80) // 4, int(h * 0.75)),
+                        text=label)
+        return root
+
+    def build_gallery(self):
+        w, h = self.width, self.height
+        b = ScreenBuilder(w, h)
+        b.add(b.frame, 'android.widget.TextView', (40, int(h * 0.05), w, int(h * 0.09)), text="Recents")
+        grid = b.add(b.frame, 'androidx.recyclerview.widget.RecyclerView', (0, int(h * 0.1), w, h), 'grid')
+        size = w // 3
+        top = int(h * 0.1)
+        index = 0
+        while top < h:
+            for column in range(3):
+                b.add(grid, 'android.widget.ImageView', (column * size, top, (column + 1) * size, min(top + size, h)),
+                      'gallery_thumb', content_desc=f"Photo {index + 1}", clickable=True)
+                index += 1
+            top += size
+        return b.root
+
+    def build_caption(self):
+        w, h = self.width, self.height
+        b = ScreenBuilder(w, h)
+        b.add(b.frame, 'android.widget.ImageView', (0, int(h * 0.1), w, int(h * 0.85)), 'photo_view')
+        bar = b.add(b.frame, 'android.widget.LinearLayout', (0, h - 170, w, h), 'caption_bar')
+        b.add(bar, 'android.widget.EditText', (0, h - 170, w - 160, h), 'caption', text=self.fields['caption'],
+              clickable=True, focused=self.focused_field == 'caption')
+        b.add(bar, 'android.widget.ImageButton', (w - 160, h - 170, w, h), 'send', content_desc="Send",
+              clickable=True)
+        return b.root
+
+    def build_forward_picker(self):
+        w, h = self.width, self.height
+        b = ScreenBuilder(w, h)
+        toolbar = b.add(b.frame, 'android.view.ViewGroup', (0, int(h * 0.04), w, int(h * 0.1)), 'toolbar')
+        if self.picker_search:
+            b.add(toolbar, 'android.widget.EditText', (30, int(h * 0.045), w - 30, int(h * 0.095)), 'search_src_text',
+                  text=self.fields['picker'], clickable=True, focused=self.focused_field == 'picker')
+        else:
+            b.add(toolbar, 'android.widget.TextView', (160, int(h * 0.05), w - 300, int(h * 0.09)), text="Forward to…")
+            b.add(toolbar, 'android.widget.ImageButton', (w - 200, int(h * 0.05), w - 100, int(h * 0.09)),
+                  'menuitem_search', content_desc="Search", clickable=True)
+        rows = b.add(b.frame, 'androidx.recyclerview.widget.RecyclerView', (0, int(h * 0.1), w, int(h * 0.88)),
+                     'android:id/list')
+        names = self.search_matches('picker') if self.fields['picker'].strip() else self.contacts
+        if names == []:
+            b.add(rows, 'android.widget.TextView', (0, int(h * 0.12), w, int(h * 0.17)), 'search_no_matches',
+                  text=f"No results found for '{self.fields['picker']}'")
+        top = int(h * 0.1)
+        row_height = int(h * 0.085)
+        for name in (names or [])[:8]:
+            row = b.add(rows, 'android.widget.RelativeLayout', (0, top, w, top + row_height), 'contactpicker_row',
+                        clickable=True)
+            row.set('selected', 'true' if name in self.picker_selected else 'false')
+            b.add(row, 'android.widget.TextView', (200, top + 20, w - 200, top + row_height // 2),
+                  'contactpicker_row_name', text=name)
+            top += row_height
+        if self.picker_selected:
+            bar = b.add(b.frame, 'android.widget.LinearLayout', (0, int(h * 0.88), w, h), 'bottom_sheet')
+            b.add(bar, 'android.widget.TextView', (40, int(h * 0.9), w - 220, int(h * 0.96)), 'selected_items',
+                  text=", ".join(self.picker_selected))
+            b.add(bar, 'android.widget.ImageButton', (w - 200, int(h * 0.89), w - 40, int(h * 0.97)), 'send',
+                  content_desc="Send", clickable=True)
+        return b.root
+
+    def build_dialog(self):
+        w, h = self.width, self.height
+        b = ScreenBuilder(w, h)
+        panel = b.add(b.frame, 'android.widget.FrameLayout', (60, int(h * 0.4), w - 60, int(h * 0.6)), 'parentPanel')
+        b.add(panel, 'android.widget.TextView', (100, int(h * 0.42), w - 100, int(h * 0.5)), 'android:id/message',
+              text="Phone number shared via url isn't on WhatsApp.")
+        b.add(panel, 'android.widget.Button', (w - 300, int(h * 0.52), w - 100, int(h * 0.58)), 'android:id/button1',
+              text="OK", clickable=True)
+        return b.root
+
+
+# ---------------------------------------------------------------------------
+# HTTP server
+# ---------------------------------------------------------------------------
+
+class FakeAppiumServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the fake device, sessions, element cache and latency profile"""
+
+    daemon_threads = True
+
+    def __init__(self, address, device, latency=None, jitter_ms=0, seed=None, allow_shell=True):
+        super().__init__(address, FakeAppiumHandler)
+        self.device = device
+        self.allow_shell = allow_shell
+        self.latency = dict(DEFAULT_LATENCY)
+        self.latency.update(latency or {})
+        self.jitter_ms = jitter_ms
+        self.random = random.Random(seed)
+        self.sessions = set()
+        self.uia2_crashed = False  # Set by /fake/fault, cleared by the next new session
+        self.elements = {}
+        self.command_counts = {}
+        self.counts_lock = threading.Lock()
+
+    def simulate_latency(self, kind, count=1):
+        base = self.latency.get(kind, self.latency['default']) * count
+        jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        delay = max(0, base + jitter) / 1000.0
+        if delay:
+            time.sleep(delay)
+
+    def count(self, command):
+        with self.counts_lock:
+            self.command_counts[command] = self.command_counts.get(command, 0) + 1
+
+
+class FakeAppiumHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    ROUTES = [
+        ('GET', r"/status$", 'status'),
+        ('GET', r"/fake/state$", 'fake_state'),
+        ('POST', r"/fake/reset$", 'fake_reset'),
+        ('POST', r"/fake/fault$", 'fake_fault'),
+        ('POST', r"/session$", 'new_session'),
+        ('DELETE', r"/session/(?P<sid>[^/]+)$", 'delete_session'),
+        ('GET', r"/session/(?P<sid>[^/]+)/source$", 'source'),
+        ('POST', r"/session/(?P<sid>[^/]+)/element$", 'find_element'),
+        ('POST', r"/session/(?P<sid>[^/]+)/elements$", 'find_elements'),
+        ('POST', r"/session/(?P<sid>[^/]+)/element/(?P<eid>[^/]+)/element$", 'find_child_element'),
+        ('POST', r"/session/(?P<sid>[^/]+)/element/(?P<eid>[^/]+)/elements$", 'find_child_elements'),
+        ('POST', r"/session/(?P<sid>[^/]+)/element/(?P<eid>[^/]+)/click$", 'element_click'),
+        ('POST', r"/session/(?P<sid>[^/]+)/element/(?P<eid>[^/]+)/clear$", 'element_clear'),
+        ('POST', r"/session/(?P<sid>[^/]+)/element/(?P<eid>[^/]+)/value$", 'element_value'),
+        ('GET', r"/session/(?P<sid>[^/]+)/element/(?P<eid>[^/]+)/text$", 'element_text'),
+        ('GET', r"/session/(?P<sid>[^/]+)/element/(?P<eid>[^/]+)/attribute/(?P<name>[^/]+)$", 'element_attribute'),
+        ('GET', r"/session/(?P<sid>[^/]+)/element/(?P<eid>[^/]+)/displayed$", 'element_displayed'),
+        ('GET', r"/session/(?P<sid>[^/]+)/element/(?P<eid>[^/]+)/enabled$", 'element_enabled'),
+        ('GET', r"/session/(?P<sid>[^/]+)/element/(?P<eid>[^/]+)/(?P<what>rect|location|size)$", 'element_rect'),
+        ('POST', r"/session/(?P<sid>[^/]+)/actions$", 'actions'),
+        ('DELETE', r"/session/(?P<sid>[^/]+)/actions$", 'release_actions'),
+        ('GET', r"/session/(?P<sid>[^/]+)/window/rect$", 'window_rect'),
+        ('GET', r"/session/(?P<sid>[^/]+)/window/(?:current/)?size$", 'window_size'),
+        ('POST', r"/session/(?P<sid>[^/]+)/timeouts$", 'ok'),
+        ('POST', r"/session/(?P<sid>[^/]+)/appium/device/press_keycode$", 'press_keycode'),
+        ('POST', r"/session/(?P<sid>[^/]+)/appium/device/push_file$", 'push_file'),
+        ('POST', r"/session/(?P<sid>[^/]+)/appium/device/pull_file$", 'pull_file'),
+        ('POST', r"/session/(?P<sid>[^/]+)/appium/device/activate_app$", 'activate_app'),
+        ('POST', r"/session/(?P<sid>[^/]+)/appium/device/terminate_app$", 'terminate_app'),
+        ('POST', r"/session/(?P<sid>[^/]+)/appium/device/start_activity$", 'start_activity'),
+        ('GET', r"/session/(?P<sid>[^/]+)/appium/device/current_package$", 'current_package'),
+        ('GET', r"/session/(?P<sid>[^/]+)/appium/device/current_activity$", 'current_activity'),
+        ('POST', r"/session/(?P<sid>[^/]+)/appium/device/hide_keyboard$", 'ok'),
+        ('POST', r"/session/(?P<sid>[^/]+)/appium/device/set_clipboard$", 'set_clipboard'),
+        ('POST', r"/session/(?P<sid>[^/]+)/execute/sync$", 'execute'),
+    ]
+
+    def log_message(self, format, *args):
+        pass  # Keep the console quiet, use /fake/state for counters
+
+    # -- plumbing -----------------------------------------------------------
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def dispatch(self, method):
+        path = self.path.split('?')[0]
+        if path.startswith('/wd/hub'):
+            path = path[len('/wd/hub'):]
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+        for route_method, pattern, handler_name in self.ROUTES:
+            match = re.match(pattern, path)
+            if route_method == method and match:
+                params = match.groupdict()
+                if 'sid' in params and params['sid'] not in self.server.sessions:
+                    return self.send_error_response(WebDriverError('invalid session id', "Session does not exist"))
+                # 'mobile:' scripts are counted by name in handle_execute
+                if not handler_name.startswith('fake_') and handler_name not in ('status', 'execute'):
+                    self.server.count(handler_name)
+                if self.server.uia2_crashed and handler_name not in ADB_BACKED_HANDLERS:
+                    return self.send_error_response(UIA2_CRASHED_ERROR)
+                try:
+                    with self.server.device.lock:
+                        value = getattr(self, f"handle_{handler_name}")(body, **params)
+                    return self.send_json(200, {'value': value})
+                except WebDriverError as e:
+                    return self.send_error_response(e)
+                except Exception as e:
+                    return self.send_error_response(WebDriverError('unknown error', str(e), 500))
+
+        self.send_error_response(WebDriverError('unknown command', f"{method} {path} is not supported", 404))
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_response(self, error):
+        self.send_json(error.status, {'value': {'error': error.error, 'message': error.message, 'stacktrace': ''}})
+
+    @property
+    def device(self):
+        return self.server.device
+
+    def latency(self, kind, count=1):
+        # Sleep without holding the device lock so parallel sessions don't serialize
+        self.server.device.lock.release()
+        try:
+            self.server.simulate_latency(kind, count)
+        finally:
+            self.server.device.lock.acquire()
+
+    # -- element cache ------------------------------------------------------
+
+    def element_ref(self, root, node):
+        for candidate, path in iter_with_paths(root):
+            if candidate is node:
+                element_id = str(uuid.uuid4())
+                self.server.elements[element_id] = (self.device.screen_key(), path)
+                return {W3C_ELEMENT_KEY: element_id, 'ELEMENT': element_id}
+        raise WebDriverError('no such element', "Element is not in the hierarchy")
+
+    def resolve_element(self, element_id):
+        if element_id not in self.server.elements:
+            raise WebDriverError('no such element', f"Element {element_id} is unknown")
+        screen_key, path = self.server.elements[element_id]
+        root = self.device.build_root()
+        node = node_at_path(root, path)
+        if screen_key != self.device.screen_key() or node is None:
+            raise WebDriverError('stale element reference', "The element is no longer attached to the DOM")
+        return root, node
+
+    def find(self, body, context_id=None):
+        using, value = body.get('using'), body.get('value')
+        self.latency('find_xpath' if using == 'xpath' else 'find')
+        root = self.device.build_root()
+        document = ET.Element('document')
+        document.append(root)
+        context = self.resolve_element(context_id)[1] if context_id else document
+        nodes = find_nodes(document, context, using, value)
+        return root, [node for node in nodes if node is not root or using != 'xpath'] or nodes
+
+    # -- handlers -----------------------------------------------------------
+
+    def handle_status(self, body):
+        return {'ready': True, 'message': 'Fake Appium server ready', 'build': {'version': 'fake'}}
+
+    def handle_fake_state(self, body):
+        device = self.device
+        return {
+            'screen': device.screen,
+            'chat': device.chat,
+            'query': device.fields['search'],
+            'sent_messages': device.sent_messages,
+            'files': {path: len(data) for path, data in device.files.items()},
+            'command_counts': dict(self.server.command_counts),
+            'total_commands': sum(self.server.command_counts.values()),
+        }
+
+    def handle_fake_reset(self, body):
+        self.device.reset()
+        with self.server.counts_lock:
+            self.server.command_counts.clear()
+        self.server.elements.clear()
+        return None
+
+    def handle_fake_fault(self, body):
+        layer = body.get('layer')
+        if layer == 'app':
+            self.device.screen = 'launcher'
+            self.device.back_stack = []
+        elif layer == 'uiautomator2':
+            self.server.uia2_crashed = True
+        elif layer == 'session':
+            self.server.sessions.clear()
+        else:
+            raise WebDriverError('invalid argument', f"Unknown fault layer '{layer}'", 400)
+        return None
+
+    def handle_ok(self, body, sid=None):
+        self.latency('default')
+        return None
+
+    def handle_new_session(self, body):
+        capabilities = dict(body.get('capabilities', {}).get('alwaysMatch', {}))
+        self.latency('session_fast' if capabilities.get('appium:skipServerInstallation') else 'session')
+        self.server.uia2_crashed = False
+        session_id = str(uuid.uuid4())
+        self.server.sessions.add(session_id)
+        capabilities.update({'platformName': 'Android', 'deviceName': 'fake-device'})
+        if self.device.screen == 'launcher':
+            self.device.screen = 'home'
+        return {'sessionId': session_id, 'capabilities': capabilities}
+
+    def handle_delete_session(self, body, sid):
+        self.server.sessions.discard(sid)
+        return None
+
+    def handle_source(self, body, sid):
+        self.latency('source')
+        return self.device.page_source()
+
+    def handle_find_element(self, body, sid):
+        root, nodes = self.find(body)
+        if not nodes:
+            raise WebDriverError('no such element', f"An element could not be located using {body.get('using')}={body.get('value')}")
+        return self.element_ref(root, nodes[0])
+
+    def handle_find_elements(self, body, sid):
+        root, nodes = self.find(body)
+        return [self.element_ref(root, node) for node in nodes]
+
+    def handle_find_child_element(self, body, sid, eid):
+        root, nodes = self.find(body, context_id=eid)
+        if not nodes:
+            raise WebDriverError('no such element', "Child element could not be located")
+        return self.element_ref(root, nodes[0])
+
+    def handle_find_child_elements(self, body, sid, eid):
+        root, nodes = self.find(body, context_id=eid)
+        return [self.element_ref(root, node) for node in nodes]
+
+    def handle_element_click(self, body, sid, eid):
+        self.latency('default')
+        root, node = self.resolve_element(eid)
+        self.device.activate(node)
+        return None
+
+    def handle_element_clear(self, body, sid, eid):
+        self.latency('default')
+        root, node = self.resolve_element(eid)
+        field = self.field_for_node(node)
+        if field:
+            self.device.set_field(field, "")
+        return None
+
+    def handle_element_value(self, body, sid, eid):
+        self.latency('default')
+        root, node = self.resolve_element(eid)
+        field = self.field_for_node(node)
+        text = body.get('text') if body.get('text') is not None else "".join(body.get('value', []))
+        if field:
+            # UiAutomator2 sets the whole text of the field
+            self.device.set_field(field, text)
+            self.device.focused_field = field
+        return None
+
+    def field_for_node(self, node):
+        resource_id = (node.get('resource-id') or '').replace(WA, '')
+        if resource_id == 'search_src_text' and self.device.screen == 'forward_picker':
+            return 'picker'
+        return {'search_src_text': 'search', 'entry': 'entry', 'caption': 'caption'}.get(resource_id)
+
+    def handle_element_text(self, body, sid, eid):
+        self.latency('default')
+        return self.resolve_element(eid)[1].get('text', '')
+
+    def handle_element_attribute(self, body, sid, eid, name):
+        self.latency('default')
+        node = self.resolve_element(eid)[1]
+        if name == 'displayed':
+            return node.get('displayed', 'true')
+        return node.get(name)
+
+    def handle_element_displayed(self, body, sid, eid):
+        self.latency('default')
+        return self.resolve_element(eid)[1].get('displayed', 'true') == 'true'
+
+    def handle_element_enabled(self, body, sid, eid):
+        self.latency('default')
+        return self.resolve_element(eid)[1].get('enabled', 'true') == 'true'
+
+    def handle_element_rect(self, body, sid, eid, what):
+        self.latency('default')
+        left, top, right, bottom = parse_bounds(self.resolve_element(eid)[1].get('bounds'))
+        rect = {'x': left, 'y': top, 'width': right - left, 'height': bottom - top}
+        if what == 'location':
+            return {'x': left, 'y': top}
+        if what == 'size':
+            return {'width': rect['width'], 'height': rect['height']}
+        return rect
+
+    def handle_actions(self, body, sid):
+        self.latency('default')
+        for source in body.get('actions', []):
+            if source.get('type') != 'pointer':
+                continue
+            x = y = None
+            down_at = None
+            pressed_ms = 0
+            for action in source.get('actions', []):
+                kind = action.get('type')
+                if kind == 'pointerMove':
+                    x, y = action.get('x'), action.get('y')
+                elif kind == 'pointerDown':
+                    down_at, pressed_ms = True, 0
+                elif kind == 'pause' and down_at:
+                    pressed_ms += action.get('duration', 0)
+                elif kind == 'pointerUp' and x is not None:
+                    self.device.tap(int(x), int(y), long_press=pressed_ms >= 500)
+                    down_at = None
+        return None
+
+    def handle_release_actions(self, body, sid):
+        return None
+
+    def handle_window_rect(self, body, sid):
+        self.latency('default')
+        return {'x': 0, 'y': 0, 'width': self.device.width, 'height': self.device.height}
+
+    def handle_window_size(self, body, sid):
+        self.latency('default')
+        return {'width': self.device.width, 'height': self.device.height}
+
+    def handle_press_keycode(self, body, sid):
+        return self.mobile_press_key({'keycode': body.get('keycode')})
+
+    def handle_push_file(self, body, sid):
+        return self.mobile_push_file({'remotePath': body['path'], 'payload': body.get('data', '')})
+
+    def handle_pull_file(self, body, sid):
+        return self.mobile_pull_file({'remotePath': body['path']})
+
+    def handle_activate_app(self, body, sid):
+        return self.mobile_activate_app(body)
+
+    def handle_terminate_app(self, body, sid):
+        return self.mobile_terminate_app(body)
+
+    def handle_start_activity(self, body, sid):
+        return self.mobile_start_activity(body)
+
+    def handle_set_clipboard(self, body, sid):
+        return self.mobile_set_clipboard(body)
+
+    def handle_current_package(self, body, sid):
+        return self.mobile_get_current_package({})
+
+    def handle_current_activity(self, body, sid):
+        return self.mobile_get_current_activity({})
+
+    def handle_execute(self, body, sid):
+        script = body.get('script', '')
+        args = body.get('args') or [{}]
+        args = args[0] if args and isinstance(args[0], dict) else {}
+        if not script.startswith('mobile:'):
+            raise WebDriverError('unknown command', f"Only 'mobile:' scripts are supported, got '{script}'", 404)
+        # 'mobile: pushFile' -> mobile_push_file
+        name = re.sub(r'([A-Z])', r'_\1', script.split(':', 1)[1].strip()).lower()
+        handler = getattr(self, f"mobile_{name}", None)
+        if handler is None:
+            raise WebDriverError('unknown command', f"Script '{script}' is not supported by the fake server", 404)
+        if self.server.uia2_crashed and name not in ADB_BACKED_SCRIPTS:
+            raise UIA2_CRASHED_ERROR
+        self.server.count(f"mobile:{name}")
+        return handler(args)
+
+    # -- device commands (legacy endpoints and 'mobile:' scripts) -----------
+
+    def mobile_press_key(self, args):
+        self.latency('default')
+        keycode = int(args.get('keycode'))
+        if keycode == 279:  # KEYCODE_PASTE
+            self.device.type_text(self.device.clipboard)
+        else:
+            self.device.press_keycode(keycode)
+        return None
+
+    def mobile_type(self, args):
+        text = args.get('text', '')
+        self.latency('default')
+        self.latency('type_char', len(text))
+        # Keyboard injection can't produce characters outside the BMP (emoji, flags) on most devices
+        self.device.type_text("".join(char for char in text if ord(char) <= 0xFFFF))
+        return None
+
+    def mobile_push_file(self, args):
+        self.latency('push_file')
+        self.device.files[args['remotePath']] = base64.b64decode(args.get('payload', ''))
+        return None
+
+    def mobile_pull_file(self, args):
+        self.latency('pull_file')
+        path = args['remotePath']
+        if path not in self.device.files:
+            raise WebDriverError('unknown error', f"Remote path '{path}' does not exist", 500)
+        return base64.b64encode(self.device.files[path]).decode('ascii')
+
+    def mobile_activate_app(self, args):
+        self.latency('default')
+        if self.device.screen == 'launcher':
+            self.device.screen = 'home'
+        return None
+
+    def mobile_terminate_app(self, args):
+        self.latency('default')
+        self.device.screen = 'launcher'
+        self.device.back_stack = []
+        return True
+
+    def mobile_start_activity(self, args):
+        self.latency('default')
+        if args.get('action') == 'android.intent.action.VIEW' and args.get('uri'):
+            self.device.start_view_intent(args['uri'])
+        elif args.get('action') == 'android.intent.action.SEND':
+            self.device.start_send_intent(args.get('extras') or [])
+        else:
+            self.device.screen = 'home'
+            self.device.back_stack = []
+        return None
+
+    def mobile_query_app_state(self, args):
+        self.latency('default')
+        return 3 if self.device.screen == 'launcher' else 4  # Running in background / foreground
+
+    def mobile_get_current_package(self, args):
+        self.latency('default')
+        return 'com.miui.home' if self.device.screen == 'launcher' else 'com.whatsapp'
+
+    def mobile_get_current_activity(self, args):
+        self.latency('default')
+        return {'conversation': '.Conversation', 'launcher': '.launcher.Launcher'}.get(
+            self.device.screen, '.home.ui.HomeActivity')
+
+    def mobile_set_clipboard(self, args):
+        self.latency('default')
+        self.device.clipboard = base64.b64decode(args.get('content', '')).decode('utf-8')
+        return None
+
+    def mobile_get_clipboard(self, args):
+        self.latency('default')
+        return base64.b64encode(self.device.clipboard.encode('utf-8')).decode('ascii')
+
+    def mobile_shell(self, args):
+        self.latency('shell')
+        if not self.server.allow_shell:
+            raise WebDriverError('unknown error', "Potentially insecure feature 'adb_shell' has not been enabled. "
+                                 "Start the server with --allow-insecure adb_shell", 500)
+        return self.device.shell(args.get('command', ''), [str(arg) for arg in args.get('args', [])])
+
+    def mobile_hide_keyboard(self, args):
+        self.latency('default')
+        return True
+
+    def mobile_is_keyboard_shown(self, args):
+        self.latency('default')
+        return self.device.focused_field is not None
+
+    def mobile_is_locked(self, args):
+        self.latency('default')
+        return False  # The simulated phone never locks
+
+    def mobile_unlock(self, args):
+        self.latency('default')
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Entry points
+# ---------------------------------------------------------------------------
+
+def load_contacts(path):
+    """Read chat names (one per line, prefix removed) - digit-only lines are also registered as phones"""
+    contacts, phones = [], []
+    if not path or not os.path.exists(path):
+        return contacts, phones
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            name = line.strip()
+            if not name or name.startswith('#'):
+                continue
+            if name.startswith(CHAT_NAME_PREFIX_TO_REMOVE):
+                name = name.replace(CHAT_NAME_PREFIX_TO_REMOVE, "", 1).strip()
+            digits = name.replace('+', '').replace(' ', '').replace('-', '')
+            if digits.isdigit():
+                phones.append(digits[-10:])
+            contacts.append(name)
+    return contacts, phones
+
+
+def load_recordings(recordings_dir=None, home_xml=None):
+    """Load recorded hierarchies: DIR/<screen>.xml plus an optional explicit home dump"""
+    recordings = {}
+    if recordings_dir and os.path.isdir(recordings_dir):
+        for filename in os.listdir(recordings_dir):
+            if filename.endswith('.xml'):
+                with open(os.path.join(recordings_dir, filename), 'rb') as file:
+                    recordings[filename[:-4]] = file.read()
+    if home_xml:
+        with open(home_xml, 'rb') as file:
+            recordings['home'] = file.read()
+    return recordings
+
+
+def start_fake_server(port=4799, contacts=(), phones=(), width=1080, height=2400, latency=None, jitter_ms=0,
+                      results_delay=DEFAULT_RESULTS_DELAY, recordings=None, seed=None, allow_shell=True, device=None):
+    """Start the server in a background thread, returns the server (call server.shutdown() to stop)
+
+    Pass the device of another fake server to get a second Appium server for the same phone.
+    """
+    if device is None:
+        device = FakeWhatsAppDevice(contacts, phones, width, height, results_delay, recordings)
+    server = FakeAppiumServer(('127.0.0.1', port), device, latency, jitter_ms, seed, allow_shell)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Appium server replaying WhatsApp screens')
+    parser.add_argument('--port', type=int, default=4799, help='Port to listen on (default: 4799)')
+    parser.add_argument('--contacts', default='txt/chat_name.txt',
+                        help='Chat names that exist on the fake phone (default: txt/chat_name.txt)')
+    parser.add_argument('--window', default='1080x2400', help='Screen size WIDTHxHEIGHT (default: 1080x2400)')
+    parser.add_argument('--latency-ms', type=float, default=None, help='Base latency for simple commands')
+    parser.add_argument('--source-latency-ms', type=float, default=None, help='Latency of page_source')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='Uniform +/- jitter added to every command')
+    parser.add_argument('--results-delay-ms', type=float, default=DEFAULT_RESULTS_DELAY * 1000,
+                        help='Delay before search results render after typing')
+    parser.add_argument('--latency-profile', help='JSON file with per-command latencies (ms), keys as DEFAULT_LATENCY')
+    parser.add_argument('--recordings', help='Directory with recorded <screen>.xml hierarchies')
+    parser.add_argument('--home-xml', help='Recorded page source to serve as the home screen')
+    parser.add_argument('--no-shell', action='store_true',
+                        help="Reject 'mobile: shell' like Appium started without --allow-insecure adb_shell")
+    args = parser.parse_args()
+
+    latency = {}
+    if args.latency_profile:
+        with open(args.latency_profile, 'r', encoding='utf-8') as file:
+            latency.update(json.load(file))
+    if args.latency_ms is not None:
+        latency['default'] = args.latency_ms
+    if args.source_latency_ms is not None:
+        latency['source'] = args.source_latency_ms
+
+    width, height = (int(value) for value in args.window.lower().split('x'))
+    contacts, phones = load_contacts(args.contacts)
+    server = start_fake_server(args.port, contacts, phones, width, height, latency, args.jitter_ms,
+                               args.results_delay_ms / 1000.0, load_recordings(args.recordings, args.home_xml),
+                               allow_shell=not args.no_shell)
+    print(f"[FAKE] Fake Appium server on http://127.0.0.1:{args.port} ({len(contacts)} contacts, {width}x{height})")
+    print("[FAKE] Press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,18 +2,37 @@
 
 from appium.webdriver.webdriver import WebDriver
 from appium.options.android.uiautomator2.base import UiAutomator2Options
-from selenium.webdriver.common.by import By as AppiumBy
-from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from appium.webdriver.common.appiumby import AppiumBy
+from selenium.common.exceptions import (InvalidSessionIdException, NoSuchElementException,
+                                        StaleElementReferenceException, TimeoutException, WebDriverException)
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
 import time
 import os
+import re
 import base64
+import zlib
 import signal
 import subprocess
 import argparse
+import functools
+import hashlib
+import json
+import math
+import shutil
+import sqlite3
+import sys
+import threading
+import unicodedata
+import urllib.request
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
 from datetime import datetime, timezone, timedelta
 
+try:
+    from PIL import Image, ImageOps  # Optional: daily photo pre-optimization (pip install Pillow)
+except ImportError:
+    Image = None
+
 # GMT+7 timezone
 GMT_PLUS_7 = timezone(timedelta(hours=7))
 
@@ -23,6 +42,10 @@ APPIUM_PORT = 4723  # Default port, can be overridden via command line
 # Configuration: Chat name prefix to remove before searching
 CHAT_NAME_PREFIX_TO_REMOVE = "NepalWin🇳🇵"  # Change this to customize what prefix to remove
 
+# Configuration: Open phone-number chats directly via intent instead of the UI search
+DIRECT_OPEN_PHONE_CHATS = True
+PHONE_DEFAULT_COUNTRY_CODE = "977"  # Prepended to local 10-digit numbers (Nepal)
+
 # Device-specific coordinate configurations
 DEVICE_CONFIGS = {
     "Redmi Note 13 Pro": {
@@ -113,9 +136,27 @@ DEVICE_CONFIGS = {
 # Initialize with default to prevent None errors
 SELECTED_DEVICE_CONFIG = None
 
+# Name of the selected DEVICE_CONFIGS entry (device model label for metrics)
+SELECTED_DEVICE_NAME = None
+
 # Global variable to store selected ADB device UDID
 SELECTED_ADB_DEVICE = None
 
+# UiAutomator2 system port (must be unique per device when several run at once)
+APPIUM_SYSTEM_PORT = None
+
+# Multi-device runner: ports for device N are base + N
+MULTI_DEVICE_SYSTEM_PORT_BASE = 8200
+
+# Warm standby (--standby): a second Appium server with its own UiAutomator2 system port, kept
+# running and validated so a dead session fails over without waiting for a server to boot.
+# Standby ports are the primary ones + STANDBY_PORT_OFFSET.
+STANDBY_ENABLED = False
+STANDBY_PORT_OFFSET = 100
+STANDBY = {'port': None, 'system_port': None, 'ready': False, 'thread': None,
+           'servers': []}  # servers: (Popen, log file) of every Appium server the standby logic started
+SESSION_QUIT_TIMEOUT = 5  # Seconds to wait for a (possibly dead) session to quit before moving on
+
 def get_device_config():
     """Get current device config, fallback to default if not set"""
     global SELECTED_DEVICE_CONFIG
@@ -126,7 +167,7 @@ def get_device_config():
 
 def select_device_config():
     """Interactive device selection menu"""
-    global SELECTED_DEVICE_CONFIG
+    global SELECTED_DEVICE_CONFIG, SELECTED_DEVICE_NAME
 
     print("\n" + "="*60)
     print("[DEVICE] DEVICE CONFIGURATION SETUP")
@@ -167,6 +208,7 @@ def select_device_config():
             return None
 
     SELECTED_DEVICE_CONFIG = DEVICE_CONFIGS[selected_device]
+    SELECTED_DEVICE_NAME = selected_device
 
     # Display selected coordinates
     print(f"\n[DEVICE] Loaded coordinates for '{selected_device}':")
@@ -306,6 +348,43 @@ def clean_chat_name(chat_name):
         print(f"[CLEAN] Using name as-is: '{chat_name}'")
         return chat_name.strip()
 
+def normalize_phone_number(chat_name):
+    """Return the international digits of a phone-number chat entry, or None if it isn't one"""
+    candidate = chat_name.strip()
+    if CHAT_NAME_PREFIX_TO_REMOVE and candidate.startswith(CHAT_NAME_PREFIX_TO_REMOVE):
+        candidate = candidate.replace(CHAT_NAME_PREFIX_TO_REMOVE, "", 1)
+
+    digits = candidate.replace('+', '').replace(' ', '').replace('-', '')
+    if not digits.isdigit():
+        return None
+
+    # International dialing prefix "00977..." -> "977..."
+    if digits.startswith('00'):
+        digits = digits[2:]
+
+    # Local numbers (e.g. 98XXXXXXXX) need the country code for wa.me style links
+    if len(digits) == 10 and PHONE_DEFAULT_COUNTRY_CODE:
+        digits = PHONE_DEFAULT_COUNTRY_CODE + digits
+
+    return digits
+
+def is_phone_number_entry(chat_name):
+    """Check if a chat entry is a phone number (contains only digits and +)"""
+    return normalize_phone_number(chat_name) is not None
+
+def adb_shell(args, timeout=10):
+    """Run 'adb shell <args>' against the selected device, returns CompletedProcess or None"""
+    cmd = ['adb']
+    if SELECTED_ADB_DEVICE:
+        cmd.extend(['-s', SELECTED_ADB_DEVICE])
+    cmd.append('shell')
+    cmd.extend(args)
+    try:
+        return subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except (FileNotFoundError, subprocess.TimeoutExpired) as e:
+        print(f"[ADB] Shell command failed: {e}")
+        return None
+
 def get_gmt7_time():
     """Get current time in GMT+7 timezone"""
     return datetime.now(GMT_PLUS_7)
@@ -316,71 +395,345 @@ def format_gmt7_time(dt=None):
         dt = get_gmt7_time()
     return dt.strftime("%Y-%m-%d %H:%M:%S GMT+7")
 
-# Global variable to track if timestamp was written for this session
-_timestamp_written_today = False
-
 def log_not_found_chat(chat_name, row_number=None):
-    """Log chat name that was not found to a file with timestamp"""
-    global _timestamp_written_today
-
+    """Record a chat that was not found in the campaign store and the negative cache"""
     try:
-        log_filename = f"txt/not_found_chats_{get_gmt7_time().strftime('%Y%m%d')}.txt"
-
-        # Create txt directory if it doesn't exist
-        os.makedirs('txt', exist_ok=True)
-
-        with open(log_filename, 'a', encoding='utf-8') as file:
-            # Write timestamp only once per script run
-            if not _timestamp_written_today:
-                timestamp = format_gmt7_time()
-                file.write(f"[{timestamp}]\n")
-                _timestamp_written_today = True
-
-            file.write(f"{chat_name}\n")
-
-        print(f"[LOG] Recorded not found chat: {chat_name} in {log_filename}")
-
+        record_event("not_found", f"Row {row_number}" if row_number is not None else "", chat_name=chat_name)
+        record_not_found_strike(chat_name)
+        print(f"[LOG] Recorded not found chat: {chat_name}")
     except Exception as e:
         print(f"[ERROR] Failed to log not found chat: {str(e)}")
 
+# Negative cache: chats that keep coming back as "not found" across days (not_found_strikes in the
+# campaign store, so --multi-device workers share it)
+NOT_FOUND_TTL_DAYS = 14       # Strikes older than this are forgotten
+NOT_FOUND_STRIKE_LIMIT = 3    # Days a chat must fail on before it is deferred
+NOT_FOUND_POLICY = "defer"    # "defer" = move to end of queue with a short probe search, "skip" = don't search
+NOT_FOUND_PROBE_WAIT = 4      # Max search wait (seconds) for probe searches
+_not_found_cache_seeded = False
+
+def load_not_found_cache():
+    """Seed the negative cache (once per run) from any txt/not_found_chats_YYYYMMDD.txt not merged yet"""
+    global _not_found_cache_seeded
+    conn = get_campaign_store()
+    if _not_found_cache_seeded:
+        return conn
+    _not_found_cache_seeded = True
+
+    # Merge history files; strikes are distinct dates so re-reading a file never double counts
+    seeded = {row[0] for row in conn.execute("SELECT filename FROM imported_files WHERE filename LIKE 'not_found_cache:%'")}
+    today_file = f"not_found_chats_{get_gmt7_time().strftime('%Y%m%d')}.txt"
+    new_files = 0
+    if os.path.isdir('txt'):
+        for filename in sorted(os.listdir('txt')):
+            match = re.match(r"not_found_chats_(\d{8})\.txt$", filename)
+            if not match or f"not_found_cache:{filename}" in seeded:
+                continue
+            day = datetime.strptime(match.group(1), '%Y%m%d').strftime('%Y-%m-%d')
+            try:
+                with open(os.path.join('txt', filename), 'r', encoding='utf-8') as file:
+                    # Skip the "[timestamp]" run headers
+                    chat_names = [name for name in (line.strip() for line in file) if name and not name.startswith('[')]
+            except Exception as e:
+                print(f"[NOT_FOUND] Failed to read {filename}: {e}")
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("INSERT OR IGNORE INTO not_found_strikes (chat_name, day) VALUES (?, ?)",
+                                 [(chat_name, day) for chat_name in chat_names])
+                # Today's file is still being appended to, merge it again next run
+                if filename != today_file:
+                    conn.execute("INSERT OR IGNORE INTO imported_files (filename, imported_at) VALUES (?, ?)",
+                                 (f"not_found_cache:{filename}", time.time()))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            new_files += 1
+
+    if new_files:
+        print(f"[NOT_FOUND] Seeded negative cache from {new_files} not_found history files")
+    return conn
+
+def get_not_found_strikes(chat_name):
+    """Count the not-found strikes of a chat that are still within NOT_FOUND_TTL_DAYS"""
+    cutoff = (get_gmt7_time() - timedelta(days=NOT_FOUND_TTL_DAYS)).strftime('%Y-%m-%d')
+    return load_not_found_cache().execute(
+        "SELECT COUNT(*) FROM not_found_strikes WHERE chat_name = ? AND day >= ?", (chat_name, cutoff)
+    ).fetchone()[0]
+
+def get_not_found_chats():
+    """All chats with not-found strikes, sorted"""
+    return [row[0] for row in load_not_found_cache().execute(
+        "SELECT DISTINCT chat_name FROM not_found_strikes ORDER BY chat_name")]
+
+def is_chat_deferred(chat_name):
+    """Check if a chat has failed often enough recently to be deferred"""
+    return get_not_found_strikes(chat_name) >= NOT_FOUND_STRIKE_LIMIT
+
+def record_not_found_strike(chat_name):
+    """Record today's not-found result for a chat in the negative cache"""
+    load_not_found_cache().execute("INSERT OR IGNORE INTO not_found_strikes (chat_name, day) VALUES (?, ?)",
+                                   (chat_name, get_gmt7_time().strftime('%Y-%m-%d')))
+
+def clear_not_found_chat(chat_name):
+    """Forget a chat's not-found history once it has been found again"""
+    if load_not_found_cache().execute("DELETE FROM not_found_strikes WHERE chat_name = ?", (chat_name,)).rowcount:
+        print(f"[NOT_FOUND] '{chat_name}' was found again, cleared from negative cache")
 
 def log_script_event(event_type, message=""):
-    """Log script start/end events with GMT+7 timestamp"""
+    """Log script start/end events to the campaign store"""
+    try:
+        record_event(event_type.lower(), message)
+        print(f"[LOG] {event_type.upper()}: {message}")
+    except Exception as e:
+        print(f"[ERROR] Failed to log script event: {str(e)}")
+
+# Per-step timing metrics: JSONL events + Prometheus textfile with p50/p95/p99 per step, device and outcome
+METRICS_PROM_FILE = "txt/whatsapp_metrics.prom"  # Single-device runs; workers write whatsapp_metrics_<udid>.prom
+METRICS_PROM_WRITE_INTERVAL = 30  # Seconds between textfile rewrites
+METRICS_QUANTILES = (0.5, 0.95, 0.99)
+_metric_samples = {}  # (step, device_model, outcome) -> list of durations
+_metrics_prom_written_at = 0
+
+def get_metrics_jsonl_file():
+    """Daily JSONL file for metric events"""
+    return f"txt/metrics_{get_gmt7_time().strftime('%Y%m%d')}.jsonl"
+
+def get_metrics_prom_file():
+    """Prometheus textfile of this process, one per device so --multi-device workers don't overwrite each other"""
+    if not SELECTED_ADB_DEVICE:
+        return METRICS_PROM_FILE
+    safe_udid = re.sub(r'[^A-Za-z0-9_.-]', '_', SELECTED_ADB_DEVICE)
+    return METRICS_PROM_FILE.replace(".prom", f"_{safe_udid}.prom")
+
+def record_metric(step, duration, outcome="ok", **labels):
+    """Record one timed step: keep it for the percentiles and append it to the JSONL log"""
+    global _metrics_prom_written_at
+    device_model = SELECTED_DEVICE_NAME or "unknown"
+    _metric_samples.setdefault((step, device_model, outcome), []).append(duration)
+
+    event = {
+        'ts': round(time.time(), 3),
+        'step': step,
+        'duration': round(duration, 4),
+        'outcome': outcome,
+        'device_model': device_model,
+        'device': SELECTED_ADB_DEVICE
+    }
+    event.update(labels)
     try:
-        log_filename = f"txt/script_log_{get_gmt7_time().strftime('%Y%m%d')}.txt"
+        os.makedirs('txt', exist_ok=True)
+        with open(get_metrics_jsonl_file(), 'a', encoding='utf-8') as file:
+            file.write(json.dumps(event, ensure_ascii=False) + "\n")
+    except Exception as e:
+        print(f"[METRICS] Failed to write metric event: {e}")
+
+    if time.time() - _metrics_prom_written_at >= METRICS_PROM_WRITE_INTERVAL:
+        write_metrics_textfile()
 
-        # Create txt directory if it doesn't exist
+@contextmanager
+def metric_span(step, **labels):
+    """Time a block of code: `with metric_span("back") as span: ...`, set span['outcome'] to override 'ok'"""
+    span = {'outcome': 'ok'}
+    span_start = time.time()
+    try:
+        yield span
+    except Exception:
+        span['outcome'] = 'error'
+        raise
+    finally:
+        record_metric(step, time.time() - span_start, span['outcome'], **labels)
+
+def timed_step(step):
+    """Decorator timing a whole operation; outcome is 'ok' for a truthy result, 'fail' for falsy, 'error' on exception"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metric_span(step) as span:
+                result = func(*args, **kwargs)
+                if not result:
+                    span['outcome'] = 'fail'
+                return result
+        return wrapper
+    return decorator
+
+def metric_quantile(sorted_values, quantile):
+    """Nearest-rank quantile of an already sorted list"""
+    index = min(len(sorted_values) - 1, max(math.ceil(quantile * len(sorted_values)) - 1, 0))
+    return sorted_values[index]
+
+def write_metrics_textfile():
+    """Write all step timings as Prometheus summaries (node_exporter textfile collector format)"""
+    global _metrics_prom_written_at
+    _metrics_prom_written_at = time.time()
+    lines = [
+        "# HELP whatsapp_step_duration_seconds Duration of automation steps",
+        "# TYPE whatsapp_step_duration_seconds summary"
+    ]
+    # The device label keeps series unique across the per-device files of one node_exporter
+    device = SELECTED_ADB_DEVICE or "default"
+    for (step, device_model, outcome), samples in sorted(_metric_samples.items()):
+        sorted_samples = sorted(samples)
+        label_text = f'step="{step}",device="{device}",device_model="{device_model}",outcome="{outcome}"'
+        for quantile in METRICS_QUANTILES:
+            lines.append(f'whatsapp_step_duration_seconds{{{label_text},quantile="{quantile}"}} {metric_quantile(sorted_samples, quantile):.4f}')
+        lines.append(f"whatsapp_step_duration_seconds_sum{{{label_text}}} {sum(samples):.4f}")
+        lines.append(f"whatsapp_step_duration_seconds_count{{{label_text}}} {len(samples)}")
+    lines += [
+        "# HELP whatsapp_command_rtt_seconds EWMA round trip of WebDriver commands",
+        "# TYPE whatsapp_command_rtt_seconds gauge"
+    ]
+    device_model = SELECTED_DEVICE_NAME or "unknown"
+    for scope, estimates in (('session', _session_latency), ('model', get_device_latency_model())):
+        for kind, estimate in sorted(estimates.items()):
+            lines.append(f'whatsapp_command_rtt_seconds{{device="{device}",device_model="{device_model}",kind="{kind}",scope="{scope}"}} {estimate["ewma"]:.4f}')
+    prom_file = get_metrics_prom_file()
+    try:
         os.makedirs('txt', exist_ok=True)
+        temp_file = prom_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(temp_file, prom_file)
+    except Exception as e:
+        print(f"[METRICS] Failed to write {prom_file}: {e}")
 
-        timestamp = format_gmt7_time()
-        log_entry = f"[{timestamp}] {event_type.upper()}: {message}\n"
+def print_metrics_summary():
+    """Print p50/p95/p99 per step and outcome for this run"""
+    if not _metric_samples:
+        return
+    print(f"\n[METRICS] Step timings (p50 / p95 / p99, seconds):")
+    for (step, device_model, outcome), samples in sorted(_metric_samples.items()):
+        sorted_samples = sorted(samples)
+        p50, p95, p99 = (metric_quantile(sorted_samples, quantile) for quantile in METRICS_QUANTILES)
+        print(f"   - {step:<22} {outcome:<6} n={len(samples):<5} {p50:6.2f} / {p95:6.2f} / {p99:6.2f}  ({device_model})")
+
+# Latency model: EWMA of the round trips of real WebDriver commands, per device model (persisted)
+# and per session, so step delays scale with the device without probe commands
+LATENCY_EWMA_ALPHA = 0.2         # Weight of the newest sample
+LATENCY_MODEL_SAVE_EVERY = 50    # Unsaved samples before the estimates are written to the campaign store
+LATENCY_FAST_RTT = 0.2           # Simple command round trips (s) at or below this get 0.7x the base delay...
+LATENCY_SLOW_RTT = 0.5           # ...at or above this 1.5x, linear in between (the old fast/normal/slow tiers)
+LATENCY_SOURCE_COMMANDS = {'getPageSource'}
+LATENCY_FIND_COMMANDS = {'findElement', 'findElements', 'findChildElement', 'findChildElements'}
+# Not comparable round trips: session setup and scripts/transfers whose cost depends on the payload
+LATENCY_IGNORED_COMMANDS = {'newSession', 'quit', 'executeScript', 'executeAsyncScript', 'pushFile', 'pullFile'}
+_latency_model = None
+_latency_model_unsaved = 0
+_session_latency = {}            # kind -> {'ewma': seconds, 'samples': n} for the current session
+
+def load_latency_model():
+    """Load the per-device-model latency estimates from the campaign store (once per run)"""
+    global _latency_model
+    if _latency_model is None:
+        _latency_model = {}
+        for device_model, kind, ewma, samples in get_campaign_store().execute("SELECT device_model, kind, ewma, samples FROM latency_model"):
+            _latency_model.setdefault(device_model, {})[kind] = {'ewma': ewma, 'samples': samples}
+    return _latency_model
+
+def save_latency_model():
+    """Write this device model's estimates to the campaign store, row by row so other models are kept
+
+    Only from the main thread: heartbeat/standby threads also send commands, but share its store connection.
+    """
+    global _latency_model_unsaved
+    if threading.current_thread() is not threading.main_thread():
+        return
+    device_model = SELECTED_DEVICE_NAME or "unknown"
+    try:
+        get_campaign_store().executemany(
+            "INSERT OR REPLACE INTO latency_model (device_model, kind, ewma, samples) VALUES (?, ?, ?, ?)",
+            [(device_model, kind, estimate['ewma'], estimate['samples'])
+             for kind, estimate in get_device_latency_model().items()]
+        )
+        _latency_model_unsaved = 0
+    except Exception as e:
+        print(f"[LATENCY] Failed to save latency model: {e}")
 
-        with open(log_filename, 'a', encoding='utf-8') as file:
-            file.write(log_entry)
+def get_device_latency_model():
+    """Estimates of the current device model: kind -> {'ewma': seconds, 'samples': n}"""
+    return load_latency_model().setdefault(SELECTED_DEVICE_NAME or "unknown", {})
 
-        print(f"[LOG] {event_type.upper()}: {message}")
+def observe_command_latency(driver_command, duration):
+    """Fold one command round trip into the device and session EWMAs"""
+    global _latency_model_unsaved
+    if driver_command in LATENCY_IGNORED_COMMANDS:
+        return
+    if driver_command in LATENCY_SOURCE_COMMANDS:
+        kind = 'source'
+    elif driver_command in LATENCY_FIND_COMMANDS:
+        kind = 'find'
+    else:
+        kind = 'simple'
+    for estimates in (get_device_latency_model(), _session_latency):
+        estimate = estimates.setdefault(kind, {'ewma': duration, 'samples': 0})
+        estimate['ewma'] += LATENCY_EWMA_ALPHA * (duration - estimate['ewma'])
+        estimate['samples'] += 1
+    _latency_model_unsaved += 1
+    if _latency_model_unsaved >= LATENCY_MODEL_SAVE_EVERY:
+        save_latency_model()
+
+def instrument_driver(driver):
+    """Time every WebDriver command round trip of this driver into the latency model"""
+    execute = driver.execute
+
+    @functools.wraps(execute)
+    def timed_execute(driver_command, params=None):
+        start = time.perf_counter()
+        try:
+            response = execute(driver_command, params)
+        except (NoSuchElementException, StaleElementReferenceException):
+            raise  # Locator misses are normal polling, the session answered
+        except Exception as e:
+            # Everything ERROR_POLICIES recovers: lost session, dead UiAutomator2, device gone
+            if HEARTBEAT['driver'] is driver and needs_recovery(e):
+                mark_session_suspect(f"{driver_command} failed: {classify_error(e)}")
+            raise
+        observe_command_latency(driver_command, time.perf_counter() - start)
+        if HEARTBEAT['driver'] is driver:
+            HEARTBEAT['last_ok'] = time.time()  # Any answered command proves the session is alive
+        return response
+
+    driver.execute = timed_execute
+    _session_latency.clear()
+    attach_heartbeat(driver)
+    return driver
 
-    except Exception as e:
-        print(f"[ERROR] Failed to log script event: {str(e)}")
+def get_latency_estimate(kind='simple'):
+    """Current round trip estimate in seconds: this session's, else the device model's, else None"""
+    estimate = _session_latency.get(kind) or get_device_latency_model().get(kind)
+    return estimate['ewma'] if estimate else None
+
+def print_latency_model():
+    """Print the session and device model latency estimates"""
+    parts = []
+    for kind in ('simple', 'find', 'source'):
+        session = _session_latency.get(kind)
+        device = get_device_latency_model().get(kind)
+        if session or device:
+            session_text = f"{session['ewma'] * 1000:.0f}ms (n={session['samples']})" if session else "-"
+            device_text = f"{device['ewma'] * 1000:.0f}ms" if device else "-"
+            parts.append(f"{kind} {session_text}, model {device_text}")
+    if parts:
+        print(f"   - Command latency: {'; '.join(parts)}")
 
 def signal_handler(sig, frame):
     """Handle Ctrl+C gracefully"""
+    if RUN_STATE['cleaned_up']:
+        return  # Cleanup already running (second Ctrl+C, or the coordinator's SIGTERM after Ctrl+C)
     print("\033[1;35m\n\n🛑 Stopping automation (Ctrl+C pressed)...\033[0m")
     print("Cleaning up...")
-    try:
-        # Try to quit driver if it exists
-        import gc
-        for obj in gc.get_objects():
-            if hasattr(obj, 'quit') and 'webdriver' in str(type(obj)):
-                obj.quit()
-                break
-    except:
-        pass
+    # Same cleanup as main()'s finally, which os._exit skips
+    cleanup_run()
     os._exit(0)
 
-def setup_driver():
-    """Initialize Appium driver with Android capabilities"""
-    global SELECTED_ADB_DEVICE, APPIUM_PORT
+def setup_driver(fast_restart=False):
+    """Initialize Appium driver with Android capabilities
+
+    fast_restart skips the UiAutomator2 server (re)install and device initialization, for a new
+    session on a phone that already had one moments ago.
+    """
+    global SELECTED_ADB_DEVICE, APPIUM_PORT, APPIUM_SYSTEM_PORT
 
     options = UiAutomator2Options()
     options.platform_name = "Android"
@@ -398,16 +751,23 @@ def setup_driver():
     else:
         print("[WARNING] No specific device UDID set, using default device")
 
+    if APPIUM_SYSTEM_PORT:
+        options.system_port = APPIUM_SYSTEM_PORT
+        print(f"[DRIVER] Using UiAutomator2 system port: {APPIUM_SYSTEM_PORT}")
+
     # Add session stability options
     options.new_command_timeout = 300  # 5 minutes timeout
     options.uiautomator2_server_launch_timeout = 60000  # 60 seconds
     options.uiautomator2_server_install_timeout = 60000  # 60 seconds
+    if fast_restart:
+        options.skip_server_installation = True
+        options.skip_device_initialization = True
 
     # Connect to Appium server using configured port
     appium_url = f"http://localhost:{APPIUM_PORT}"
     print(f"[DRIVER] Connecting to Appium server at: {appium_url}")
     driver = WebDriver(appium_url, options=options)
-    return driver
+    return instrument_driver(driver)
 
 def is_driver_alive(driver):
     """Check if the driver session is still alive"""
@@ -417,103 +777,502 @@ def is_driver_alive(driver):
     except Exception:
         return False
 
-def recover_session(driver, max_attempts=3):
-    """Attempt to recover the Appium session with multiple strategies"""
-    for attempt in range(max_attempts):
-        try:
-            print(f"[RECOVERY] Attempting to recover Appium session... (Attempt {attempt + 1}/{max_attempts})")
+# Session heartbeat: liveness comes from the commands the run already sends (instrument_driver),
+# a background thread only probes a session that has been idle and keeps the screen awake.
+HEARTBEAT_ENABLED = True        # Disable with --no-heartbeat (synchronous check before every chat)
+HEARTBEAT_INTERVAL = 5.0        # Seconds between heartbeat ticks
+HEARTBEAT_IDLE_PROBE = 20.0     # Probe when no command succeeded for this long
+HEARTBEAT_WAKE_INTERVAL = 60.0  # Seconds between KEYCODE_WAKEUP presses
+HEARTBEAT = {'driver': None, 'last_ok': 0.0, 'last_wake': 0.0, 'suspect': False,
+             'thread': None, 'stop': None, 'probes': 0, 'suspects': 0}
+
+def attach_heartbeat(driver):
+    """Track a new session: it starts healthy"""
+    HEARTBEAT['driver'] = driver
+    HEARTBEAT['last_ok'] = time.time()
+    HEARTBEAT['suspect'] = False
+
+def mark_session_suspect(reason):
+    """Flag the tracked session for the main loop, which recovers it before the next chat"""
+    if not HEARTBEAT['suspect']:
+        HEARTBEAT['suspect'] = True
+        HEARTBEAT['suspects'] += 1
+        print(f"[HEARTBEAT] Session suspect: {reason}")
+
+def keep_screen_awake(driver):
+    """Wake the screen through adb, so no UI command or tap is needed"""
+    result = adb_shell(['input', 'keyevent', 'KEYCODE_WAKEUP'], timeout=5) if shutil.which('adb') else None
+    if result is None:
+        driver.press_keycode(224)  # KEYCODE_WAKEUP through the session when there is no adb
+    HEARTBEAT['last_wake'] = time.time()
+
+# Screen timeout: KEYCODE_WAKEUP turns the screen on but doesn't reset the screen-off timer, so the
+# phone is kept on while plugged in for the whole run and the user's setting restored at exit
+STAY_AWAKE = {'previous': None}
+
+def enable_stay_awake(driver):
+    """'svc power stayon usb' for this run, remembering the previous stay_on_while_plugged_in value"""
+    previous = device_shell(driver, 'settings', ['get', 'global', 'stay_on_while_plugged_in'])
+    if previous is None or device_shell(driver, 'svc', ['power', 'stayon', 'usb']) is None:
+        print("[HEARTBEAT] Could not set 'stay awake while charging', relying on wake key presses")
+        return
+    STAY_AWAKE['previous'] = previous.strip() or "0"
+    print(f"[HEARTBEAT] Screen kept on while plugged in via USB (was stay_on_while_plugged_in={STAY_AWAKE['previous']})")
 
-            # Strategy 1: Try to gracefully quit the old session
-            if driver:
-                try:
-                    print("[RECOVERY] Attempting graceful session cleanup...")
-                    driver.quit()
-                    print("[RECOVERY] Old session cleaned up")
-                except Exception as quit_error:
-                    print(f"[RECOVERY] Session cleanup failed: {quit_error}")
+def restore_stay_awake(driver):
+    """Put stay_on_while_plugged_in back to what it was before enable_stay_awake"""
+    previous = STAY_AWAKE['previous']
+    if previous is None:
+        return
+    args = ['put', 'global', 'stay_on_while_plugged_in', previous]
+    # The session may be gone by now: adb directly
+    if device_shell(driver, 'settings', args) is None and (driver is None or device_shell(None, 'settings', args) is None):
+        print(f"[HEARTBEAT] Could not restore stay_on_while_plugged_in={previous}")
+        return
+    STAY_AWAKE['previous'] = None
+    print(f"[HEARTBEAT] Restored stay_on_while_plugged_in={previous}")
+
+def heartbeat_loop(stop):
+    """Background: probe only idle sessions, keep the screen awake"""
+    while not stop.wait(HEARTBEAT_INTERVAL):
+        driver = HEARTBEAT['driver']
+        if driver is None or HEARTBEAT['suspect']:
+            continue
+        try:
+            if time.time() - HEARTBEAT['last_ok'] >= HEARTBEAT_IDLE_PROBE:
+                HEARTBEAT['probes'] += 1
+                driver.get_window_size()
+            if time.time() - HEARTBEAT['last_wake'] >= HEARTBEAT_WAKE_INTERVAL:
+                keep_screen_awake(driver)
+        except Exception as e:
+            if HEARTBEAT['driver'] is driver:  # Not replaced by a recovery meanwhile
+                mark_session_suspect(f"idle probe failed: {e}")
 
-            # Strategy 2: Wait a bit for resources to be released
-            time.sleep(2 + attempt)  # Progressive delay
+def start_heartbeat(driver):
+    """Start the heartbeat thread for this session"""
+    attach_heartbeat(driver)
+    if not HEARTBEAT_ENABLED or HEARTBEAT['thread'] is not None:
+        return
+    HEARTBEAT['last_wake'] = time.time()
+    HEARTBEAT['stop'] = threading.Event()
+    HEARTBEAT['thread'] = threading.Thread(target=heartbeat_loop, args=(HEARTBEAT['stop'],), daemon=True)
+    HEARTBEAT['thread'].start()
+
+def stop_heartbeat():
+    """Stop the heartbeat thread before the session is closed"""
+    if HEARTBEAT['thread'] is not None:
+        HEARTBEAT['stop'].set()
+        HEARTBEAT['thread'].join(timeout=HEARTBEAT_INTERVAL)
+        HEARTBEAT['thread'] = None
+    HEARTBEAT['driver'] = None
+
+def is_session_suspect(driver):
+    """Liveness check before a chat: the heartbeat's flag, a synchronous probe without a heartbeat"""
+    if HEARTBEAT['thread'] is not None and HEARTBEAT['driver'] is driver:
+        return HEARTBEAT['suspect']
+    return not is_driver_alive(driver)
+
+def print_heartbeat_stats():
+    """Idle probes and suspect flags of the heartbeat"""
+    if HEARTBEAT['probes'] or HEARTBEAT['suspects']:
+        print(f"   - Heartbeat: {HEARTBEAT['probes']} idle probes, {HEARTBEAT['suspects']} suspect sessions")
+
+# Session recovery layers, cheapest repair first
+RECOVERY_TIER_APP = "app"                # WhatsApp lost the foreground or sits on an unexpected screen
+RECOVERY_TIER_UIA2 = "uiautomator2"      # UiAutomator2 server on the phone died, Appium session still there
+RECOVERY_TIER_SESSION = "session"        # Appium session (or the Appium server itself) gone
+RECOVERY_TIER_ADB = "adb"                # ADB transport to the phone lost
+RECOVERY_TIERS = (RECOVERY_TIER_APP, RECOVERY_TIER_UIA2, RECOVERY_TIER_SESSION, RECOVERY_TIER_ADB)
+RECOVERY_TIER_STANDBY = "standby"        # Switch to the warm standby server (--standby), before the uiautomator2/session tiers
+RECOVERY_STATS = {tier: {'attempts': 0, 'recovered': 0, 'seconds': 0.0}
+                  for tier in (RECOVERY_TIER_STANDBY,) + RECOVERY_TIERS}
+# Gap between the last send before a session failure and the first send after it
+SEND_GAP = {'last_send_at': None, 'failure_last_send_at': None}
+APP_STATE_FOREGROUND = 4  # query_app_state: running in foreground
+
+def is_adb_transport_up():
+    """True when adb sees the selected device (also when adb isn't available to check)"""
+    if not shutil.which('adb'):
+        return True
+    cmd = ['adb'] + (['-s', SELECTED_ADB_DEVICE] if SELECTED_ADB_DEVICE else []) + ['get-state']
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
+    except subprocess.TimeoutExpired:
+        return False
+    return result.stdout.strip() == 'device'
+
+def diagnose_failed_layer(driver):
+    """Find the lowest broken layer: adb transport, Appium session, UiAutomator2 server, or just the app"""
+    if not is_adb_transport_up():
+        return RECOVERY_TIER_ADB
+    if driver is None:
+        return RECOVERY_TIER_SESSION
+    try:
+        # Answered by Appium over adb, the UiAutomator2 server is not involved
+        app_state = driver.query_app_state("com.whatsapp")
+    except Exception as e:
+        print(f"[RECOVERY] Session check failed: {e}")
+        return RECOVERY_TIER_SESSION
+    try:
+        driver.get_window_size()  # Proxied to the UiAutomator2 server
+    except Exception as e:
+        print(f"[RECOVERY] UiAutomator2 check failed: {e}")
+        return RECOVERY_TIER_UIA2
+    if app_state != APP_STATE_FOREGROUND:
+        print(f"[RECOVERY] WhatsApp not in the foreground (app state {app_state})")
+    return RECOVERY_TIER_APP
+
+def quit_driver_quietly(driver, timeout=None):
+    """Best-effort quit of a session that may already be dead
+
+    With a timeout the quit runs in a helper thread and is abandoned after that many seconds, so a
+    hung server can't stall recovery.
+    """
+    if driver is None:
+        return
 
-            # Strategy 3: Create new session with enhanced error handling
-            try:
-                print("[RECOVERY] Creating new Appium session...")
-                new_driver = setup_driver()
-                print("[RECOVERY] New session created successfully")
-            except Exception as setup_error:
-                print(f"[RECOVERY] Failed to create new session: {setup_error}")
-                if attempt < max_attempts - 1:
-                    print(f"[RECOVERY] Retrying in {3 + attempt} seconds...")
-                    time.sleep(3 + attempt)
-                    continue
-                else:
-                    return None
+    def quit_session():
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"[RECOVERY] Session cleanup failed: {e}")
 
-            # Strategy 4: Re-initialize device and WhatsApp
-            print("[RECOVERY] Re-initializing device and WhatsApp...")
+    if timeout is None:
+        quit_session()
+        return
+    quit_thread = threading.Thread(target=quit_session, daemon=True)
+    quit_thread.start()
+    quit_thread.join(timeout)
+    if quit_thread.is_alive():
+        print(f"[RECOVERY] Session did not quit within {timeout}s, continuing without it")
+
+def is_device_locked(driver):
+    """Lock screen showing? (False when the driver can't tell)"""
+    try:
+        return bool(driver.is_locked())
+    except Exception as e:
+        print(f"[RECOVERY] Could not read lock state: {e}")
+        return False
 
-            # Turn on screen and unlock
-            unlock_success = turn_screen_on_and_unlock(new_driver)
-            if not unlock_success:
-                print("[RECOVERY] Failed to unlock device")
-                if attempt < max_attempts - 1:
-                    try:
-                        new_driver.quit()
-                    except:
-                        pass
-                    continue
-                else:
-                    return None
+def repair_app(driver):
+    """Bring WhatsApp back to the front and onto the chat list, unlocking the phone first if it locked"""
+    if is_device_locked(driver):
+        # activate_app and BACK presses can't get past the lock screen, no point escalating
+        print("[RECOVERY] Device is locked, waking and unlocking it")
+        turn_screen_on_and_unlock(driver)
+    driver.activate_app("com.whatsapp")
+    screen, _ = navigate_to(driver, SCREEN_HOME)
+    return driver if screen == SCREEN_HOME else None
+
+def repair_uiautomator2(driver):
+    """New session on the already installed UiAutomator2 server, no device re-initialization"""
+    quit_driver_quietly(driver, timeout=SESSION_QUIT_TIMEOUT)
+    new_driver = setup_driver(fast_restart=True)
+    if repair_app(new_driver):
+        return new_driver
+    quit_driver_quietly(new_driver)
+    return None
 
-            # Brief pause for device to stabilize
-            adaptive_wait(new_driver, 1.5, 3.0)
+def repair_session(driver):
+    """Restart the Appium server if it is down, then a full new session"""
+    if not is_appium_server_running(APPIUM_PORT):
+        print(f"[RECOVERY] Appium server on port {APPIUM_PORT} is down, restarting it...")
+        start_appium_server(APPIUM_PORT)
+    quit_driver_quietly(driver)
+    new_driver = setup_driver()
+    if repair_app(new_driver):
+        return new_driver
+    # The phone may have locked meanwhile
+    if turn_screen_on_and_unlock(new_driver) and open_whatsapp_business(new_driver):
+        return new_driver
+    quit_driver_quietly(new_driver)
+    return None
 
-            # Open WhatsApp with improved detection
-            whatsapp_success = open_whatsapp_business(new_driver)
-            if whatsapp_success:
-                print("[RECOVERY] Session recovered successfully!")
-                return new_driver
-            else:
-                print("[RECOVERY] Failed to re-open WhatsApp")
-                if attempt < max_attempts - 1:
-                    try:
-                        new_driver.quit()
-                    except:
-                        pass
-                    continue
-                else:
-                    return None
+def repair_adb(driver):
+    """Reconnect the adb transport, then rebuild the session from scratch"""
+    if not shutil.which('adb'):
+        return None
+    serial = ['-s', SELECTED_ADB_DEVICE] if SELECTED_ADB_DEVICE else []
+    try:
+        subprocess.run(['adb'] + serial + ['reconnect'], capture_output=True, text=True, timeout=15)
+        subprocess.run(['adb'] + serial + ['wait-for-device'], capture_output=True, text=True, timeout=30)
+    except subprocess.TimeoutExpired:
+        print("[RECOVERY] Device did not come back on adb")
+        return None
+    quit_driver_quietly(driver)
+    new_driver = setup_driver()
+    if turn_screen_on_and_unlock(new_driver):
+        adaptive_wait(new_driver, 1.5, 3.0)
+        if open_whatsapp_business(new_driver):
+            return new_driver
+    quit_driver_quietly(new_driver)
+    return None
 
-        except Exception as e:
-            print(f"[RECOVERY] Recovery attempt {attempt + 1} failed: {str(e)}")
-            if attempt < max_attempts - 1:
-                print(f"[RECOVERY] Retrying recovery in {3 + attempt} seconds...")
-                time.sleep(3 + attempt)
-            else:
-                print("[RECOVERY] All recovery attempts failed")
-                return None
+def prepare_standby():
+    """Background: get the standby Appium server up and validated"""
+    port = STANDBY['port']
+    if not is_appium_server_running(port):
+        process, log_file = start_appium_server(port)
+        if process is not None:
+            STANDBY['servers'].append((process, log_file))
+    STANDBY['ready'] = is_appium_server_running(port)
+    print(f"[STANDBY] Standby Appium server on port {port} {'ready' if STANDBY['ready'] else 'NOT available'}")
+
+def start_standby_rebuild():
+    """Rebuild the standby in a background thread so the running session isn't blocked"""
+    STANDBY['ready'] = False
+    STANDBY['thread'] = threading.Thread(target=prepare_standby, daemon=True)
+    STANDBY['thread'].start()
+
+def stop_standby_servers():
+    """Stop the Appium servers started for the standby and close their logs"""
+    if STANDBY['thread'] is not None:
+        STANDBY['thread'].join(timeout=SESSION_QUIT_TIMEOUT)
+    stop_appium_servers(STANDBY['servers'])
+
+def failover_to_standby(driver):
+    """Swap primary and standby servers and start a fast session on the standby, None if it isn't ready"""
+    global APPIUM_PORT, APPIUM_SYSTEM_PORT
+    if not STANDBY['ready']:
+        print("[STANDBY] No standby ready, skipping failover")
+        return None
+    APPIUM_PORT, STANDBY['port'] = STANDBY['port'], APPIUM_PORT
+    APPIUM_SYSTEM_PORT, STANDBY['system_port'] = STANDBY['system_port'], APPIUM_SYSTEM_PORT
+    print(f"[STANDBY] Failing over to port {APPIUM_PORT} (system port {APPIUM_SYSTEM_PORT})")
+    # The dead session still owns the device's UiAutomator2 instrumentation: end it before the new one starts
+    quit_driver_quietly(driver, timeout=SESSION_QUIT_TIMEOUT)
+    try:
+        new_driver = setup_driver(fast_restart=True)
+        if not repair_app(new_driver):
+            quit_driver_quietly(new_driver)
+            new_driver = None
+    except Exception as e:
+        print(f"[STANDBY] Standby session failed: {e}")
+        new_driver = None
+    if new_driver is None:
+        # Back to the old primary, the failed standby gets rebuilt
+        APPIUM_PORT, STANDBY['port'] = STANDBY['port'], APPIUM_PORT
+        APPIUM_SYSTEM_PORT, STANDBY['system_port'] = STANDBY['system_port'], APPIUM_SYSTEM_PORT
+        start_standby_rebuild()
+        return None
+    # The old primary becomes the next standby
+    start_standby_rebuild()
+    return new_driver
+
+def note_successful_send():
+    """Remember the send time, and report the send gap when it is the first send after a failure"""
+    now = time.time()
+    if SEND_GAP['failure_last_send_at'] is not None:
+        gap = now - SEND_GAP['failure_last_send_at']
+        record_metric("failover_send_gap", gap)
+        print(f"[RECOVERY] Send gap across the session failure: {gap:.2f}s")
+        SEND_GAP['failure_last_send_at'] = None
+    SEND_GAP['last_send_at'] = now
+
+RECOVERY_REPAIRS = {
+    RECOVERY_TIER_STANDBY: failover_to_standby,
+    RECOVERY_TIER_APP: repair_app,
+    RECOVERY_TIER_UIA2: repair_uiautomator2,
+    RECOVERY_TIER_SESSION: repair_session,
+    RECOVERY_TIER_ADB: repair_adb,
+}
 
+@timed_step("recover_session")
+def recover_session(driver, max_attempts=3):
+    """Repair only the layer that failed, escalating to the next tier when a repair doesn't work"""
+    if SEND_GAP['failure_last_send_at'] is None:
+        SEND_GAP['failure_last_send_at'] = SEND_GAP['last_send_at']
+    for attempt in range(max_attempts):
+        first_tier = diagnose_failed_layer(driver)
+        print(f"[RECOVERY] Attempt {attempt + 1}/{max_attempts}: failed layer looks like '{first_tier}'")
+        tiers = RECOVERY_TIERS[RECOVERY_TIERS.index(first_tier):]
+        if STANDBY_ENABLED and first_tier in (RECOVERY_TIER_UIA2, RECOVERY_TIER_SESSION):
+            tiers = (RECOVERY_TIER_STANDBY,) + tiers
+        for tier in tiers:
+            tier_start = time.time()
+            try:
+                new_driver = RECOVERY_REPAIRS[tier](driver)
+            except Exception as e:
+                print(f"[RECOVERY] {tier} repair failed: {e}")
+                new_driver = None
+            tier_time = time.time() - tier_start
+            RECOVERY_STATS[tier]['attempts'] += 1
+            RECOVERY_STATS[tier]['seconds'] += tier_time
+            record_metric(f"recover_tier_{tier}", tier_time, "ok" if new_driver else "fail")
+            if new_driver:
+                RECOVERY_STATS[tier]['recovered'] += 1
+                print(f"[RECOVERY] Recovered at the {tier} tier in {tier_time:.2f}s")
+                attach_heartbeat(new_driver)  # Also clears the suspect flag when the same session was repaired
+                return new_driver
+            print(f"[RECOVERY] {tier} repair didn't work ({tier_time:.2f}s), escalating")
+            if tier not in (RECOVERY_TIER_APP, RECOVERY_TIER_STANDBY):
+                driver = None  # Quit by the failed repair
+        if attempt < max_attempts - 1:
+            print(f"[RECOVERY] Retrying recovery in {3 + attempt} seconds...")
+            time.sleep(3 + attempt)
+    print("[RECOVERY] All recovery attempts failed")
     return None
 
+def print_recovery_stats():
+    """Per recovery tier: how often it ran, how often it fixed the session and how long it took"""
+    parts = [f"{tier} {stats['recovered']}/{stats['attempts']} in {stats['seconds'] / stats['attempts']:.1f}s avg"
+             for tier, stats in RECOVERY_STATS.items() if stats['attempts']]
+    if parts:
+        print(f"   - Recovery: {'; '.join(parts)}")
+
+# Error taxonomy: what failed decides how often to retry and whether a session recovery is worth it
+ERROR_STALE_ELEMENT = "stale_element"            # Element reference outlived a re-render
+ERROR_LOCATOR_TIMEOUT = "locator_timeout"        # Element not found in time, the session itself is fine
+ERROR_APP_NOT_FOREGROUND = "app_not_foreground"  # Element not found because WhatsApp isn't in front
+ERROR_UIA2_CRASH = "uia2_crash"                  # UiAutomator2 instrumentation on the phone died
+ERROR_SESSION_LOST = "session_lost"              # Appium session gone or its HTTP connection failed
+ERROR_DEVICE_OFFLINE = "device_offline"          # adb lost the phone
+ERROR_OTHER = "other"
+# retries: extra attempts in safe_operation, backoff: first retry delay in seconds (doubles per retry),
+# action: 'refocus' brings WhatsApp back in place, 'recover' needs recover_session (never retried as is),
+# breaker: counts towards the device circuit breaker
+ERROR_POLICIES = {
+    ERROR_STALE_ELEMENT:      {'retries': 2, 'backoff': 0.2, 'action': None,      'breaker': False},
+    ERROR_LOCATOR_TIMEOUT:    {'retries': 1, 'backoff': 0.5, 'action': None,      'breaker': False},
+    ERROR_APP_NOT_FOREGROUND: {'retries': 1, 'backoff': 0.0, 'action': 'refocus', 'breaker': False},
+    ERROR_UIA2_CRASH:         {'retries': 0, 'backoff': 0.0, 'action': 'recover', 'breaker': True},
+    ERROR_SESSION_LOST:       {'retries': 0, 'backoff': 0.0, 'action': 'recover', 'breaker': True},
+    ERROR_DEVICE_OFFLINE:     {'retries': 0, 'backoff': 0.0, 'action': 'recover', 'breaker': True},
+    ERROR_OTHER:              {'retries': 1, 'backoff': 1.0, 'action': None,      'breaker': False},
+}
+ERROR_STATS = {error_type: {'count': 0, 'retries': 0, 'recoveries': 0} for error_type in ERROR_POLICIES}
+# Appium/UiAutomator2 error texts for failures that have no exception type of their own
+UIA2_CRASH_SIGNATURES = ("instrumentation process is not running", "cannot be proxied to uiautomator2 server")
+DEVICE_OFFLINE_SIGNATURES = ("device offline", "could not find a connected android device", "device not found")
+
+def classify_error(error, driver=None):
+    """Error type (ERROR_*) of an exception, counted once per exception
+
+    With a driver, locator failures are checked against the app state (one adb round trip) to tell
+    a missing element from WhatsApp having left the foreground.
+    """
+    error_type = getattr(error, 'wa_error_type', None)
+    if error_type:
+        return error_type
+    message = str(error).lower()
+    if isinstance(error, StaleElementReferenceException):
+        error_type = ERROR_STALE_ELEMENT
+    elif isinstance(error, (InvalidSessionIdException, ConnectionError, Urllib3HTTPError)):
+        error_type = ERROR_SESSION_LOST if is_adb_transport_up() else ERROR_DEVICE_OFFLINE
+    elif isinstance(error, WebDriverException) and any(signature in message for signature in UIA2_CRASH_SIGNATURES):
+        error_type = ERROR_UIA2_CRASH
+    elif isinstance(error, WebDriverException) and any(signature in message for signature in DEVICE_OFFLINE_SIGNATURES):
+        error_type = ERROR_DEVICE_OFFLINE
+    elif isinstance(error, (NoSuchElementException, TimeoutException)):
+        error_type = ERROR_LOCATOR_TIMEOUT
+        if driver is not None:
+            try:
+                if driver.query_app_state("com.whatsapp") != APP_STATE_FOREGROUND:
+                    error_type = ERROR_APP_NOT_FOREGROUND
+            except Exception:
+                error_type = ERROR_SESSION_LOST
+    else:
+        error_type = ERROR_OTHER
+    try:
+        error.wa_error_type = error_type
+    except AttributeError:
+        pass
+    ERROR_STATS[error_type]['count'] += 1
+    return error_type
+
+def needs_recovery(error, driver=None):
+    """True when the error means the session (or device) has to be recovered, not retried"""
+    return ERROR_POLICIES[classify_error(error, driver)]['action'] == 'recover'
+
+# Per-device circuit breaker: stop hammering a device whose session keeps failing
+BREAKER_THRESHOLD = 4        # Device-level failures within BREAKER_WINDOW that open the breaker
+BREAKER_WINDOW = 300         # Seconds
+BREAKER_COOLDOWN = 60        # First open period in seconds, doubles on every re-open
+BREAKER_MAX_COOLDOWN = 900
+CIRCUIT_BREAKERS = {}        # device -> {'failures': [ts], 'open_until': ts or None, 'cooldown': s, 'opened': n}
+
+def get_circuit_breaker():
+    """Breaker state of the selected device"""
+    return CIRCUIT_BREAKERS.setdefault(SELECTED_ADB_DEVICE or "default",
+                                       {'failures': [], 'open_until': None, 'cooldown': BREAKER_COOLDOWN, 'opened': 0})
+
+def record_device_failure(error_type):
+    """Count a device-level failure, opening the breaker at the threshold (or at once while half-open)"""
+    if not ERROR_POLICIES[error_type]['breaker']:
+        return
+    breaker = get_circuit_breaker()
+    now = time.time()
+    breaker['failures'] = [ts for ts in breaker['failures'] if now - ts < BREAKER_WINDOW] + [now]
+    half_open = breaker['open_until'] is not None and now >= breaker['open_until']
+    if half_open or len(breaker['failures']) >= BREAKER_THRESHOLD:
+        breaker['open_until'] = now + breaker['cooldown']
+        print(f"[BREAKER] Device {SELECTED_ADB_DEVICE or 'default'} keeps failing ({error_type}), "
+              f"pausing it for {breaker['cooldown']}s")
+        breaker['cooldown'] = min(breaker['cooldown'] * 2, BREAKER_MAX_COOLDOWN)
+        breaker['opened'] += 1
+        breaker['failures'] = []
+
+def record_device_success():
+    """A send worked: forget failures and close a half-open breaker"""
+    breaker = get_circuit_breaker()
+    breaker['failures'] = []
+    if breaker['open_until'] is not None:
+        print(f"[BREAKER] Device {SELECTED_ADB_DEVICE or 'default'} is healthy again, breaker closed")
+        breaker['open_until'] = None
+        breaker['cooldown'] = BREAKER_COOLDOWN
+
+def wait_for_circuit_breaker(worker_mode=False):
+    """Honour an open breaker: workers stop (the other devices take the queue), a single device waits
+
+    Returns False when processing should stop.
+    """
+    breaker = get_circuit_breaker()
+    remaining = (breaker['open_until'] or 0) - time.time()
+    if remaining <= 0:
+        return True
+    if worker_mode:
+        print(f"[BREAKER] Breaker open, stopping this worker so the other devices take its chats")
+        return False
+    print(f"[BREAKER] Breaker open, waiting {remaining:.0f}s before trying the device again")
+    time.sleep(remaining)
+    return True
+
+def print_error_stats():
+    """Per error type: how often it happened, was retried and led to a session recovery"""
+    parts = [f"{error_type} {stats['count']} ({stats['retries']} retried, {stats['recoveries']} recovered)"
+             for error_type, stats in ERROR_STATS.items() if stats['count']]
+    if parts:
+        print(f"   - Errors: {'; '.join(parts)}")
+    opened = sum(breaker['opened'] for breaker in CIRCUIT_BREAKERS.values())
+    if opened:
+        print(f"   - Circuit breaker opened {opened}x")
+
 def safe_operation(operation, *args, retry_count=2, **kwargs):
-    """Wrapper for safe execution of operations with auto-retry and recovery"""
+    """Run an operation (driver as first argument), retrying as the error type's policy allows
+
+    Errors that need a session recovery are raised at once, the caller owns the driver.
+    """
     for attempt in range(retry_count + 1):
         try:
             return operation(*args, **kwargs)
         except Exception as e:
-            print(f"[SAFE_OP] Operation '{operation.__name__}' failed (attempt {attempt + 1}): {e}")
-
-            # Check if it's a driver-related error that needs recovery
-            driver_errors = ["session", "connection", "socket", "timeout", "network"]
-            if any(error_term in str(e).lower() for error_term in driver_errors):
-                print(f"[SAFE_OP] Detected driver-related error, may need session recovery")
-
-            if attempt < retry_count:
-                print(f"[SAFE_OP] Retrying operation in {1 + attempt} seconds...")
-                time.sleep(1 + attempt)
-            else:
-                print(f"[SAFE_OP] Operation '{operation.__name__}' failed after {retry_count + 1} attempts")
-                raise e
+            driver = args[0] if args else None
+            error_type = classify_error(e, driver)
+            policy = ERROR_POLICIES[error_type]
+            print(f"[SAFE_OP] Operation '{operation.__name__}' failed with {error_type} (attempt {attempt + 1}): {e}")
+            if policy['action'] == 'recover' or attempt >= min(retry_count, policy['retries']):
+                raise
+            if policy['action'] == 'refocus':
+                try:
+                    repair_app(driver)
+                except Exception as repair_error:
+                    if needs_recovery(repair_error):
+                        raise repair_error from e  # The session is gone, the caller recovers it
+                    print(f"[SAFE_OP] Refocusing WhatsApp failed, retrying anyway: {repair_error}")
+            delay = policy['backoff'] * (2 ** attempt)
+            ERROR_STATS[error_type]['retries'] += 1
+            print(f"[SAFE_OP] Retrying operation in {delay:.1f} seconds...")
+            time.sleep(delay)
 
 
 def turn_screen_on_and_unlock(driver):
@@ -529,11 +1288,15 @@ def turn_screen_on_and_unlock(driver):
         screen_size = driver.get_window_size()
         print(f"Screen active - size: {screen_size['width']}x{screen_size['height']}")
         
-        # Single wake signal and minimal user activity to prevent sleep
-        driver.press_keycode(224)  # KEYCODE_WAKEUP
-        driver.tap([(50, 50)])  # Single tap to simulate user presence
-        
-        print("Device unlocked and kept awake")
+        # Dismiss a swipe lock screen (no-op when already unlocked); PIN/pattern needs the unlock capabilities
+        if is_device_locked(driver):
+            driver.unlock()
+            if is_device_locked(driver):
+                print("Device is still locked")
+                return False
+
+        # Staying awake is the heartbeat's job (keep_screen_awake), no tap on whatever is at the top left
+        print("Device unlocked")
         return True
             
     except Exception as e:
@@ -542,46 +1305,292 @@ def turn_screen_on_and_unlock(driver):
 
 
 
+# Locator registry: every element the script looks up by locator, declared once as attribute specs
+# (alternatives in priority order) and compiled to the fastest strategy UiAutomator2 offers.
+# Spec keys: id / id_contains, class, text / text_contains / text_matches, desc / desc_contains, xpath
+UI_ELEMENTS = {
+    'home_loaded': [{'id': 'fab'}, {'id': 'menuitem_search'}, {'id': 'search'},
+                    {'text': 'Chats'}, {'text': 'WhatsApp'}],
+    'home_fab': [{'id': 'fab'}],
+    'whatsapp_icon': [{'class': 'android.widget.TextView', 'text': 'WhatsApp'},
+                      {'class': 'android.widget.TextView', 'text': 'WA'},
+                      {'text_contains': 'WhatsApp'}, {'desc': 'WhatsApp'}, {'desc_contains': 'WhatsApp'}],
+    'search_button': [{'id': 'menuitem_search'}, {'id': 'search_bar_inner_layout'}],
+    'search_input': [{'id': 'search_src_text'}],
+    'chats_section_title': [{'id': 'title', 'text_matches': '(?i)chats'}],
+    'contact_row': [{'id': 'contact_row_container'}],
+    'no_results': [{'text_contains': 'No results'}],
+    'message_input': [{'id': 'entry'}, {'class': 'android.widget.EditText', 'id_contains': 'entry'}],
+    'attach_button': [{'id': 'attach'}, {'class': 'android.widget.ImageButton', 'id_contains': 'attach'}],
+    'gallery_button': [{'text': 'Gallery'}],
+    'caption_input': [{'id': 'caption'}],
+    'send_button': [{'id': 'send'}, {'class': 'android.widget.ImageButton', 'id_contains': 'send'}],
+    'forward_action': [{'id': 'menuitem_forward'}, {'desc': 'Forward'}],
+}
+
+# UiSelector method for each spec key, in the order they are chained
+UISELECTOR_METHODS = (('id', 'resourceId'), ('id_contains', 'resourceIdMatches'), ('class', 'className'),
+                      ('text', 'text'), ('text_contains', 'textContains'), ('text_matches', 'textMatches'),
+                      ('desc', 'description'), ('desc_contains', 'descriptionContains'))
+
+_compiled_locators = {}
+
+# Which alternative of each element matches, learned per device model and WhatsApp version
+# (locator_stats in the campaign store: workers add their counts, nobody rewrites the others')
+LOCATOR_STATS_SAVE_EVERY = 20  # Unsaved updates before they are added to the campaign store
+_locator_stats = None          # device model -> {'whatsapp_version': ..., 'elements': {...}} as read from the store
+_locator_stats_pending = {}    # (device model, element, locator key) -> [hits, misses, total hit ms] not saved yet
+_locator_stats_unsaved = 0
+
+def full_resource_id(resource_id):
+    """'entry' -> 'com.whatsapp:id/entry' (ids with a package are kept)"""
+    return resource_id if ':id/' in resource_id else f"com.whatsapp:id/{resource_id}"
+
+def compile_locator(spec):
+    """Compile one spec: resource id > accessibility id > one UiSelector chain, XPath only when given as such"""
+    if 'xpath' in spec:
+        return (AppiumBy.XPATH, spec['xpath'])
+    if set(spec) == {'id'}:
+        return (AppiumBy.ID, full_resource_id(spec['id']))
+    if set(spec) == {'desc'}:
+        return (AppiumBy.ACCESSIBILITY_ID, spec['desc'])
+    chain = "new UiSelector()"
+    for key, method in UISELECTOR_METHODS:
+        if key not in spec:
+            continue
+        value = spec[key]
+        if key == 'id':
+            value = full_resource_id(value)
+        elif key == 'id_contains':
+            value = f".*{re.escape(value)}.*"
+        chain += f".{method}({json.dumps(value, ensure_ascii=False)})"
+    return (AppiumBy.ANDROID_UIAUTOMATOR, chain)
+
+def spec_to_xpath(spec):
+    """Equivalent XPath of a spec (what the old selector lists used), for comparisons"""
+    if 'xpath' in spec:
+        return spec['xpath']
+    conditions = []
+    if 'id' in spec:
+        conditions.append(f"@resource-id='{full_resource_id(spec['id'])}'")
+    if 'id_contains' in spec:
+        conditions.append(f"contains(@resource-id, '{spec['id_contains']}')")
+    if 'text' in spec:
+        conditions.append(f"@text='{spec['text']}'")
+    if 'text_contains' in spec:
+        conditions.append(f"contains(@text, '{spec['text_contains']}')")
+    if 'text_matches' in spec:
+        literal = re.sub(r"^\(\?i\)", "", spec['text_matches'])
+        conditions.append(f"translate(@text, '{literal.upper()}', '{literal.lower()}')='{literal.lower()}'")
+    if 'desc' in spec:
+        conditions.append(f"@content-desc='{spec['desc']}'")
+    if 'desc_contains' in spec:
+        conditions.append(f"contains(@content-desc, '{spec['desc_contains']}')")
+    node_test = spec.get('class', '*')
+    return f"//{node_test}[{' and '.join(conditions)}]" if conditions else f"//{node_test}"
+
+def get_locators(name):
+    """Compiled (strategy, value) pairs of a registry element, duplicates removed
+
+    Ordered by what won on this device model and WhatsApp version: winners first (most hits, then
+    fastest), untried alternatives in declaration order, alternatives that never matched last.
+    """
+    if name not in _compiled_locators:
+        locators = []
+        for spec in UI_ELEMENTS[name]:
+            locator = compile_locator(spec)
+            if locator not in locators:
+                locators.append(locator)
+        _compiled_locators[name] = locators
+    element_stats = get_device_locator_stats()['elements'].get(name, {})
+
+    def learned_rank(locator):
+        stats = element_stats.get(locator_key(locator))
+        if not stats:
+            return (1, 0, 0)
+        if stats['hits']:
+            return (0, -stats['hits'], stats['avg_ms'])
+        return (2, 0, 0)
+
+    return sorted(_compiled_locators[name], key=learned_rank)
+
+def locator_key(locator):
+    """JSON key of a compiled locator"""
+    return f"{locator[0]}|{locator[1]}"
+
+def load_locator_stats():
+    """Load the per-device locator statistics from the campaign store (again after every save)"""
+    global _locator_stats
+    if _locator_stats is None:
+        conn = get_campaign_store()
+        _locator_stats = {}
+        for device_model, version in conn.execute("SELECT device_model, whatsapp_version FROM locator_versions"):
+            _locator_stats[device_model] = {'whatsapp_version': version, 'elements': {}}
+        for device_model, element, key, hits, misses, avg_ms in conn.execute(
+                "SELECT device_model, element, locator, hits, misses, avg_ms FROM locator_stats"):
+            device_stats = _locator_stats.setdefault(device_model, {'whatsapp_version': None, 'elements': {}})
+            device_stats['elements'].setdefault(element, {})[key] = {'hits': hits, 'misses': misses, 'avg_ms': avg_ms}
+        # Counts not saved yet stay visible to the ranking
+        for (device_model, element, key), (hits, misses, hit_ms) in _locator_stats_pending.items():
+            device_stats = _locator_stats.setdefault(device_model, {'whatsapp_version': None, 'elements': {}})
+            add_locator_counts(device_stats['elements'].setdefault(element, {}), key, hits, misses, hit_ms)
+    return _locator_stats
+
+def add_locator_counts(element_stats, key, hits, misses, hit_ms):
+    """Add hits (with their total lookup time) and misses to one alternative's in-memory statistics"""
+    stats = element_stats.setdefault(key, {'hits': 0, 'misses': 0, 'avg_ms': 0.0})
+    if hits:
+        stats['avg_ms'] = round((stats['avg_ms'] * stats['hits'] + hit_ms) / (stats['hits'] + hits), 1)
+    stats['hits'] += hits
+    stats['misses'] += misses
+
+def save_locator_stats():
+    """Add this process's unsaved counts to the campaign store, the next read picks up the other workers' counts"""
+    global _locator_stats, _locator_stats_unsaved
+    if not _locator_stats_pending:
+        return
+    conn = get_campaign_store()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for (device_model, element, key), (hits, misses, hit_ms) in _locator_stats_pending.items():
+            conn.execute(
+                "INSERT INTO locator_stats (device_model, element, locator, hits, misses, avg_ms) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (device_model, element, locator) DO UPDATE SET "
+                "avg_ms = ROUND((avg_ms * hits + excluded.avg_ms * excluded.hits) / MAX(hits + excluded.hits, 1), 1), "
+                "hits = hits + excluded.hits, misses = misses + excluded.misses",
+                (device_model, element, key, hits, misses, round(hit_ms / hits, 1) if hits else 0.0)
+            )
+        conn.execute("COMMIT")
+    except Exception as e:
+        try:
+            conn.execute("ROLLBACK")
+        except Exception:
+            pass
+        print(f"[LOCATORS] Failed to save locator stats: {e}")
+        return
+    _locator_stats_pending.clear()
+    _locator_stats_unsaved = 0
+    _locator_stats = None
+
+def get_device_locator_stats():
+    """Statistics of the current device model: {'whatsapp_version': ..., 'elements': {...}}"""
+    return load_locator_stats().setdefault(SELECTED_DEVICE_NAME or "unknown",
+                                           {'whatsapp_version': None, 'elements': {}})
+
+def get_whatsapp_version(driver):
+    """Installed WhatsApp versionName (None when no shell is available)"""
+    output = device_shell(driver, 'dumpsys', ['package', 'com.whatsapp'])
+    match = re.search(r"versionName=(\S+)", output or "")
+    return match.group(1) if match else None
+
+def check_locator_stats_version(driver):
+    """Reset this device model's locator statistics when the WhatsApp version changed"""
+    global _locator_stats
+    version = get_whatsapp_version(driver)
+    if version is None:
+        return
+    device_stats = get_device_locator_stats()
+    if device_stats['whatsapp_version'] == version:
+        return
+    device_model = SELECTED_DEVICE_NAME or "unknown"
+    conn = get_campaign_store()
+    reset = False
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Another worker with the same model may have reset it already
+        row = conn.execute("SELECT whatsapp_version FROM locator_versions WHERE device_model = ?", (device_model,)).fetchone()
+        if row and row[0] is not None and row[0] != version:
+            print(f"[LOCATORS] WhatsApp {row[0]} -> {version}, selector statistics reset")
+            conn.execute("DELETE FROM locator_stats WHERE device_model = ?", (device_model,))
+            reset = True
+        conn.execute("INSERT OR REPLACE INTO locator_versions (device_model, whatsapp_version) VALUES (?, ?)",
+                     (device_model, version))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if reset:
+        # Counts of this run were made against the old version too
+        for pending_key in [key for key in _locator_stats_pending if key[0] == device_model]:
+            del _locator_stats_pending[pending_key]
+    _locator_stats = None
+
+def record_locator_result(name, locator, matched, duration=None):
+    """Count a hit (with its lookup time) or a miss for one alternative of an element"""
+    global _locator_stats_unsaved
+    key = locator_key(locator)
+    hits, misses, hit_ms = (1, 0, duration * 1000) if matched else (0, 1, 0.0)
+    add_locator_counts(get_device_locator_stats()['elements'].setdefault(name, {}), key, hits, misses, hit_ms)
+    pending = _locator_stats_pending.setdefault((SELECTED_DEVICE_NAME or "unknown", name, key), [0, 0, 0.0])
+    pending[0] += hits
+    pending[1] += misses
+    pending[2] += hit_ms
+    _locator_stats_unsaved += 1
+    if _locator_stats_unsaved >= LOCATOR_STATS_SAVE_EVERY:
+        save_locator_stats()
+
+def print_locator_stats():
+    """Print which alternative wins for each element on each device model"""
+    stats = load_locator_stats()
+    if not stats:
+        print(f"[LOCATORS] No locator statistics in {CAMPAIGN_STORE_FILE} yet")
+        return
+    for device_model, device_stats in stats.items():
+        print(f"\n[LOCATORS] {device_model} (WhatsApp {device_stats['whatsapp_version'] or 'unknown'})")
+        for name, element_stats in sorted(device_stats['elements'].items()):
+            for key, entry in sorted(element_stats.items(), key=lambda item: -item[1]['hits']):
+                print(f"   {name:<20} {entry['hits']:>5} hits {entry['misses']:>5} misses {entry['avg_ms']:>7.1f}ms  {key}")
+
+def find_ui_element(driver, name, timeout=0, poll_frequency=0.3):
+    """First displayed element of a registry entry, trying every alternative on each poll
+
+    The alternative that matched is recorded as a hit, the ones tried before it in the same pass
+    as misses. Returns None when nothing matched within the timeout (timeout=0 is a single pass).
+    """
+    deadline = time.time() + timeout
+    while True:
+        missed = []
+        for locator in get_locators(name):
+            lookup_start = time.time()
+            try:
+                for element in driver.find_elements(*locator):
+                    if element.is_displayed():
+                        record_locator_result(name, locator, True, time.time() - lookup_start)
+                        for missed_locator in missed:
+                            record_locator_result(name, missed_locator, False)
+                        return element
+            except Exception:
+                continue  # Stale element or a strategy the server rejects, try the next one
+            missed.append(locator)
+        if time.time() >= deadline:
+            return None
+        time.sleep(poll_frequency)
+
 def wait_for_whatsapp_loaded(driver, timeout=15):
     """Wait for WhatsApp to be fully loaded with proper backend checks"""
     print("[LOAD] Waiting for WhatsApp to fully load...")
-    wait = WebDriverWait(driver, timeout)
 
     try:
-        # Combined XPath for parallel search - finds any of these elements at once
-        combined_xpath = (
-            "//*[@text='WhatsApp'] | "
-            "//*[@text='Chats'] | "
-            "//*[@resource-id='com.whatsapp:id/menuitem_search'] | "
-            "//*[@resource-id='com.whatsapp:id/search'] | "
-            "//*[@resource-id='com.whatsapp:id/fab']"
-        )
-
-        # Wait for at least one main indicator to be present
+        # Wait for at least one main indicator (FAB, search, "Chats" title...) to be displayed
         element_found = False
         found_element_name = None
-        try:
-            elements = wait.until(EC.presence_of_all_elements_located((AppiumBy.XPATH, combined_xpath)))
-            for element in elements:
-                if element.is_displayed():
-                    # Get element details for logging
-                    try:
-                        found_element_name = element.get_attribute('text') or element.get_attribute('resource-id') or "main element"
-                    except:
-                        found_element_name = "main element"
-                    print(f"[LOAD] Found main element: {found_element_name}")
-                    element_found = True
-                    break
-        except TimeoutException:
-            pass
+        element = find_ui_element(driver, 'home_loaded', timeout=timeout)
+        if element is not None:
+            # Get element details for logging
+            try:
+                found_element_name = element.get_attribute('text') or element.get_attribute('resource-id') or "main element"
+            except:
+                found_element_name = "main element"
+            print(f"[LOAD] Found main element: {found_element_name}")
+            element_found = True
 
         if not element_found:
             print("[LOAD] No main WhatsApp elements found")
             return False
 
-        # Additional stability check - wait a bit more for backend to settle
+        # Additional stability check - wait for the screen to stop changing (max 2.5s)
         print(f"[LOAD] Main element '{found_element_name}' found, waiting for backend stability...")
-        time.sleep(2.5)  # Allow backend processes to complete
+        wait_for_screen_settled(driver, timeout=2.5, label="WhatsApp load")
 
         # Verify app is still responsive
         try:
@@ -596,6 +1605,7 @@ def wait_for_whatsapp_loaded(driver, timeout=15):
         print(f"[LOAD] Error waiting for WhatsApp: {e}")
         return False
 
+@timed_step("open_whatsapp")
 def open_whatsapp_business(driver):
     """Open WhatsApp application with improved reliability and loading detection"""
     max_attempts = 3
@@ -638,34 +1648,17 @@ def open_whatsapp_business(driver):
             # Method 3: Find and tap WhatsApp icon with better detection
             print("[OPEN] Trying icon tap method...")
 
-            # Enhanced icon search with more selectors
-            icon_selectors = [
-                (AppiumBy.XPATH, "//android.widget.TextView[@text='WhatsApp']"),
-                (AppiumBy.XPATH, "//android.widget.TextView[@text='WA']"),
-                (AppiumBy.XPATH, "//*[contains(@text, 'WhatsApp')]"),
-                (AppiumBy.XPATH, "//*[@content-desc='WhatsApp']"),
-                (AppiumBy.XPATH, "//*[contains(@content-desc, 'WhatsApp')]")
-            ]
-
-            icon_found = False
-            for selector_type, selector in icon_selectors:
-                try:
-                    whatsapp_element = driver.find_element(selector_type, selector)
-                    if whatsapp_element.is_displayed():
-                        whatsapp_element.click()
-                        time.sleep(1.5)
-
-                        if wait_for_whatsapp_loaded(driver):
-                            print(f"[SUCCESS] WhatsApp opened by tapping icon!")
-                            return True
-                        else:
-                            print(f"[FAIL] Icon tap launched but app not properly loaded")
-                        icon_found = True
-                        break
-                except:
-                    continue
+            whatsapp_element = find_ui_element(driver, 'whatsapp_icon')
+            if whatsapp_element is not None:
+                whatsapp_element.click()
+                time.sleep(1.5)
 
-            if not icon_found:
+                if wait_for_whatsapp_loaded(driver):
+                    print(f"[SUCCESS] WhatsApp opened by tapping icon!")
+                    return True
+                else:
+                    print(f"[FAIL] Icon tap launched but app not properly loaded")
+            else:
                 print("[FAIL] WhatsApp icon not found on current screen")
 
         except Exception as e3:
@@ -744,8 +1737,7 @@ def analyze_chat_entries():
                 total_entries += 1
 
                 # Check if it's a phone number (contains only digits and +)
-                clean_for_check = chat_name.replace('NepalWin🇳🇵', '').replace('+', '').replace(' ', '').replace('-', '')
-                if clean_for_check.isdigit():
+                if is_phone_number_entry(chat_name):
                     phone_numbers += 1
                 else:
                     groups += 1
@@ -865,36 +1857,369 @@ def show_selection_menu(analysis):
             print("\n[ERROR] Operation cancelled by user")
             return None
 
-def load_processed_chats_today():
-    """Load list of chats that have already been processed today"""
-    today = datetime.now().strftime("%Y-%m-%d")
-    log_file = f"txt/processed_chats_{today}.txt"
-    
-    processed_chats = set()
-    if os.path.exists(log_file):
+# Campaign store: one SQLite database for campaigns, recipients (also the multi-device queue),
+# attempts and events. Replaces the processed_chats / not_found_chats / script_log txt files.
+CAMPAIGN_STORE_FILE = "txt/campaign_store.db"
+_campaign_store = None
+
+# Recipient statuses that count as "already processed" for the day
+PROCESSED_STATUSES = ('done', 'failed', 'not_found')
+
+CAMPAIGN_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    id INTEGER PRIMARY KEY,
+    campaign_date TEXT NOT NULL UNIQUE,
+    message TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS recipients (
+    id INTEGER PRIMARY KEY,
+    campaign_id INTEGER NOT NULL REFERENCES campaigns(id),
+    original_row INTEGER,
+    chat_name TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL,
+    UNIQUE (campaign_id, chat_name)
+);
+CREATE INDEX IF NOT EXISTS idx_recipients_queue ON recipients(campaign_id, status, id);
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY,
+    recipient_id INTEGER NOT NULL REFERENCES recipients(id),
+    campaign_id INTEGER NOT NULL REFERENCES campaigns(id),
+    device TEXT,
+    status TEXT NOT NULL,
+    error_class TEXT,
+    error TEXT,
+    search_time REAL,
+    message_time REAL,
+    finished_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_attempts_recipient ON attempts(recipient_id);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    event_type TEXT NOT NULL,
+    message TEXT,
+    chat_name TEXT,
+    device TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_type_ts ON events(event_type, ts);
+CREATE TABLE IF NOT EXISTS imported_files (
+    filename TEXT PRIMARY KEY,
+    imported_at REAL NOT NULL,
+    line_offset INTEGER
+);
+CREATE TABLE IF NOT EXISTS not_found_strikes (
+    chat_name TEXT NOT NULL,
+    day TEXT NOT NULL,
+    PRIMARY KEY (chat_name, day)
+);
+CREATE TABLE IF NOT EXISTS resolved_chats (
+    clean_name TEXT PRIMARY KEY,
+    display_name TEXT,
+    resolution TEXT,
+    row_index INTEGER,
+    search_time REAL,
+    resolved_at TEXT
+);
+CREATE TABLE IF NOT EXISTS locator_versions (
+    device_model TEXT PRIMARY KEY,
+    whatsapp_version TEXT
+);
+CREATE TABLE IF NOT EXISTS locator_stats (
+    device_model TEXT NOT NULL,
+    element TEXT NOT NULL,
+    locator TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0,
+    avg_ms REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (device_model, element, locator)
+);
+CREATE TABLE IF NOT EXISTS latency_model (
+    device_model TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    ewma REAL NOT NULL,
+    samples INTEGER NOT NULL,
+    PRIMARY KEY (device_model, kind)
+);
+"""
+
+def open_campaign_store(store_path=CAMPAIGN_STORE_FILE):
+    """Open the campaign store in WAL mode so several worker processes can write at once"""
+    os.makedirs(os.path.dirname(store_path) or '.', exist_ok=True)
+    conn = sqlite3.connect(store_path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    conn.executescript(CAMPAIGN_STORE_SCHEMA)
+    # Stores from before line offsets: their imported files (line_offset NULL) count as complete
+    if 'line_offset' not in [row[1] for row in conn.execute("PRAGMA table_info(imported_files)")]:
+        conn.execute("ALTER TABLE imported_files ADD COLUMN line_offset INTEGER")
+    return conn
+
+def get_campaign_store():
+    """Get this process's connection to the campaign store (opened once)"""
+    global _campaign_store
+    if _campaign_store is None:
+        _campaign_store = open_campaign_store()
+    return _campaign_store
+
+def get_campaign_id(conn, campaign_date=None, message=None):
+    """Get (or create) the campaign for a day - one campaign per GMT+7 date, like the rest of the run's logs"""
+    if campaign_date is None:
+        campaign_date = get_gmt7_time().strftime("%Y-%m-%d")
+    conn.execute(
+        "INSERT OR IGNORE INTO campaigns (campaign_date, message, created_at) VALUES (?, ?, ?)",
+        (campaign_date, message, time.time())
+    )
+    if message is not None:
+        conn.execute("UPDATE campaigns SET message = ? WHERE campaign_date = ? AND message IS NULL", (message, campaign_date))
+    return conn.execute("SELECT id FROM campaigns WHERE campaign_date = ?", (campaign_date,)).fetchone()[0]
+
+def upsert_recipient(conn, campaign_id, chat_name, original_row=None):
+    """Get the recipient id for a chat in a campaign, creating the row if needed"""
+    conn.execute(
+        "INSERT OR IGNORE INTO recipients (campaign_id, original_row, chat_name, updated_at) VALUES (?, ?, ?, ?)",
+        (campaign_id, original_row, chat_name, time.time())
+    )
+    return conn.execute(
+        "SELECT id FROM recipients WHERE campaign_id = ? AND chat_name = ?", (campaign_id, chat_name)
+    ).fetchone()[0]
+
+def is_chat_processed(conn, campaign_id, chat_name):
+    """Indexed lookup: was this chat already sent / failed / not found in this campaign?"""
+    row = conn.execute(
+        "SELECT status FROM recipients WHERE campaign_id = ? AND chat_name = ?", (campaign_id, chat_name)
+    ).fetchone()
+    return row is not None and row[0] in PROCESSED_STATUSES
+
+def count_processed_chats(conn, campaign_id):
+    """Count recipients already processed in a campaign"""
+    placeholders = ",".join("?" * len(PROCESSED_STATUSES))
+    return conn.execute(
+        f"SELECT COUNT(*) FROM recipients WHERE campaign_id = ? AND status IN ({placeholders})",
+        (campaign_id, *PROCESSED_STATUSES)
+    ).fetchone()[0]
+
+def mark_recipient_status(conn, campaign_id, chat_name, status, original_row=None):
+    """Set a recipient's status without recording an attempt (e.g. 'sending' right before the send)"""
+    try:
+        recipient_id = upsert_recipient(conn, campaign_id, chat_name, original_row)
+        conn.execute(
+            "UPDATE recipients SET status = ?, worker = ?, updated_at = ? WHERE id = ?",
+            (status, SELECTED_ADB_DEVICE, time.time(), recipient_id)
+        )
+    except Exception as e:
+        print(f"[STORE] Failed to mark '{chat_name}' as {status}: {e}")
+
+def record_chat_result(conn, campaign_id, original_row, chat_name, status, error_class=None, error=None,
+                       search_time=None, message_time=None):
+    """Record the outcome of one chat: recipient status plus an attempt row, in one transaction"""
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        recipient_id = upsert_recipient(conn, campaign_id, chat_name, original_row)
+        conn.execute(
+            "UPDATE recipients SET status = ?, worker = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+            (status, SELECTED_ADB_DEVICE, time.time(), recipient_id)
+        )
+        conn.execute(
+            "INSERT INTO attempts (recipient_id, campaign_id, device, status, error_class, error, search_time, message_time, finished_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (recipient_id, campaign_id, SELECTED_ADB_DEVICE, status, error_class, error, search_time, message_time, time.time())
+        )
+        conn.execute("COMMIT")
+    except Exception as e:
         try:
-            with open(log_file, 'r', encoding='utf-8') as file:
-                for line in file:
-                    chat_name = line.strip()
-                    if chat_name:
-                        processed_chats.add(chat_name)
-            print(f"Loaded {len(processed_chats)} previously processed chats from {log_file}")
-        except Exception as e:
-            print(f"Error loading processed chats: {str(e)}")
-    
-    return processed_chats, log_file
+            conn.execute("ROLLBACK")
+        except Exception:
+            pass
+        print(f"[STORE] Failed to record result for '{chat_name}': {e}")
 
-def save_processed_chat(log_file, chat_name):
-    """Save a processed chat to today's log file"""
+def record_event(event_type, message="", chat_name=None, ts=None):
+    """Append an event (script start/end, not found, recovery...) to the campaign store"""
     try:
-        with open(log_file, 'a', encoding='utf-8') as file:
-            file.write(f"{chat_name}\n")
+        get_campaign_store().execute(
+            "INSERT INTO events (ts, event_type, message, chat_name, device) VALUES (?, ?, ?, ?, ?)",
+            (ts if ts is not None else time.time(), event_type, message, chat_name, SELECTED_ADB_DEVICE)
+        )
     except Exception as e:
-        print(f"Error saving processed chat: {str(e)}")
+        print(f"[STORE] Failed to record event '{event_type}': {e}")
+
+def fill_work_queue(conn, campaign_id, entries):
+    """Add (original_row, chat_name) entries as pending recipients, keeping existing rows (resume)"""
+    added = 0
+    conn.execute("BEGIN IMMEDIATE")
+    for original_row, chat_name in entries:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO recipients (campaign_id, original_row, chat_name, updated_at) VALUES (?, ?, ?, ?)",
+            (campaign_id, original_row, chat_name, time.time())
+        )
+        added += cursor.rowcount
+    conn.execute("COMMIT")
+    return added
+
+def claim_next_chat(conn, campaign_id, worker_id, after_id=0, accept=None):
+    """Atomically claim the next pending chat for a worker, returns (id, original_row, chat_name) or None
+
+    Only rows with id > after_id are considered; rows whose chat_name accept() rejects are passed
+    over without being claimed, so other workers still get them.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        while True:
+            row = conn.execute(
+                "SELECT id, original_row, chat_name FROM recipients "
+                "WHERE campaign_id = ? AND status = 'pending' AND id > ? ORDER BY id LIMIT 1",
+                (campaign_id, after_id)
+            ).fetchone()
+            if row is None or accept is None or accept(row[2]):
+                break
+            after_id = row[0]
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE recipients SET status = 'claimed', worker = ?, updated_at = ? WHERE id = ?",
+            (worker_id, time.time(), row[0])
+        )
+        conn.execute("COMMIT")
+        return row
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def release_claims(conn, campaign_id, worker_id=None):
+    """Put 'claimed' recipients back to pending (nothing was sent for them yet)
+
+    Recipients in 'sending' are left alone: the worker died mid-send, so they may already have
+    been delivered and re-queueing them could send twice.
+    """
+    if worker_id:
+        cursor = conn.execute(
+            "UPDATE recipients SET status = 'pending', worker = NULL WHERE campaign_id = ? AND status = 'claimed' AND worker = ?",
+            (campaign_id, worker_id)
+        )
+    else:
+        cursor = conn.execute(
+            "UPDATE recipients SET status = 'pending', worker = NULL WHERE campaign_id = ? AND status = 'claimed'",
+            (campaign_id,)
+        )
+    return cursor.rowcount
+
+def get_queue_counts(conn, campaign_id):
+    """Count recipients per status in a campaign"""
+    return dict(conn.execute(
+        "SELECT status, COUNT(*) FROM recipients WHERE campaign_id = ? GROUP BY status", (campaign_id,)
+    ).fetchall())
+
+def iter_work_queue(conn, campaign_id, worker_id, accept=None):
+    """Yield (original_row, chat_name) claimed from the shared queue until it is empty
+
+    With accept, only chats it returns True for are claimed; the scan moves forward, so a chat
+    released back to pending by the caller isn't handed out again by this iterator.
+    """
+    after_id = 0
+    while True:
+        entry = claim_next_chat(conn, campaign_id, worker_id, after_id, accept)
+        if entry is None:
+            return
+        after_id = entry[0]
+        yield entry[1], entry[2]
+
+def import_txt_history(conn, txt_dir='txt'):
+    """Import the old processed_chats / not_found_chats / script_log txt files into the store (idempotent)
+
+    Each file's count of imported lines is stored, so files that are still growing (today's) only
+    contribute their new lines on the next import.
+    """
+    if not os.path.isdir(txt_dir):
+        print(f"[STORE] No {txt_dir}/ folder, nothing to import")
+        return 0
+    offsets = {row[0]: row[1] for row in conn.execute("SELECT filename, line_offset FROM imported_files")}
+    file_count = 0
+
+    for filename in sorted(os.listdir(txt_dir)):
+        if filename in offsets and offsets[filename] is None:
+            continue  # Imported completely by an older version
+        processed_match = re.match(r"processed_chats_(\d{4}-\d{2}-\d{2})\.txt$", filename)
+        not_found_match = re.match(r"not_found_chats_(\d{8})\.txt$", filename)
+        script_log_match = re.match(r"script_log_(\d{8})\.txt$", filename)
+        if not (processed_match or not_found_match or script_log_match):
+            continue
+
+        with open(os.path.join(txt_dir, filename), 'r', encoding='utf-8') as file:
+            # Only complete lines: a line still being written is picked up next time
+            raw_lines = [line for line in file if line.endswith('\n')]
+        line_offset = offsets.get(filename, 0)
+        if line_offset >= len(raw_lines):
+            continue
+        lines = [line.strip() for line in raw_lines[line_offset:] if line.strip()]
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            import_txt_lines(conn, lines, processed_match, not_found_match, script_log_match)
+            conn.execute(
+                "INSERT OR REPLACE INTO imported_files (filename, imported_at, line_offset) VALUES (?, ?, ?)",
+                (filename, time.time(), len(raw_lines))
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        file_count += 1
+
+    print(f"[STORE] Imported {file_count} txt history files into {CAMPAIGN_STORE_FILE}")
+    return file_count
+
+def import_txt_lines(conn, lines, processed_match, not_found_match, script_log_match):
+    """Import new lines of one txt history file, inside the caller's transaction"""
+    if processed_match:
+        campaign_id = get_campaign_id(conn, processed_match.group(1))
+        # Campaign days are GMT+7 days (like the rest of the store), not the importing machine's local time
+        file_ts = datetime.strptime(processed_match.group(1), "%Y-%m-%d").replace(tzinfo=GMT_PLUS_7).timestamp()
+        for line in lines:
+            # "Row98: name", "FAILED Row186: name", "NOT_FOUND Row86: name"
+            match = re.match(r"(?:(FAILED|NOT_FOUND) )?Row(\d+):\s*(.+)$", line)
+            if not match:
+                continue
+            status = {'FAILED': 'failed', 'NOT_FOUND': 'not_found'}.get(match.group(1), 'done')
+            recipient_id = upsert_recipient(conn, campaign_id, match.group(3), int(match.group(2)))
+            conn.execute(
+                "UPDATE recipients SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (status, file_ts, recipient_id)
+            )
+            conn.execute(
+                "INSERT INTO attempts (recipient_id, campaign_id, status, finished_at) VALUES (?, ?, ?, ?)",
+                (recipient_id, campaign_id, status, file_ts)
+            )
+    else:
+        day = (not_found_match or script_log_match).group(1)
+        current_ts = datetime.strptime(day, "%Y%m%d").replace(tzinfo=GMT_PLUS_7).timestamp()
+        for line in lines:
+            # "[2026-02-06 11:06:49 GMT+7] START: message" or a bare "[timestamp]" run header
+            match = re.match(r"\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) GMT\+7\]\s*(?:(\w+):\s*(.*))?$", line)
+            if match:
+                current_ts = datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S").replace(tzinfo=GMT_PLUS_7).timestamp()
+                if match.group(2):
+                    conn.execute(
+                        "INSERT INTO events (ts, event_type, message) VALUES (?, ?, ?)",
+                        (current_ts, match.group(2).lower(), match.group(3))
+                    )
+            elif not_found_match:
+                conn.execute(
+                    "INSERT INTO events (ts, event_type, chat_name) VALUES (?, 'not_found', ?)",
+                    (current_ts, line)
+                )
+
+# Daily media accepted in daily_photos/ (short videos go through the same gallery flow)
+PHOTO_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.webp']
+VIDEO_EXTENSIONS = ['.mp4', '.3gp', '.mov']
 
 def get_daily_photo_path():
-    """Get the path to the only photo in daily_photos folder"""
-    photo_extensions = ['.jpg', '.jpeg', '.png', '.JPG', '.JPEG', '.PNG']
+    """Get the path to the only photo (or short video) in daily_photos folder"""
+    photo_extensions = PHOTO_EXTENSIONS + VIDEO_EXTENSIONS
     
     try:
         if not os.path.exists('daily_photos'):
@@ -920,8 +2245,182 @@ def get_daily_photo_path():
         print(f"Error checking daily_photos folder: {str(e)}")
         return None
 
+# Daily photo pre-optimization (needs Pillow): resized/recompressed once and cached by source hash
+PHOTO_OPTIMIZE = True
+PHOTO_OPTIMIZE_MAX_SIDE = 1600   # Long side in pixels, WhatsApp downscales bigger photos on the phone anyway
+PHOTO_OPTIMIZE_QUALITY = 80      # JPEG quality
+PHOTO_OPTIMIZED_DIR = "daily_photos/.optimized"
+_pillow_missing_reported = False
+_photo_optimize_failed = set()  # Source hashes Pillow couldn't optimize: sent as-is, not retried
+
+@timed_step("optimize_photo")
+def optimize_daily_photo(photo_path):
+    """Return a resized, recompressed, metadata-free JPEG of the daily photo (cached), or the original path"""
+    global _pillow_missing_reported
+    if not PHOTO_OPTIMIZE or not photo_path or os.path.splitext(photo_path)[1].lower() not in PHOTO_EXTENSIONS:
+        return photo_path
+    if Image is None:
+        if not _pillow_missing_reported:
+            print("[PHOTO] Pillow not installed, sending the photo as-is (pip install Pillow to enable optimization)")
+            _pillow_missing_reported = True
+        return photo_path
+
+    source_hash = None
+    try:
+        source_hash = get_file_sha256(photo_path)
+        if source_hash in _photo_optimize_failed:
+            return photo_path
+        optimized_path = f"{PHOTO_OPTIMIZED_DIR}/{source_hash[:16]}_{PHOTO_OPTIMIZE_MAX_SIDE}_q{PHOTO_OPTIMIZE_QUALITY}.jpg"
+        if os.path.exists(optimized_path):
+            print(f"[PHOTO] Using optimized photo from cache: {optimized_path}")
+            return optimized_path
+
+        start_time = time.time()
+        os.makedirs(PHOTO_OPTIMIZED_DIR, exist_ok=True)
+        with Image.open(photo_path) as image:
+            original_size = image.size
+            # Apply the EXIF rotation before the metadata is dropped
+            image = ImageOps.exif_transpose(image)
+            if image.mode != 'RGB':
+                # Flatten transparency onto white, JPEG has no alpha
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+                image = background
+            image.thumbnail((PHOTO_OPTIMIZE_MAX_SIDE, PHOTO_OPTIMIZE_MAX_SIDE), Image.LANCZOS)
+            temp_path = optimized_path + ".tmp"
+            # No exif/icc passed to save(): metadata is stripped
+            image.save(temp_path, 'JPEG', quality=PHOTO_OPTIMIZE_QUALITY, optimize=True)
+        os.replace(temp_path, optimized_path)
+
+        print(f"[PHOTO] Optimized {os.path.basename(photo_path)}: {original_size[0]}x{original_size[1]} -> "
+              f"{image.size[0]}x{image.size[1]}, {os.path.getsize(photo_path) / 1024:.0f}KB -> "
+              f"{os.path.getsize(optimized_path) / 1024:.0f}KB in {time.time() - start_time:.2f}s")
+        return optimized_path
+    except Exception as e:
+        print(f"[WARNING] Photo optimization failed, sending the original for the rest of the run: {e}")
+        if source_hash:
+            _photo_optimize_failed.add(source_hash)
+        return photo_path
+
+# Content-addressed photo cache on the device: the file name is derived from the photo's SHA-256,
+# so an unchanged photo is found by a remote checksum probe instead of being pushed again
+PHOTO_DEVICE_DIR = "/sdcard/Pictures"
+PHOTO_CACHE_STATS = {'hits': 0, 'misses': 0, 'bytes_saved': 0}
+_mobile_shell_available = None  # None = not tried yet, False = Appium started without adb_shell
+MEDIA_PUSH_CHUNK_SIZE = 3 * 256 * 1024  # Multiple of 3 so base64 chunks concatenate into valid base64
+MEDIA_PUSH_TIMEOUT = 300  # Seconds, adb push of a large video over USB 2
+
+_file_sha256_cache = {}  # (path, size, mtime_ns) -> hex digest
+_device_api_level = None
+
+def get_file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 of a local file, read in chunks (remembered while its size and mtime don't change)"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _file_sha256_cache:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                digest.update(chunk)
+        _file_sha256_cache[key] = digest.hexdigest()
+    return _file_sha256_cache[key]
+
+def get_device_api_level(driver):
+    """Android API level of the device from the session capabilities (getprop as fallback), None if unknown"""
+    global _device_api_level
+    if _device_api_level is None:
+        level = (getattr(driver, 'capabilities', None) or {}).get('deviceApiLevel')
+        if level is None:
+            output = device_shell(driver, 'getprop', ['ro.build.version.sdk'])
+            level = output.strip() if output else None
+        try:
+            _device_api_level = int(level)
+        except (TypeError, ValueError):
+            return None
+    return _device_api_level
+
+def scan_media_file(driver, device_path):
+    """Index a file in MediaStore so the WhatsApp gallery shows it, True if the scan ran
+
+    Android 10+ ignores the MEDIA_SCANNER_SCAN_FILE broadcast, there MediaProvider's scan_file call is used.
+    """
+    if (get_device_api_level(driver) or 0) >= 29:
+        output = device_shell(driver, 'content', ['call', '--uri', 'content://media', '--method', 'scan_file',
+                                                  '--arg', device_path])
+    else:
+        output = device_shell(driver, 'am', ['broadcast', '-a', 'android.intent.action.MEDIA_SCANNER_SCAN_FILE',
+                                             '-d', f'file://{device_path}'])
+    return output is not None
+
+def device_shell(driver, command, args=(), timeout=10):
+    """Run a shell command on the device, returns stdout or None if it failed
+
+    Uses Appium's 'mobile: shell' (needs `appium --allow-insecure adb_shell`), falls back to adb.
+    """
+    global _mobile_shell_available
+    if driver is not None and _mobile_shell_available is not False:
+        try:
+            output = driver.execute_script('mobile: shell', {'command': command, 'args': list(args), 'timeout': timeout * 1000})
+            _mobile_shell_available = True
+            return output if isinstance(output, str) else (output or {}).get('stdout', '')
+        except Exception as e:
+            if 'insecure' not in str(e).lower() and 'adb_shell' not in str(e):
+                return None  # The command itself failed (e.g. file missing)
+            print("[SHELL] Appium 'mobile: shell' not enabled (start Appium with --allow-insecure adb_shell), using adb")
+            _mobile_shell_available = False
+
+    result = adb_shell([command] + list(args), timeout=timeout)
+    if result is None or result.returncode != 0:
+        return None
+    return result.stdout
+
+def get_remote_sha256(driver, device_path):
+    """SHA-256 of a file on the device, None if it is missing or can't be checked"""
+    output = device_shell(driver, 'sha256sum', [device_path])
+    digest = output.strip().split()[0].lower() if output and output.strip() else ""
+    return digest if re.fullmatch(r'[0-9a-f]{64}', digest) else None
+
+def push_file_streaming(driver, local_path, device_path):
+    """Push a file to the device and index it for the gallery, returns the SHA-256 of what was pushed (None on failure)
+
+    adb push streams from disk without holding the file in memory. Without adb, or when the media scan
+    after adb push fails, Appium push_file (which indexes the file itself) gets a base64 payload built
+    chunk by chunk, hashed in the same pass.
+    """
+    if shutil.which('adb'):
+        cmd = ['adb']
+        if SELECTED_ADB_DEVICE:
+            cmd.extend(['-s', SELECTED_ADB_DEVICE])
+        cmd.extend(['push', local_path, device_path])
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=MEDIA_PUSH_TIMEOUT)
+            if result.returncode == 0:
+                print(f"[PHOTO] adb push: {result.stdout.strip().splitlines()[-1] if result.stdout.strip() else 'done'}")
+                # Unlike Appium push_file, adb push doesn't index the file - needed for the WhatsApp gallery
+                if scan_media_file(driver, device_path):
+                    return get_file_sha256(local_path)
+                print("[PHOTO] Media scan after adb push failed, pushing with Appium push_file (indexes the file)")
+            else:
+                print(f"[PHOTO] adb push failed ({(result.stderr or result.stdout).strip()}), using Appium push_file")
+        except subprocess.TimeoutExpired:
+            print(f"[PHOTO] adb push timed out after {MEDIA_PUSH_TIMEOUT}s, using Appium push_file")
+
+    try:
+        digest = hashlib.sha256()
+        encoded_chunks = []
+        with open(local_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(MEDIA_PUSH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                encoded_chunks.append(base64.b64encode(chunk).decode('ascii'))
+        driver.push_file(device_path, "".join(encoded_chunks))
+        return digest.hexdigest()
+    except Exception as e:
+        print(f"[ERROR] Appium push_file failed: {e}")
+        return None
+
+@timed_step("transfer_photo")
 def transfer_photo_to_device(driver, local_photo_path):
-    """Transfer photo from PC to Android device with reliable file handling (improved version)"""
+    """Make the photo available on the device, pushing it only when the device doesn't already hold the same content"""
     try:
         print(f"[PHOTO] Starting photo transfer for: {local_photo_path}")
 
@@ -938,65 +2437,61 @@ def transfer_photo_to_device(driver, local_photo_path):
 
         print(f"[PHOTO] File: {file_name} ({file_size_mb:.2f}MB)")
 
-        # Validate it's an image file
-        valid_extensions = ['.jpg', '.jpeg', '.png', '.webp']
+        # Validate it's an image or short video
+        valid_extensions = PHOTO_EXTENSIONS + VIDEO_EXTENSIONS
         if file_ext not in valid_extensions:
             print(f"[ERROR] Unsupported file type: {file_ext}. Supported: {valid_extensions}")
             return None
 
-        # Create timestamped filename to avoid conflicts
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        device_filename = f"whatsapp_daily_{timestamp}{file_ext}"
-        device_path = f'/sdcard/Pictures/{device_filename}'
+        # Stable, hash-derived filename: same photo -> same device file
+        photo_hash = get_file_sha256(local_photo_path)
+        device_path = f'{PHOTO_DEVICE_DIR}/whatsapp_daily_{photo_hash[:16]}{file_ext}'
         print(f"[PHOTO] Device path: {device_path}")
 
-        # Read the photo file
-        try:
-            with open(local_photo_path, 'rb') as photo_file:
-                photo_data = photo_file.read()
-            print(f"[PHOTO] Read {len(photo_data)} bytes from file")
-        except Exception as e:
-            print(f"[ERROR] Failed to read photo file: {e}")
-            return None
+        # Cache probe: skip the push when the device already has this exact content. The gallery flow
+        # taps the newest thumbnail, so the cached file gets a fresh mtime and is re-indexed, like a push
+        if get_remote_sha256(driver, device_path) == photo_hash:
+            if device_shell(driver, 'touch', [device_path]) is not None and scan_media_file(driver, device_path):
+                PHOTO_CACHE_STATS['hits'] += 1
+                PHOTO_CACHE_STATS['bytes_saved'] += file_size
+                print(f"[PHOTO] Cache hit: photo already on device (sha256 {photo_hash[:12]}), push skipped")
+                return device_path
+            print(f"[PHOTO] Cached photo could not be made the newest gallery item, pushing it again")
+        PHOTO_CACHE_STATS['misses'] += 1
+        print(f"[PHOTO] Cache miss: pushing photo to device")
 
         # Check file size limit
         if file_size_mb > 10:
             print(f"[WARNING] Large file size: {file_size_mb:.2f}MB. May take longer to transfer.")
 
-        # Convert to base64 for transfer
-        try:
-            photo_base64 = base64.b64encode(photo_data).decode('utf-8')
-            print(f"[PHOTO] Base64 conversion complete, length: {len(photo_base64)}")
-        except Exception as e:
-            print(f"[ERROR] Base64 conversion failed: {e}")
+        # Stream the file to the device
+        start_transfer = time.time()
+        pushed_hash = push_file_streaming(driver, local_photo_path, device_path)
+        if not pushed_hash:
+            print(f"[ERROR] File push failed after {time.time() - start_transfer:.2f}s")
             return None
+        if pushed_hash != photo_hash:
+            print(f"[ERROR] Photo changed while it was pushed ({photo_hash[:12]} -> {pushed_hash[:12]})")
+            return None
+        print(f"[PHOTO] File push completed in {time.time() - start_transfer:.2f}s")
 
-        # Transfer file to device
-        start_transfer = time.time()
-        try:
-            driver.push_file(device_path, photo_base64)
-            transfer_time = time.time() - start_transfer
-            print(f"[PHOTO] File push completed in {transfer_time:.2f}s")
-        except Exception as e:
-            transfer_time = time.time() - start_transfer
-            print(f"[ERROR] File push failed after {transfer_time:.2f}s: {e}")
+        # Verify with a remote checksum instead of downloading the file again
+        remote_hash = get_remote_sha256(driver, device_path)
+        if remote_hash == photo_hash:
+            print(f"[SUCCESS] Photo verified on device by checksum: {device_path} ({file_size_mb:.2f}MB)")
+            return device_path
+        if remote_hash:
+            print(f"[ERROR] Checksum mismatch after push: expected {photo_hash[:12]}, got {remote_hash[:12]}")
             return None
 
-        # Verify transfer success using pull_file (more reliable than shell commands)
+        # No device shell: pull the file back and compare checksums
         try:
             verify_data = driver.pull_file(device_path)
-            if verify_data:
-                decoded_data = base64.b64decode(verify_data)
-                if len(decoded_data) == file_size:
-                    print(f"[SUCCESS] Photo verified on device: {device_path} ({file_size_mb:.2f}MB)")
-                    return device_path
-                else:
-                    print(f"[WARNING] File size mismatch. Expected: {file_size}, Got: {len(decoded_data)}")
-                    print(f"[INFO] Photo may still be transferred to: {device_path}")
-                    return device_path
-            else:
-                print(f"[ERROR] Photo transfer verification failed")
-                return None
+            if verify_data and hashlib.sha256(base64.b64decode(verify_data)).hexdigest() == photo_hash:
+                print(f"[SUCCESS] Photo verified on device: {device_path} ({file_size_mb:.2f}MB)")
+                return device_path
+            print(f"[ERROR] Photo transfer verification failed (pulled file doesn't match)")
+            return None
         except Exception as verify_error:
             print(f"[WARNING] Verification failed: {verify_error}")
             print(f"[INFO] Photo transferred to device: {device_path} (verification skipped)")
@@ -1009,86 +2504,481 @@ def transfer_photo_to_device(driver, local_photo_path):
         return None
 
 def adaptive_wait(driver, base_delay=1.0, max_delay=5.0):
-    """Intelligent delay based on device performance and network conditions"""
+    """Sleep base_delay scaled by the device's observed command latency (no probe command)"""
+    rtt = get_latency_estimate()
+    if rtt is None:
+        delay = base_delay
+        print(f"[DELAY] No latency estimate yet, using base delay {delay:.1f}s")
+    else:
+        position = min(max((rtt - LATENCY_FAST_RTT) / (LATENCY_SLOW_RTT - LATENCY_FAST_RTT), 0.0), 1.0)
+        delay = min(max(base_delay * (0.7 + 0.8 * position), min(base_delay, 0.3)), max_delay)
+        print(f"[DELAY] Command latency {rtt * 1000:.0f}ms, using {delay:.1f}s delay")
+    time.sleep(delay)
+    return delay
+
+# Event-driven waits: poll interval for hierarchy-based waits (seconds)
+SCREEN_POLL_INTERVAL = 0.2
+
+def get_hierarchy_fingerprint(page_source):
+    """Cheap fingerprint of a hierarchy dump, used to detect when the screen stops changing"""
+    return zlib.crc32(page_source.encode('utf-8'))
+
+def snapshot_has_id(snapshot, resource_id):
+    """Check if a displayed node with the given resource-id exists in a parsed hierarchy"""
+    for node in snapshot.iter():
+        if node.get('resource-id') == resource_id and is_node_displayed(node):
+            return True
+    return False
+
+SETTLE_EARLY_MIN_POLLS = 2  # Unchanged polls before a condition wait may end as 'settled'
+
+def wait_for_screen_settled(driver, condition=None, timeout=3.0, stable_polls=1, label="screen", settle_early=True):
+    """Wait until condition(snapshot) is true or the hierarchy stops changing, whichever comes first
+
+    Replaces fixed sleeps: returns as soon as the screen is ready instead of always waiting
+    the worst case. `timeout` is the per-step deadline. A screen that settles without meeting
+    the condition also ends the wait, unless settle_early=False (for transitions that may start
+    late, e.g. after a network round trip on the phone). Ending early on a condition wait takes at
+    least SETTLE_EARLY_MIN_POLLS unchanged polls, so the screen a key press is leaving doesn't count.
+
+    Returns (reason, snapshot) where reason is 'condition' (condition met), 'settled' (stable,
+    condition not met) or 'timeout', and snapshot is the last parsed hierarchy (None if it could
+    not be fetched).
+    """
+    step_start = time.time()
+    deadline = step_start + timeout
+    if condition is not None:
+        stable_polls = max(stable_polls, SETTLE_EARLY_MIN_POLLS)
+    last_fingerprint = None
+    unchanged_polls = 0
+    snapshot = None
+
+    while True:
+        try:
+            page_source = driver.page_source
+            snapshot = ET.fromstring(page_source.encode('utf-8'))
+            fingerprint = get_hierarchy_fingerprint(page_source)
+
+            if condition is not None and condition(snapshot):
+                print(f"[SETTLE] {label}: target condition met ({time.time() - step_start:.2f}s)")
+                return 'condition', snapshot
+
+            if fingerprint == last_fingerprint:
+                unchanged_polls += 1
+                if unchanged_polls >= stable_polls and (condition is None or settle_early):
+                    matched = " without the target condition" if condition is not None else ""
+                    print(f"[SETTLE] {label}: hierarchy stable{matched} ({time.time() - step_start:.2f}s)")
+                    return 'settled', snapshot
+            else:
+                unchanged_polls = 0
+            last_fingerprint = fingerprint
+        except Exception as e:
+            print(f"[SETTLE] {label}: hierarchy fetch failed: {e}")
+
+        if time.time() + SCREEN_POLL_INTERVAL > deadline:
+            print(f"[SETTLE] {label}: deadline reached ({time.time() - step_start:.2f}s)")
+            return 'timeout', snapshot
+        time.sleep(SCREEN_POLL_INTERVAL)
+
+def wait_for_chat_list(driver, timeout=3.0):
+    """Wait for the home chat list (FAB visible) after navigating back"""
+    return wait_for_screen_settled(
+        driver,
+        condition=lambda snapshot: snapshot_has_id(snapshot, 'com.whatsapp:id/fab'),
+        timeout=timeout,
+        label="chat list",
+        settle_early=False  # Right after BACK the old screen can look stable before the transition starts
+    )
+
+# Screen recognizer: which screen is showing, from one parsed hierarchy
+SCREEN_HOME = "home"                      # Chat list
+SCREEN_SEARCH = "search"                  # Search box open, no results on screen
+SCREEN_SEARCH_RESULTS = "search_results"  # Search box open with result rows / sections / "No results"
+SCREEN_CONVERSATION = "conversation"
+SCREEN_ATTACH = "attach"                  # Attach sheet over a conversation
+SCREEN_GALLERY = "gallery"
+SCREEN_CAPTION = "caption"                # Media preview with the caption box
+SCREEN_FORWARD_PICKER = "forward_picker"
+SCREEN_DIALOG = "dialog"                  # Any alert (WhatsApp or system)
+SCREEN_OTHER_APP = "other_app"            # Launcher, another app in front
+SCREEN_UNKNOWN = "unknown"
+
+# Known transitions: action -> screen it normally leads to. navigate_to() follows the shortest
+# path and recognizes the screen again after every step, so an unexpected outcome just re-plans.
+SCREEN_TRANSITIONS = {
+    SCREEN_HOME: {'open_search': SCREEN_SEARCH},
+    SCREEN_SEARCH: {'back': SCREEN_HOME},
+    SCREEN_SEARCH_RESULTS: {'back': SCREEN_HOME},
+    SCREEN_CONVERSATION: {'back': SCREEN_HOME},
+    SCREEN_ATTACH: {'back': SCREEN_CONVERSATION},
+    SCREEN_GALLERY: {'back': SCREEN_CONVERSATION},
+    SCREEN_CAPTION: {'back': SCREEN_GALLERY},
+    SCREEN_FORWARD_PICKER: {'back': SCREEN_CONVERSATION},
+    SCREEN_DIALOG: {'dismiss': SCREEN_HOME},
+    SCREEN_OTHER_APP: {'launch': SCREEN_HOME},
+    SCREEN_UNKNOWN: {'back': SCREEN_HOME},
+}
+NAV_STEP_TIMEOUT = 2.0  # Max seconds for the screen to change after one navigation action
+
+def recognize_screen(snapshot):
+    """Identify the current screen (one of the SCREEN_* values) from a parsed hierarchy"""
+    if snapshot is None:
+        return SCREEN_UNKNOWN
+    resource_ids = set()
+    texts = set()
+    package = None
+    for node in snapshot.iter():
+        if node.tag == 'hierarchy':
+            continue
+        if package is None:
+            package = node.get('package')
+        if not is_node_displayed(node):
+            continue
+        resource_ids.add(node.get('resource-id') or '')
+        texts.add((node.get('text') or '').strip())
+
+    if resource_ids & {'android:id/button1', 'android:id/alertTitle', 'android:id/parentPanel'}:
+        return SCREEN_DIALOG
+    if package and not package.startswith('com.whatsapp'):
+        return SCREEN_OTHER_APP
+    if 'com.whatsapp:id/caption' in resource_ids and 'com.whatsapp:id/entry' not in resource_ids:
+        return SCREEN_CAPTION
+    if 'com.whatsapp:id/contactpicker_row_name' in resource_ids:
+        return SCREEN_FORWARD_PICKER
+    if 'com.whatsapp:id/entry' in resource_ids:
+        if 'Gallery' in texts or any('pickfiletype' in resource_id for resource_id in resource_ids):
+            return SCREEN_ATTACH
+        return SCREEN_CONVERSATION
+    if any('gallery' in resource_id for resource_id in resource_ids):
+        return SCREEN_GALLERY
+    if 'com.whatsapp:id/search_src_text' in resource_ids:
+        has_results = ('com.whatsapp:id/contact_row_container' in resource_ids
+                       or any('No results' in text for text in texts)
+                       or any(text.lower() in SEARCH_SECTION_TITLES for text in texts if text))
+        return SCREEN_SEARCH_RESULTS if has_results else SCREEN_SEARCH
+    if resource_ids & {'com.whatsapp:id/fab', 'com.whatsapp:id/my_search_bar', 'com.whatsapp:id/menuitem_search'}:
+        return SCREEN_HOME
+    return SCREEN_UNKNOWN
+
+def find_screen_path(start, targets):
+    """Shortest list of actions from start to any of the target screens in SCREEN_TRANSITIONS (None if unreachable)"""
+    queue = [(start, [])]
+    seen = {start}
+    while queue:
+        screen, actions = queue.pop(0)
+        if screen in targets:
+            return actions
+        for action, next_screen in SCREEN_TRANSITIONS.get(screen, {}).items():
+            if next_screen not in seen:
+                seen.add(next_screen)
+                queue.append((next_screen, actions + [action]))
+    return None
+
+def activate_search(driver):
+    """Tap the search icon (older layouts) or search bar (newer layouts), device coordinates as last resort"""
+    search_element = find_ui_element(driver, 'search_button')
+    if search_element is not None:
+        search_element.click()
+        print("[SEARCH] Search activated via element click")
+        return
+    config = get_device_config()
+    driver.tap([(config['search_button_x'], config['search_button_y'])])
+    print(f"[SEARCH] Search activated by coordinate tap at ({config['search_button_x']}, {config['search_button_y']})")
+
+# Dialogs whose positive button (android:id/button1) only acknowledges, matched against the dialog text.
+# Anything else may be "Delete", "Block", "Allow" or a permission grant: cancel it instead.
+DIALOG_SAFE_CONFIRM_TEXTS = (
+    "isn't on whatsapp",
+    "is not on whatsapp",
+    "couldn't send",
+    "check your phone's internet connection",
+)
+
+def dismiss_dialog(driver):
+    """Close an alert: button1 only for DIALOG_SAFE_CONFIRM_TEXTS, otherwise button2 (negative) or BACK"""
+    dialog_text = " ".join(
+        (element.text or "") for element in driver.find_elements(AppiumBy.ID, 'android:id/message')
+    ).lower()
+    if any(safe_text in dialog_text for safe_text in DIALOG_SAFE_CONFIRM_TEXTS):
+        buttons = driver.find_elements(AppiumBy.ID, 'android:id/button1')
+        if buttons:
+            print(f"[NAV] Confirming known dialog: {dialog_text[:60]}")
+            buttons[0].click()
+            return
+    buttons = driver.find_elements(AppiumBy.ID, 'android:id/button2')
+    if buttons:
+        print(f"[NAV] Cancelling dialog: {dialog_text[:60] or 'no message'}")
+        buttons[0].click()
+    else:
+        driver.press_keycode(4)  # KEYCODE_BACK
+
+def perform_screen_action(driver, action):
+    """Run one SCREEN_TRANSITIONS action"""
+    if action == 'back':
+        driver.press_keycode(4)  # KEYCODE_BACK
+    elif action == 'open_search':
+        activate_search(driver)
+    elif action == 'launch':
+        driver.activate_app("com.whatsapp")
+    elif action == 'dismiss':
+        dismiss_dialog(driver)
+
+def navigate_to(driver, target, max_steps=6):
+    """Drive the app to the target screen (or any screen of a tuple) along the shortest known path
+
+    Recognizes the screen from one hierarchy fetch, performs the first action of the path, then
+    recognizes again, so nothing is pressed when the app is already there.
+    Returns (screen, snapshot) of where it ended up.
+    """
+    targets = (target,) if isinstance(target, str) else tuple(target)
+    snapshot = get_ui_snapshot(driver)
+    screen = recognize_screen(snapshot)
+    for _ in range(max_steps):
+        if screen in targets:
+            return screen, snapshot
+        path = find_screen_path(screen, targets)
+        if not path:
+            print(f"[NAV] No known path from '{screen}' to {'/'.join(targets)}")
+            break
+        perform_screen_action(driver, path[0])
+        _, snapshot = wait_for_screen_settled(
+            driver, condition=lambda new_snapshot, current=screen: recognize_screen(new_snapshot) != current,
+            timeout=NAV_STEP_TIMEOUT, stable_polls=2, label=f"{screen} -> {path[0]}")
+        new_screen = recognize_screen(snapshot)
+        print(f"[NAV] {screen} --{path[0]}--> {new_screen}")
+        screen = new_screen
+    return screen, snapshot
+
+# Photo send path: "share" = one ACTION_SEND intent aimed at the chat (phone-number chats, WhatsApp needs
+# the jid), falling back to the gallery flow; "gallery" = attach -> Gallery -> DEVICE_CONFIGS coordinate taps
+SEND_MODE = "share"
+SHARE_PREVIEW_TIMEOUT = 8.0  # Seconds to wait for WhatsApp's media preview after the intent
+SEND_UNCONFIRMED = "unconfirmed"  # Send was tapped but the preview didn't close: likely sent, never resend
+
+def get_media_content_uri(driver, device_path):
+    """MediaStore content:// URI of a pushed file, None if it isn't indexed (or there is no device shell)"""
+    is_video = os.path.splitext(device_path)[1].lower() in VIDEO_EXTENSIONS
+    base_uri = f"content://media/external/{'video' if is_video else 'images'}/media"
+    # The quotes survive the device shell re-parsing the joined command line
+    output = device_shell(driver, 'content', ['query', '--uri', base_uri, '--projection', '_id',
+                                              '--where', f"\"_data='{device_path}'\""])
+    match = re.search(r'_id=(\d+)', output or "")
+    return f"{base_uri}/{match.group(1)}" if match else None
+
+@timed_step("share_send")
+def send_photo_by_share_intent(driver, message, device_photo_path, phone_number):
+    """Send photo + caption with one ACTION_SEND intent to the chat's jid, then tap send in the preview
+
+    Returns True when sent, False when send was never tapped (safe to fall back), SEND_UNCONFIRMED
+    when send was tapped but the preview stayed open (slow phone).
+    """
+    start_time = time.time()
+    file_ext = os.path.splitext(device_photo_path)[1].lower()
+    if file_ext in VIDEO_EXTENSIONS:
+        mime_type = 'video/mp4' if file_ext == '.mp4' else 'video/*'
+    else:
+        mime_type = 'image/png' if file_ext == '.png' else 'image/jpeg'
+    media_uri = get_media_content_uri(driver, device_photo_path) or f"file://{device_photo_path}"
+    print(f"[SHARE] Sending {media_uri} to {phone_number} via share intent...")
+
     try:
-        # Test device responsiveness
-        start_time = time.time()
-        driver.get_window_size()  # Simple responsiveness test
-        response_time = time.time() - start_time
-
-        # Adjust delay based on response time
-        if response_time > 0.5:  # Slow device
-            delay = min(base_delay * 1.5, max_delay)
-            print(f"[DELAY] Slow device detected ({response_time:.2f}s), using {delay:.1f}s delay")
-        elif response_time > 0.2:  # Normal device
-            delay = base_delay
-            print(f"[DELAY] Normal response ({response_time:.2f}s), using {delay:.1f}s delay")
-        else:  # Fast device
-            delay = max(base_delay * 0.7, 0.3)
-            print(f"[DELAY] Fast device ({response_time:.2f}s), using {delay:.1f}s delay")
-
-        time.sleep(delay)
-        return delay
+        driver.execute_script('mobile: startActivity', {
+            'action': 'android.intent.action.SEND',
+            'mimeType': mime_type,
+            'package': 'com.whatsapp',
+            'flags': '0x10000001',  # FLAG_ACTIVITY_NEW_TASK | FLAG_GRANT_READ_URI_PERMISSION
+            'extras': [
+                ['s', 'jid', f"{phone_number}@s.whatsapp.net"],
+                ['s', 'android.intent.extra.TEXT', message],
+                ['u', 'android.intent.extra.STREAM', media_uri],
+            ]
+        })
+    except Exception as e:
+        print(f"[SHARE] Share intent failed: {e}")
+        return False
+
+    # WhatsApp opens the media preview of that chat with the caption filled in
+    status, snapshot = wait_for_screen_settled(
+        driver,
+        condition=lambda snapshot: snapshot_has_id(snapshot, 'com.whatsapp:id/caption'),
+        timeout=SHARE_PREVIEW_TIMEOUT,
+        label="share preview",
+        settle_early=False
+    )
+    if status != 'condition':
+        print(f"[SHARE] Media preview didn't open ({status})")
+        navigate_to(driver, SCREEN_CONVERSATION)
+        return False
+
+    # EXTRA_TEXT travels on the device shell's am command line, where newlines and quotes can get lost
+    caption = next((node.get('text') for node in snapshot.iter()
+                    if node.get('resource-id') == 'com.whatsapp:id/caption'), None)
+    if normalize_field_text(caption) != normalize_field_text(message):
+        print("[SHARE] Caption from the intent doesn't match the message, entering it again")
+        if not enter_text(driver, 'caption', message, find_ui_element(driver, 'caption_input')):
+            print("[SHARE] Caption could not be entered")
+            navigate_to(driver, SCREEN_CONVERSATION)
+            return False
 
+    try:
+        driver.find_element(*get_locators('send_button')[0]).click()
     except Exception as e:
-        # If test fails, use base delay
-        print(f"[DELAY] Responsiveness test failed, using base delay {base_delay}s")
-        time.sleep(base_delay)
-        return base_delay
+        print(f"[SHARE] Send button not found in preview: {e}")
+        navigate_to(driver, SCREEN_CONVERSATION)
+        return False
+
+    # Confirm: the preview closes once the message is queued
+    status, snapshot = wait_for_screen_settled(
+        driver,
+        condition=lambda snapshot: not snapshot_has_id(snapshot, 'com.whatsapp:id/caption'),
+        timeout=5.0,
+        label="share send",
+        settle_early=False
+    )
+    if status != 'condition':
+        print(f"[SHARE] Preview still open after tapping send, not falling back (it may already be sent)")
+        return SEND_UNCONFIRMED
+    print(f"[DONE] Photo+message sent via share intent! Total: {time.time() - start_time:.2f}s")
+    return True
+
+# Text input engine: use the fastest method that verifiably lands the text, learned per field and
+# text length (names vs the daily message). Methods:
+#   set_text  - UiAutomator2 sets the element text directly (no keyboard, any Unicode)
+#   clipboard - set the device clipboard, then KEYCODE_PASTE into the focused field
+#   ime       - ADBKeyBoard broadcast, needs com.android.adbkeyboard installed and selected as keyboard
+#   type      - 'mobile: type' keyboard injection (slow per character, drops emoji on many devices)
+TEXT_INPUT_METHODS = ('set_text', 'clipboard', 'ime', 'type')
+TEXT_INPUT_IME_ENABLED = False   # Only turn on with ADBKeyBoard active on the phone
+TEXT_INPUT_LONG_CHARS = 40       # Texts longer than this are ranked separately
+KEYCODE_PASTE = 279
+TEXT_INPUT_STATS = {}            # "field:short|long" -> method -> {'ok', 'failed', 'total_ms'}
+
+def normalize_field_text(text):
+    """Compare field contents the way they render: NFC, surrounding whitespace ignored"""
+    return unicodedata.normalize('NFC', text or "").strip()
+
+def read_field_text(driver, element):
+    """Current text of the field (the focused EditText when there is no element)"""
+    if element is not None:
+        return element.text
+    for node in get_ui_snapshot(driver).iter():
+        if node.get('focused') == 'true' and node.get('class') == 'android.widget.EditText':
+            return node.get('text')
+    return None
+
+def get_text_input_order(key):
+    """Methods for one field/length bucket: reliable winners by speed, untried next, failing ones last"""
+    stats = TEXT_INPUT_STATS.get(key, {})
 
-def send_message_with_photo(driver, message):
+    def rank(method):
+        method_stats = stats.get(method)
+        if not method_stats:
+            return (1, TEXT_INPUT_METHODS.index(method))
+        if method_stats['failed'] > method_stats['ok']:
+            return (2, TEXT_INPUT_METHODS.index(method))
+        return (0, method_stats['total_ms'] / max(method_stats['ok'], 1))
+
+    return sorted(TEXT_INPUT_METHODS, key=rank)
+
+def input_text_with(driver, method, element, text):
+    """Put text into the field with one method (no verification)"""
+    if method == 'set_text':
+        element.send_keys(text)  # UiAutomator2 replaces the whole field text
+        return
+    if element is not None:
+        element.click()  # Keyboard methods type into the focused field
+        element.clear()
+    if method == 'clipboard':
+        driver.set_clipboard_text(text)
+        driver.press_keycode(KEYCODE_PASTE)
+    elif method == 'ime':
+        encoded = base64.b64encode(text.encode('utf-8')).decode('ascii')
+        if device_shell(driver, 'am', ['broadcast', '-a', 'ADB_INPUT_B64', '--es', 'msg', encoded]) is None:
+            raise Exception("ADBKeyBoard broadcast failed")
+    else:
+        driver.execute_script("mobile: type", {"text": text})
+
+def enter_text(driver, field, text, element=None):
+    """Enter text into a field with the best known method and check what landed
+
+    Falls through the methods until the field reads back the exact text. Without an element the
+    text goes to the focused field and only one method is tried (a failed attempt can't be cleared).
+    Returns the method that worked, or None.
+    """
+    key = f"{field}:{'long' if len(text) > TEXT_INPUT_LONG_CHARS else 'short'}"
+    expected = normalize_field_text(text)
+    for method in get_text_input_order(key):
+        if method == 'set_text' and element is None:
+            continue
+        if method == 'ime' and not TEXT_INPUT_IME_ENABLED:
+            continue
+        method_start = time.time()
+        try:
+            input_text_with(driver, method, element, text)
+            landed = normalize_field_text(read_field_text(driver, element)) == expected
+        except Exception as e:
+            print(f"[INPUT] {method} failed for {field}: {e}")
+            landed = False
+        duration = time.time() - method_start
+
+        method_stats = TEXT_INPUT_STATS.setdefault(key, {}).setdefault(method, {'ok': 0, 'failed': 0, 'total_ms': 0.0})
+        record_metric("text_input", duration, "ok" if landed else "fail", method=method, field=field, chars=len(text))
+        if landed:
+            method_stats['ok'] += 1
+            method_stats['total_ms'] += duration * 1000
+            print(f"[INPUT] {field} via {method} ({len(text)} chars, {duration:.2f}s)")
+            return method
+        method_stats['failed'] += 1
+        print(f"[INPUT] {method} didn't land the {field} text ({duration:.2f}s), trying next method")
+        if element is None:
+            break
+    return None
+
+def print_text_input_stats():
+    """Per field: which text input method was used, how often and how fast"""
+    for key, methods in sorted(TEXT_INPUT_STATS.items()):
+        parts = []
+        for method in get_text_input_order(key):
+            method_stats = methods.get(method)
+            if method_stats:
+                part = f"{method} {method_stats['ok']} ok/{method_stats['failed']} failed"
+                if method_stats['ok']:
+                    part += f", avg {method_stats['total_ms'] / method_stats['ok']:.0f}ms"
+                parts.append(part)
+        print(f"   - Text input {key}: {'; '.join(parts)}")
+
+@timed_step("send_message_with_photo")
+def send_message_with_photo(driver, message, device_photo_path=None, phone_number=None):
     """Optimized photo + message sending with adaptive delays"""
+    if SEND_MODE == "share" and device_photo_path and phone_number:
+        share_result = send_photo_by_share_intent(driver, message, device_photo_path, phone_number)
+        if share_result:
+            return share_result  # True or SEND_UNCONFIRMED: a gallery send could deliver it twice
+        print("[SHARE] Falling back to the gallery flow")
+
     start_time = time.time()
     print(f"[INFO] Fast photo + message send...")
 
     try:
         # Step 1: Click attachment button with quick timeout (1.5s)
         step_start = time.time()
-        attachment_selectors = [
-            (AppiumBy.ID, "com.whatsapp:id/attach"),
-            (AppiumBy.XPATH, "//*[@resource-id='com.whatsapp:id/attach']"),
-            (AppiumBy.XPATH, "//android.widget.ImageButton[contains(@resource-id, 'attach')]")
-        ]
-
         # Use quick timeout to fail fast if chat screen didn't load
-        quick_wait = WebDriverWait(driver, timeout=1.5, poll_frequency=0.3)
-
-        try:
-            # Use EC.any_of for parallel search
-            attachment_btn = quick_wait.until(
-                EC.any_of(
-                    *[EC.element_to_be_clickable(selector) for selector in attachment_selectors]
-                )
-            )
-            attachment_btn.click()
-            adaptive_wait(driver, 0.8, 2.0)  # Adaptive delay
-            print(f"[INFO] Attachment clicked ({time.time() - step_start:.2f}s)")
-        except TimeoutException:
+        attachment_btn = find_ui_element(driver, 'attach_button', timeout=1.5)
+        if attachment_btn is None:
             search_time = time.time() - step_start
             print(f"[ERROR] Attachment button not found within 1.5s (took {search_time:.2f}s)")
             print(f"[QUICK_EXIT] Chat screen not loaded properly, moving to next chat")
             return False
+        attachment_btn.click()
+        adaptive_wait(driver, 0.8, 2.0)  # Adaptive delay
+        print(f"[INFO] Attachment clicked ({time.time() - step_start:.2f}s)")
 
         # Step 2: Click Gallery
         step_start = time.time()
-        gallery_selectors = [
-            (AppiumBy.XPATH, "//*[@text='Gallery']"),
-            (AppiumBy.XPATH, "//android.widget.TextView[@text='Gallery']")
-        ]
-
         # Use longer timeout for gallery and subsequent steps
-        wait = WebDriverWait(driver, timeout=12, poll_frequency=0.3)
-
-        gallery_btn = None
-        for selector_type, selector in gallery_selectors:
-            try:
-                gallery_btn = wait.until(EC.element_to_be_clickable((selector_type, selector)))
-                break
-            except TimeoutException:
-                continue
-
+        gallery_btn = find_ui_element(driver, 'gallery_button', timeout=12)
         if not gallery_btn:
-            raise Exception("Gallery button not found")
+            raise NoSuchElementException("Gallery button not found")
 
         gallery_btn.click()
         adaptive_wait(driver, 1.0, 2.0)  # Adaptive delay for gallery loading
@@ -1161,13 +3051,14 @@ def send_message_with_photo(driver, message):
             except:
                 print(f"[WARNING] Caption area not accessible, will send without caption")  
         
-        # Text input using mobile:type method
+        # Caption text through the input engine (the tapped caption box has focus)
         step_start = time.time()
         try:
-            # Use mobile:type - reliable and doesn't require adb_shell feature
-            driver.execute_script("mobile: type", {"text": message})
-            print(f"[INFO] Caption text sent via mobile:type ({time.time() - step_start:.2f}s)")
-
+            method = enter_text(driver, 'caption', message, find_ui_element(driver, 'caption_input'))
+            if method:
+                print(f"[INFO] Caption text entered via {method} ({time.time() - step_start:.2f}s)")
+            else:
+                print(f"[WARNING] Caption text could not be verified, sending anyway")
         except Exception as e:
             print(f"[WARNING] Text input failed, sending photo without caption: {e}")
         
@@ -1208,62 +3099,28 @@ def send_message_with_photo(driver, message):
 
 
 
+@timed_step("send_message_to_chat")
 def send_message_to_chat(driver, message):
     """Optimized text message sending - target: under 3 seconds"""
     start_time = time.time()
     print(f"[INFO] Fast text send...")
     
     try:
-        wait = WebDriverWait(driver, 2)  # 2 second timeout
-        
-        # Find message input (faster selectors)
-        input_selectors = [
-            (AppiumBy.ID, "com.whatsapp:id/entry"),
-            (AppiumBy.XPATH, "//*[@resource-id='com.whatsapp:id/entry']"),
-            (AppiumBy.XPATH, "//android.widget.EditText[contains(@resource-id, 'entry')]")
-        ]
-        
-        message_input = None
-        for selector_type, selector in input_selectors:
-            try:
-                message_input = wait.until(EC.element_to_be_clickable((selector_type, selector)))
-                break
-            except TimeoutException:
-                continue
-                
+        # Find message input (2 second timeout, learned selector order)
+        message_input = find_ui_element(driver, 'message_input', timeout=2)
         if not message_input:
-            raise Exception("Message input not found")
+            raise NoSuchElementException("Message input not found")
         
-        # Fast text input
+        # Fast text input, verified
         step_start = time.time()
-        message_input.click()
-        message_input.clear()
-        
-        # Try fast text input methods
-        try:
-            driver.execute_script("mobile: type", {"text": message})
-        except:
-            message_input.send_keys(message)
-            
+        if not enter_text(driver, 'message', message, message_input):
+            raise Exception("Message text could not be entered")
         print(f"📝 Text entered ({time.time() - step_start:.2f}s)")
         
         # Find and click send button (faster)
-        send_selectors = [
-            (AppiumBy.ID, "com.whatsapp:id/send"),
-            (AppiumBy.XPATH, "//*[@resource-id='com.whatsapp:id/send']"),
-            (AppiumBy.XPATH, "//android.widget.ImageButton[contains(@resource-id, 'send')]")
-        ]
-        
-        send_button = None
-        for selector_type, selector in send_selectors:
-            try:
-                send_button = wait.until(EC.element_to_be_clickable((selector_type, selector)))
-                break
-            except TimeoutException:
-                continue
-                
+        send_button = find_ui_element(driver, 'send_button', timeout=2)
         if not send_button:
-            raise Exception("Send button not found")
+            raise NoSuchElementException("Send button not found")
             
         send_button.click()
         time.sleep(0.5)  # Reduced from 2s
@@ -1284,440 +3141,703 @@ def go_back_to_chat_list(driver):
         return False
 
     try:
-        # Press back button to return to chat list
-        driver.press_keycode(4)  # KEYCODE_BACK
-        time.sleep(1.5)
-        return True
+        screen, _ = navigate_to(driver, SCREEN_HOME)
+        return screen == SCREEN_HOME
     except Exception as e:
         print(f"Error going back to chat list: {str(e)}")
         return False
 
 
-def search_and_find_chat(driver, chat_name):
+# Search result classifier statuses (returned by classify_search_results)
+SEARCH_RESULT_SINGLE = "single"          # Exactly one chat under the "Chats" section
+SEARCH_RESULT_MULTIPLE = "multiple"      # Several chats, filtered down to the ones matching the search term
+SEARCH_RESULT_NO_RESULTS = "no_results"  # Standalone "No results" with no sections on screen
+SEARCH_RESULT_LOADING = "loading"        # Nothing conclusive yet, keep polling
+
+# Section titles shown in the search results screen (regular WhatsApp and WhatsApp Business)
+SEARCH_SECTION_TITLES = ('chats', 'contacts', 'other contacts', 'messages')
+
+def parse_bounds(bounds):
+    """Parse a UiAutomator bounds string like '[0,0][1080,2400]' into (left, top, right, bottom)"""
+    match = re.match(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]", bounds or "")
+    if not match:
+        return None
+    return tuple(int(value) for value in match.groups())
+
+def bounds_center(bounds):
+    """Get the tap point (center) of a (left, top, right, bottom) bounds tuple"""
+    left, top, right, bottom = bounds
+    return ((left + right) // 2, (top + bottom) // 2)
+
+def get_ui_snapshot(driver):
+    """Fetch the whole UI hierarchy in a single WebDriver round trip and parse it locally"""
+    page_source = driver.page_source
+    return ET.fromstring(page_source.encode('utf-8'))
+
+def is_node_displayed(node):
+    """Check the 'displayed' attribute of a hierarchy node (older dumps don't have it)"""
+    return node.get('displayed', 'true') == 'true'
+
+def extract_row_chat_name(row_node):
+    """Read the chat name inside a contact_row_container node, skipping system notification text"""
+    # Same priority as the old per-container selectors (support both WhatsApp versions)
+    for id_fragment in (':id/conversations_row_contact_name', 'contact_name'):
+        for child in row_node.iter():
+            if child.get('class') != 'android.widget.TextView':
+                continue
+            if id_fragment not in (child.get('resource-id') or ''):
+                continue
+            found_chat_name = child.get('text') or ''
+            if not found_chat_name:
+                continue
+            # Skip if it's a system notification text
+            if "tap to" in found_chat_name.lower() or "changed" in found_chat_name.lower():
+                continue
+            return found_chat_name
+    return None
+
+def classify_search_results(snapshot, chat_name):
+    """Classify a parsed search results hierarchy without any further WebDriver calls
+
+    Returns a dict with:
+      - status: one of SEARCH_RESULT_SINGLE / MULTIPLE / NO_RESULTS / LOADING
+      - matches: rows to open, each {'name', 'bounds', 'center', 'row_index'}
+      - rows: every visible row under the "Chats" section (same shape as matches)
+      - has_chats_section / has_messages_section: which section titles are on screen
+    """
+    section_y = {}
+    row_nodes = []
+    no_results_visible = False
+
+    for node in snapshot.iter():
+        if not is_node_displayed(node):
+            continue
+        resource_id = node.get('resource-id') or ''
+        text = (node.get('text') or '').strip()
+
+        if (node.get('class') == 'android.widget.TextView' and ':id/title' in resource_id
+                and text.lower() in SEARCH_SECTION_TITLES):
+            bounds = parse_bounds(node.get('bounds'))
+            if bounds:
+                section_y.setdefault(text.lower(), bounds[1])
+        elif ':id/contact_row_container' in resource_id:
+            row_nodes.append(node)
+
+        if 'No results' in text:
+            no_results_visible = True
+
+    result = {
+        'status': SEARCH_RESULT_LOADING,
+        'matches': [],
+        'rows': [],
+        'has_chats_section': 'chats' in section_y,
+        'has_messages_section': 'messages' in section_y
+    }
+
+    if 'chats' in section_y:
+        chats_y_start = section_y['chats']
+        # Chats must be BELOW "Chats" title AND ABOVE "Other contacts"/"Contacts" section
+        other_contacts_y_start = min(
+            section_y.get('other contacts', float('inf')),
+            section_y.get('contacts', float('inf'))
+        )
+
+        for node in row_nodes:
+            bounds = parse_bounds(node.get('bounds'))
+            if not bounds:
+                continue
+            if chats_y_start < bounds[1] < other_contacts_y_start:
+                result['rows'].append({
+                    'name': extract_row_chat_name(node),
+                    'bounds': bounds,
+                    'center': bounds_center(bounds),
+                    'row_index': len(result['rows'])
+                })
+
+        if len(result['rows']) == 1:
+            result['status'] = SEARCH_RESULT_SINGLE
+            result['matches'] = list(result['rows'])
+        elif len(result['rows']) > 1:
+            for row in result['rows']:
+                # Rows whose name can't be read are kept as fallback matches
+                if row['name'] is None or chat_name.lower() in row['name'].lower():
+                    result['matches'].append(row)
+            if result['matches']:
+                result['status'] = SEARCH_RESULT_MULTIPLE
+
+    # Only consider "No results" as truly unavailable when NO sections exist
+    elif 'messages' not in section_y and no_results_visible:
+        result['status'] = SEARCH_RESULT_NO_RESULTS
+
+    return result
+
+# Persistent cache of how each cleaned chat name was resolved in the search results
+# (resolved_chats in the campaign store, shared by --multi-device workers)
+RESOLVED_CHAT_FIELDS = ('display_name', 'resolution', 'row_index', 'search_time', 'resolved_at')
+RESOLVED_CHAT_CACHE_STATS = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+def get_resolved_chat(clean_name):
+    """Look up a cleaned chat name in the resolved-chat cache, counting hits and misses"""
+    row = get_campaign_store().execute(
+        f"SELECT {', '.join(RESOLVED_CHAT_FIELDS)} FROM resolved_chats WHERE clean_name = ?", (clean_name,)
+    ).fetchone()
+    if row:
+        RESOLVED_CHAT_CACHE_STATS['hits'] += 1
+        return dict(zip(RESOLVED_CHAT_FIELDS, row))
+    RESOLVED_CHAT_CACHE_STATS['misses'] += 1
+    return None
+
+def record_resolved_chat(clean_name, display_name, resolution, row_index, search_time):
+    """Remember how a chat was resolved (resolution is 'single' or 'disambiguated')"""
+    get_campaign_store().execute(
+        "INSERT OR REPLACE INTO resolved_chats (clean_name, display_name, resolution, row_index, search_time, resolved_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (clean_name, display_name, resolution, row_index, round(search_time, 2), format_gmt7_time())
+    )
+
+def invalidate_resolved_chat(clean_name, reason):
+    """Drop a cache entry that no longer matches what the search results show"""
+    if get_campaign_store().execute("DELETE FROM resolved_chats WHERE clean_name = ?", (clean_name,)).rowcount:
+        RESOLVED_CHAT_CACHE_STATS['invalidations'] += 1
+        print(f"[CACHE] Invalidated cached resolution for '{clean_name}': {reason}")
+
+def find_cached_row(result, cached_entry):
+    """Find the cached display name among the search result rows, preferring the cached row index"""
+    rows = result['rows']
+    row_index = cached_entry.get('row_index')
+    if row_index is not None and row_index < len(rows) and rows[row_index]['name'] == cached_entry['display_name']:
+        return rows[row_index]
+    for row in rows:
+        if row['name'] == cached_entry['display_name']:
+            return row
+    return None
+
+def is_conversation_screen(snapshot):
+    """Check if a parsed hierarchy is an open conversation (message entry box visible)"""
+    return snapshot_has_id(snapshot, 'com.whatsapp:id/entry')
+
+def open_chat_by_intent(driver, phone_number):
+    """Open a phone-number chat directly with a VIEW intent, bypassing the UI search"""
+    intent_start = time.time()
+    chat_uri = f"whatsapp://send?phone={phone_number}"
+    print(f"[INTENT] Opening chat via intent: {chat_uri}")
+
+    launched = False
+    try:
+        driver.execute_script("mobile: startActivity", {
+            "action": "android.intent.action.VIEW",
+            "uri": chat_uri,
+            "package": "com.whatsapp"
+        })
+        launched = True
+    except Exception as e:
+        print(f"[INTENT] mobile: startActivity failed, trying adb: {e}")
+        result = adb_shell(['am', 'start', '-a', 'android.intent.action.VIEW',
+                            '-d', f"'{chat_uri}'", '-p', 'com.whatsapp'])
+        launched = result is not None and result.returncode == 0 and 'Error' not in result.stdout
+
+    if not launched:
+        print(f"[INTENT] Could not launch intent for {phone_number}")
+        return False
+
+    reason, _ = wait_for_screen_settled(driver, condition=is_conversation_screen, timeout=5.0, label="intent chat",
+                                       settle_early=False)
+    if reason == 'condition':
+        print(f"[\033[92mSUCCESS\033[0m] Chat opened via intent in {time.time() - intent_start:.2f}s")
+        return True
+
+    # Typically the "phone number isn't on WhatsApp" dialog - dismiss it before falling back
+    print(f"[INTENT] Intent did not land on a conversation after {time.time() - intent_start:.2f}s")
+    try:
+        navigate_to(driver, (SCREEN_HOME,) + SEARCH_SESSION_SCREENS if SEARCH_SESSION else SCREEN_HOME)
+    except Exception as e:
+        print(f"[INTENT] Failed to dismiss intent screen: {e}")
+    return False
+
+def open_chat(driver, chat_name, clean_name, probe=False):
+    """Open a chat: intent fast path for phone numbers, UI search for everything else
+
+    With probe=True (chats in the negative cache) the search gets a short wait and no retries.
+    """
+    if DIRECT_OPEN_PHONE_CHATS:
+        phone_number = normalize_phone_number(chat_name)
+        if phone_number:
+            if open_chat_by_intent(driver, phone_number):
+                return True
+            print(f"[INTENT] Falling back to search for '{clean_name}'")
+
+    if probe:
+        print(f"[NOT_FOUND] Probe search for '{clean_name}' ({get_not_found_strikes(chat_name)} recent strikes)")
+        return safe_operation(search_and_find_chat, driver, clean_name, max_wait_time=NOT_FOUND_PROBE_WAIT, retry_count=0)
+    return safe_operation(search_and_find_chat, driver, clean_name, retry_count=1)
+
+# Search session: BACK from a chat opened via search lands on the live search results, so the
+# next chat reuses the open search box (clear + retype) instead of going home and re-tapping search
+SEARCH_SESSION = True  # Disable with --no-search-session
+SEARCH_SESSION_SCREENS = (SCREEN_SEARCH, SCREEN_SEARCH_RESULTS)
+SEARCH_SESSION_STATS = {'reused': 0, 'opened': 0}
+_last_search_query = None  # Query typed into the open search box, to spot its rows lingering after a clear
+
+def leave_search(driver):
+    """After a search that opened no chat: keep the search session, or go back to the chat list"""
+    if not SEARCH_SESSION:
+        navigate_to(driver, SCREEN_HOME)
+
+@timed_step("search")
+def search_and_find_chat(driver, chat_name, max_wait_time=20):
     """Search for a specific chat using WhatsApp search functionality"""
+    global _last_search_query
     search_start = time.time()
     try:
         print(f"Searching for chat: {chat_name}")
 
-        # First, ensure we're on the main WhatsApp screen
-        try:
-            # Check for FAB (floating action button) to verify home screen
-            combined_xpath = "//*[@resource-id='com.whatsapp:id/fab']"
-
-            # Wait for at least one main indicator to be present
-            main_found = False
-            found_element_name = None
-            wait = WebDriverWait(driver, 10)
-            try:
-                elements = wait.until(EC.presence_of_all_elements_located((AppiumBy.XPATH, combined_xpath)))
-                for element in elements:
-                    if element.is_displayed():
-                        # Get element details for logging
-                        try:
-                            found_element_name = element.get_attribute('text') or element.get_attribute('resource-id') or "main element"
-                        except:
-                            found_element_name = "main element"
-                        print(f"[LOAD] Found main element: {found_element_name}")
-                        main_found = True
-                        break
-            except TimeoutException:
-                print("[LOAD] Timeout waiting for main WhatsApp elements")
-
-            if not main_found:
-                print("[LOAD] No main WhatsApp elements found, pressing back and relaunching...")
-                driver.press_keycode(4)  # Back button
-                time.sleep(.5)
-                open_whatsapp_business(driver)
-                print("[LOAD] WhatsApp relaunched successfully, continuing...")
-        except Exception as e:
-            print(f"[LOAD] Error checking home screen: {e}")
-
-        # # Look for search button/icon - try multiple selectors with timeout
-        # search_selectors = [
-        #     # Regular WhatsApp selectors (priority)
-        #     (AppiumBy.ID, "com.whatsapp:id/menuitem_search"),
-        #     (AppiumBy.ID, "com.whatsapp:id/search"),
-        #     (AppiumBy.XPATH, "//*[@resource-id='com.whatsapp:id/menuitem_search']"),
-        #     (AppiumBy.XPATH, "//*[@resource-id='com.whatsapp:id/search']"),
-        #     # WhatsApp specific selectors (fallback)
-        #     (AppiumBy.ID, "com.whatsapp:id/search_bar_inner_layout"),
-        #     (AppiumBy.XPATH, "//*[@resource-id='com.whatsapp:id/search_bar_inner_layout']"),
-        #     (AppiumBy.ID, "com.whatsapp:id/menuitem_search"),
-        #     (AppiumBy.XPATH, "//*[@resource-id='com.whatsapp:id/menuitem_search']"),
-        #     # Generic search selectors
-        #     (AppiumBy.XPATH, "//*[@content-desc='Search']"),
-        #     (AppiumBy.XPATH, "//*[contains(@content-desc, 'Search')]"),
-        #     (AppiumBy.XPATH, "//*[@text='Search']")
-        # ]
-
-        # wait = WebDriverWait(driver, 3)
-        # search_button = None
-
-        # try:
-        #     # Use EC.any_of for parallel search of all selectors
-        #     search_button = wait.until(
-        #         EC.any_of(
-        #             *[EC.element_to_be_clickable(selector) for selector in search_selectors]
-        #         )
-        #     )
-        #     print(f"[DEBUG] Found search button using parallel search")
-        # except TimeoutException:
-        #     print(f"[DEBUG] Search button not found with any of {len(search_selectors)} selectors")
-
-        # if search_button:
-        #     # Click on search button
-        #     search_button.click()
-        #     time.sleep(.5)
-        #     print("[DEBUG] Search activated successfully")
-        # else:
-        #     print("[DEBUG] Search button not found, trying alternative methods...")
-
-        # Wait for search functionality to be ready and activate it
-        print("[SEARCH] Activating search...")
-        search_activated = False
-
-        # Try WebDriverWait first for search button
-        try:
-            wait = WebDriverWait(driver, 2)
-            search_element = wait.until(EC.element_to_be_clickable((AppiumBy.ID, "com.whatsapp:id/menuitem_search")))
-            search_element.click()
-            search_activated = True
-            print("[SEARCH] Search activated via element click")
-        except:
-            # Fallback to coordinate tap using device-specific coordinates
-            config = get_device_config()
-            search_x = config['search_button_x']
-            search_y = config['search_button_y']
-            driver.tap([(search_x, search_y)])
-            search_activated = True
-            print(f"[SEARCH] Search activated by coordinate tap at ({search_x}, {search_y})")
-
-        if not search_activated:
-            print("[ERROR] Failed to activate search")
-            return False
+        # Get to a search box along the shortest path from whatever screen is showing
+        search_targets = SEARCH_SESSION_SCREENS if SEARCH_SESSION else SCREEN_SEARCH
+        screen, _ = navigate_to(driver, search_targets)
+        if screen not in SEARCH_SESSION_SCREENS:
+            print(f"[LOAD] Search not reachable from '{screen}', relaunching WhatsApp...")
+            open_whatsapp_business(driver)
+            screen, _ = navigate_to(driver, search_targets)
+            if screen not in SEARCH_SESSION_SCREENS:
+                print("[ERROR] Failed to activate search")
+                return False
 
-        # Wait for search input field to be ready
-        time.sleep(1.0)  # Allow search interface to fully load
+        previous_query = None
+        if screen == SCREEN_SEARCH_RESULTS:
+            # Previous query still in the box: clear it and let its results go, so stale rows
+            # (or a stale "No results") are never classified against the new name
+            print("[SEARCH] Reusing open search session, clearing previous query")
+            search_input = find_ui_element(driver, 'search_input', timeout=1)
+            cleared = False
+            if search_input is not None:
+                search_input.clear()
+                reason, _ = wait_for_screen_settled(
+                    driver,
+                    condition=lambda snapshot: recognize_screen(snapshot) == SCREEN_SEARCH,
+                    timeout=1.0,
+                    label="cleared search",
+                    settle_early=False
+                )
+                cleared = reason == 'condition'
+            if cleared:
+                SEARCH_SESSION_STATS['reused'] += 1
+                previous_query = _last_search_query
+            else:
+                # Old results may still be on screen: start from a fresh search box instead
+                print("[SEARCH] Clear not confirmed, reopening search")
+                navigate_to(driver, SCREEN_HOME)
+                screen, _ = navigate_to(driver, SCREEN_SEARCH)
+                if screen != SCREEN_SEARCH:
+                    print(f"[ERROR] Failed to reopen search (on '{screen}')")
+                    return False
+                SEARCH_SESSION_STATS['opened'] += 1
+        else:
+            SEARCH_SESSION_STATS['opened'] += 1
 
-        # Input Unicode text with better error handling
+        # Input Unicode text through the input engine (search box has focus if the element isn't found)
         try:
-            # Wait for search field to be available
-            wait = WebDriverWait(driver, 3)
-            try:
-                search_input = wait.until(EC.element_to_be_clickable((AppiumBy.ID, "com.whatsapp:id/search_src_text")))
-                search_input.click()
-                search_input.clear()
-                search_input.send_keys(chat_name)
-                print(f"[SEARCH] Text input via search field element: '{chat_name}'")
-            except:
-                # Fallback to mobile:type
-                driver.execute_script("mobile: type", {"text": chat_name})
-                print(f"[SEARCH] Text input via mobile:type: '{chat_name}'")
+            search_input = find_ui_element(driver, 'search_input', timeout=3)
+            if not enter_text(driver, 'search', chat_name, search_input):
+                print(f"[ERROR] Search text '{chat_name}' could not be entered")
+                return False
+            _last_search_query = chat_name
         except Exception as e:
             print(f"[ERROR] Failed to input search text: {e}")
             return False
 
         # Enhanced waiting logic with backend loading consideration
+        # No fixed initial sleep: poll right away, results are classified as soon as they render
         print(f"[WAIT] Waiting for backend to process search results...")
-        time.sleep(1.5)  # Initial wait for backend processing
-        max_wait_time = 20  # Maximum wait time in seconds
         wait_start = time.time()
-        last_message_time = 0  # Track when we last showed a wait message
-        messages_section_count = 0  # Track repeated "Messages section exists" messages
+        messages_section_count = 0  # Track repeated "Messages section exists" on an unchanged screen
         max_repeated_messages = 5  # Exit after 5 repeated messages
+        last_fingerprint = None
+
+        # Known resolution from a previous run lets us skip the multi-row verification
+        cached_entry = get_resolved_chat(chat_name)
+        if cached_entry:
+            print(f"[CACHE] Hit: '{chat_name}' -> '{cached_entry['display_name']}' (row {cached_entry['row_index'] + 1}, {cached_entry['resolution']})")
 
         # DEBUG: Dump all visible text elements on first iteration
         dumped_elements = False
 
         while (time.time() - wait_start) < max_wait_time:
             try:
+                # One hierarchy fetch per poll, everything below is parsed locally
+                page_source = driver.page_source
+                snapshot = ET.fromstring(page_source.encode('utf-8'))
+                fingerprint = get_hierarchy_fingerprint(page_source)
+                screen_unchanged = fingerprint == last_fingerprint
+                last_fingerprint = fingerprint
+
                 # DEBUG: On first iteration, dump all text elements to see what's on screen
                 if not dumped_elements:
                     dumped_elements = True
                     print(f"\n[DEBUG] ====== DUMPING ALL TEXT ELEMENTS ON SCREEN ======")
-                    try:
-                        all_texts = driver.find_elements(AppiumBy.XPATH, "//android.widget.TextView")
-                        print(f"[DEBUG] Found {len(all_texts)} TextView elements")
-                        for idx, element in enumerate(all_texts[:30]):  # Show first 30 to avoid spam
-                            try:
-                                text = element.text
-                                resource_id = element.get_attribute("resource-id")
-                                if text:
-                                    print(f"[DEBUG] Text {idx+1}: '{text}' (id: {resource_id})")
-                            except:
-                                pass
-                    except Exception as dump_error:
-                        print(f"[DEBUG] Failed to dump elements: {dump_error}")
+                    text_nodes = [node for node in snapshot.iter() if node.get('class') == 'android.widget.TextView']
+                    print(f"[DEBUG] Found {len(text_nodes)} TextView elements")
+                    for idx, node in enumerate(text_nodes[:30]):  # Show first 30 to avoid spam
+                        if node.get('text'):
+                            print(f"[DEBUG] Text {idx+1}: '{node.get('text')}' (id: {node.get('resource-id')})")
                     print(f"[DEBUG] ====== END ELEMENT DUMP ======\n")
 
-                # Check #1: PRIORITY - Look for "Chats" section and chat under it FIRST
-                try:
-                    # Support both regular WhatsApp and WhatsApp Business (case-insensitive)
-                    chats_title = driver.find_element(AppiumBy.XPATH, "//android.widget.TextView[contains(@resource-id, ':id/title') and (translate(@text, 'CHATS', 'chats')='chats')]")
-                    if chats_title.is_displayed():
-                        print(f"[DEBUG] 'Chats' section located - checking for chat underneath...")
-
-                        # Get the position of the "Chats" section to ensure we look below it
-                        chats_location = chats_title.location
-                        chats_y_start = chats_location['y']
-                        print(f"[DEBUG] 'Chats' section Y position: {chats_y_start}")
-
-                        # Check if "Other contacts" or "Contacts" section exists and get its position
-                        other_contacts_y_start = float('inf')  # Default to infinity (no limit)
-                        try:
-                            # Try "Other contacts" or "Contacts" (for WhatsApp Business) - case insensitive
-                            other_contacts_title = driver.find_element(AppiumBy.XPATH, "//android.widget.TextView[contains(@resource-id, ':id/title') and (translate(@text, 'CONTACTS', 'contacts')='contacts' or translate(@text, 'OTHER CONTACTS', 'other contacts')='other contacts')]")
-                            if other_contacts_title.is_displayed():
-                                other_contacts_location = other_contacts_title.location
-                                other_contacts_y_start = other_contacts_location['y']
-                                print(f"[DEBUG] 'Other contacts' section at Y={other_contacts_y_start} - will exclude chats below this")
-                        except:
-                            print(f"[DEBUG] 'Other contacts' section not found - will include all chats below 'Chats'")
-
-                        # Look for chat containers under "Chats" section (support both WhatsApp versions)
-                        chat_container_selectors = [
-                            (AppiumBy.XPATH, "//android.widget.RelativeLayout[contains(@resource-id, ':id/contact_row_container')]"),
-                            (AppiumBy.XPATH, "//android.widget.LinearLayout[contains(@resource-id, ':id/contact_row_container')]"),
-                            (AppiumBy.XPATH, "//*[contains(@resource-id, ':id/contact_row_container')]")
-                        ]
-
-                        for selector in chat_container_selectors:
-                            try:
-                                chat_containers = driver.find_elements(*selector)
-                                print(f"[DEBUG] Found {len(chat_containers)} chat containers using selector: {selector}")
-                                visible_chats = []
-
-                                # First, collect all visible chats under the "Chats" section ONLY
-                                # Exclude chats that are under "Other contacts" or any other section
-                                for idx, chat_container in enumerate(chat_containers):
-                                    if chat_container.is_displayed():
-                                        container_location = chat_container.location
-                                        container_y = container_location['y']
-                                        print(f"[DEBUG] Container {idx+1}: Y={container_y}, visible=True")
-
-                                        # Chat must be BELOW "Chats" title AND ABOVE "Other contacts" section
-                                        if container_y > chats_y_start and container_y < other_contacts_y_start:
-                                            visible_chats.append(chat_container)
-                                            print(f"[VALID_CHAT] Chat at Y={container_y} is under 'Chats' section (between {chats_y_start} and {other_contacts_y_start})")
-                                        elif container_y >= other_contacts_y_start:
-                                            print(f"[EXCLUDED] Chat at Y={container_y} is under 'Other contacts' section - skipping")
-                                        else:
-                                            print(f"[EXCLUDED] Chat at Y={container_y} is above 'Chats' section - skipping")
-                                    else:
-                                        print(f"[DEBUG] Container {idx+1}: not visible")
-
-                                print(f"[DEBUG] Total visible chats in 'Chats' section: {len(visible_chats)}")
-
-                                # If only one chat found, click it directly without verification
-                                if len(visible_chats) == 1:
-                                    search_time = time.time() - search_start
-                                    print(f"[\033[92mSUCCESS\033[0m] Single chat found under 'Chats' section after {search_time:.2f}s")
-                                    visible_chats[0].click()
-                                    print(f"[CLICKED] Opened chat (single result, no verification needed)")
-                                    return True
-
-                                # If multiple chats found, verify which one matches
-                                elif len(visible_chats) > 1:
-                                    print(f"[DEBUG] Multiple chats found ({len(visible_chats)}), starting verification...")
-                                    matching_chats = []
-
-                                    for chat_idx, chat_container in enumerate(visible_chats):
-                                        try:
-                                            print(f"[DEBUG] === Examining chat container {chat_idx+1}/{len(visible_chats)} ===")
-
-                                            # Look for chat name text within this container (support both WhatsApp versions)
-                                            chat_name_selectors = [
-                                                (AppiumBy.XPATH, ".//android.widget.TextView[contains(@resource-id, ':id/conversations_row_contact_name')]"),
-                                                (AppiumBy.XPATH, ".//android.widget.TextView[contains(@resource-id, 'contact_name')]")
-                                            ]
-
-                                            found_chat_name = None
-                                            for selector_idx, name_selector in enumerate(chat_name_selectors):
-                                                try:
-                                                    print(f"[DEBUG] Trying selector {selector_idx+1}: {name_selector}")
-                                                    name_element = chat_container.find_element(*name_selector)
-                                                    found_chat_name = name_element.text
-                                                    print(f"[DEBUG] Found text: '{found_chat_name}'")
-                                                    if found_chat_name:
-                                                        # Skip if it's a system notification text
-                                                        if "tap to" in found_chat_name.lower() or "changed" in found_chat_name.lower():
-                                                            print(f"[DEBUG] Skipping notification text: '{found_chat_name}'")
-                                                            found_chat_name = None
-                                                            continue
-                                                        print(f"[DEBUG] Valid chat name found: '{found_chat_name}'")
-                                                        break
-                                                except Exception as e:
-                                                    print(f"[DEBUG] Selector {selector_idx+1} failed: {str(e)}")
-                                                    continue
-
-                                            if found_chat_name:
-                                                # Check if the found chat name contains our search keyword
-                                                print(f"[DEBUG] Comparing: search='{chat_name}' vs found='{found_chat_name}'")
-                                                if chat_name.lower() in found_chat_name.lower():
-                                                    matching_chats.append((chat_container, found_chat_name))
-                                                    print(f"[MATCH] ✓ Found matching chat: '{found_chat_name}' (contains '{chat_name}')")
-                                                else:
-                                                    print(f"[SKIP] ✗ Chat '{found_chat_name}' doesn't match search term '{chat_name}'")
-                                            else:
-                                                # If we can't extract the name, add it as a fallback option
-                                                matching_chats.append((chat_container, "Unknown"))
-                                                print(f"[FALLBACK] Could not read chat name, added as fallback match")
-                                        except Exception as extract_error:
-                                            # If name extraction fails, add as fallback
-                                            matching_chats.append((chat_container, "Unknown"))
-                                            print(f"[FALLBACK] Error extracting name: {extract_error}")
-
-                                    # If we found matching chats, click the first one
-                                    print(f"[DEBUG] Total matching chats: {len(matching_chats)}")
-                                    if matching_chats:
-                                        first_match = matching_chats[0]
-                                        search_time = time.time() - search_start
-                                        print(f"[\033[92mSUCCESS\033[0m] Verified chat match: '{first_match[1]}' after {search_time:.2f}s")
-                                        first_match[0].click()
-                                        print(f"[CLICKED] Opened verified matching chat")
-                                        return True
-                                    else:
-                                        print(f"[DEBUG] No matching chats found after verification")
-
-                            except Exception as selector_error:
-                                print(f"[DEBUG] Selector iteration error: {selector_error}")
-                                continue
-
-                        # If "Chats" section exists but no matching chat found, wait a bit more
-                        current_wait_time = time.time() - wait_start
-                        if current_wait_time < (max_wait_time * 0.75):  # Give 75% of total wait time
-                            print(f"[DEBUG] 'Chats' section exists but no matching chat yet (waited {current_wait_time:.1f}s) - continuing...")
-                            time.sleep(0.5)
-                            continue
-                        else:
-                            print(f"[DEBUG] 'Chats' section exists but no matching chat found after {current_wait_time:.1f}s")
-                            # Don't return False yet, check for standalone "No results" first
-
-                except Exception as chats_section_error:
-                    print(f"[DEBUG] 'Chats' section check failed: {chats_section_error}")
-                    pass  # Continue to check for "No results"
-
-                # Check #2: Look for standalone "No results" (ONLY when no sections exist)
-                try:
-                    # Check if BOTH "Messages" and "Chats" sections are absent
-                    message_section_exists = False
-                    chats_section_exists = False
-
-                    try:
-                        message_section = driver.find_element(AppiumBy.XPATH, "//android.widget.TextView[contains(@resource-id, ':id/title') and translate(@text, 'MESSAGES', 'messages')='messages']")
-                        if message_section.is_displayed():
-                            message_section_exists = True
-                            messages_section_count += 1
-                            if messages_section_count <= 3:  # Only print first 3 times
-                                print(f"[DEBUG] 'Messages' section exists - 'No results' under it doesn't mean unavailable")
-                            elif messages_section_count == 4:
-                                print(f"[DEBUG] 'Messages' section still exists - reducing debug output...")
-                    except:
-                        pass
+                result = classify_search_results(snapshot, chat_name)
 
-                    try:
-                        chats_section = driver.find_element(AppiumBy.XPATH, "//android.widget.TextView[contains(@resource-id, ':id/title') and translate(@text, 'CHATS', 'chats')='chats']")
-                        if chats_section.is_displayed():
-                            chats_section_exists = True
-                            print(f"[DEBUG] 'Chats' section exists - still checking for chats")
-                    except:
-                        pass
-
-                    # Early exit if we've seen "Messages section exists" too many times
-                    if messages_section_count >= max_repeated_messages:
+                if cached_entry:
+                    cached_row = find_cached_row(result, cached_entry)
+                    if cached_row:
                         search_time = time.time() - search_start
-                        print(f"[EARLY_EXIT] Seen 'Messages section' {messages_section_count} times with no results - chat likely doesn't exist")
-                        print(f"[EARLY_EXIT] Exiting search after {search_time:.2f}s instead of waiting full timeout")
-                        # Go back to main screen before returning
-                        driver.press_keycode(4)  # Back button
-                        time.sleep(0.5)
-                        return False
-
-                    # Only consider "No results" as truly unavailable when NO sections exist
-                    if not message_section_exists and not chats_section_exists:
-                        no_results_selectors = [
-                            (AppiumBy.XPATH, "//*[@text='No results found']"),
-                            (AppiumBy.XPATH, "//*[contains(@text, 'No results found')]"),
-                            (AppiumBy.XPATH, "//*[contains(@text, 'No results')]"),
-                            (AppiumBy.XPATH, "//*[@text='No results']")
-                        ]
-
-                        for selector in no_results_selectors:
-                            try:
-                                no_result_element = driver.find_element(*selector)
-                                if no_result_element.is_displayed():
-                                    search_time = time.time() - search_start
-                                    print(f"[\033[91mCONFIRMED\033[0m] Standalone 'No results found' - chat '{chat_name}' truly unavailable after {search_time:.2f}s")
-                                    # Go back to main screen before returning
-                                    driver.press_keycode(4)  # Back button
-                                    time.sleep(0.5)
-                                    return False
-                            except:
-                                continue
-                    else:
-                        if message_section_exists and messages_section_count <= 3:
-                            print(f"[DEBUG] 'Messages' section exists - ignoring any 'No results' under it")
-                        if chats_section_exists:
-                            print(f"[DEBUG] 'Chats' section exists - continuing to wait for chat")
-
-                except:
-                    pass
+                        print(f"[\033[92mSUCCESS\033[0m] Cached chat '{cached_row['name']}' found after {search_time:.2f}s")
+                        driver.tap([cached_row['center']])
+                        print(f"[CLICKED] Opened cached chat (verification skipped)")
+                        record_resolved_chat(chat_name, cached_row['name'], cached_entry['resolution'], cached_row['row_index'], search_time)
+                        return True
+                    if result['status'] != SEARCH_RESULT_LOADING:
+                        invalidate_resolved_chat(chat_name, f"'{cached_entry['display_name']}' not in results")
+                        cached_entry = None
+
+                if result['status'] == SEARCH_RESULT_SINGLE and previous_query:
+                    # Reused session: a lone row still naming the previous query is left over from it
+                    row_name = (result['matches'][0]['name'] or '').lower()
+                    if (row_name and chat_name.lower() not in row_name
+                            and previous_query.lower() in row_name):
+                        print(f"[SEARCH] Single row '{result['matches'][0]['name']}' is from the previous query, waiting...")
+                        time.sleep(SCREEN_POLL_INTERVAL)
+                        continue
+
+                if result['status'] == SEARCH_RESULT_SINGLE:
+                    # If only one chat found, click it directly without verification
+                    search_time = time.time() - search_start
+                    print(f"[\033[92mSUCCESS\033[0m] Single chat found under 'Chats' section after {search_time:.2f}s")
+                    driver.tap([result['matches'][0]['center']])
+                    print(f"[CLICKED] Opened chat (single result, no verification needed)")
+                    if result['matches'][0]['name']:
+                        record_resolved_chat(chat_name, result['matches'][0]['name'], 'single', 0, search_time)
+                    return True
+
+                if result['status'] == SEARCH_RESULT_MULTIPLE:
+                    print(f"[DEBUG] Multiple chats found ({len(result['rows'])}), {len(result['matches'])} matching '{chat_name}':")
+                    for row in result['matches']:
+                        print(f"[MATCH] ✓ '{row['name'] or 'Unknown'}' at {row['bounds']}")
+                    first_match = result['matches'][0]
+                    search_time = time.time() - search_start
+                    print(f"[\033[92mSUCCESS\033[0m] Verified chat match: '{first_match['name'] or 'Unknown'}' after {search_time:.2f}s")
+                    driver.tap([first_match['center']])
+                    print(f"[CLICKED] Opened verified matching chat")
+                    if first_match['name']:
+                        record_resolved_chat(chat_name, first_match['name'], 'disambiguated', first_match['row_index'], search_time)
+                    return True
+
+                if result['status'] == SEARCH_RESULT_NO_RESULTS:
+                    search_time = time.time() - search_start
+                    print(f"[\033[91mCONFIRMED\033[0m] Standalone 'No results found' - chat '{chat_name}' truly unavailable after {search_time:.2f}s")
+                    leave_search(driver)
+                    return False
+
+                # Still loading - if "Chats" section exists, give it 75% of the total wait time
+                current_wait_time = time.time() - wait_start
+                if result['has_chats_section'] and current_wait_time < (max_wait_time * 0.75):
+                    time.sleep(SCREEN_POLL_INTERVAL)
+                    continue
 
+                # Only count polls where the screen has settled, so faster polling doesn't exit early
+                if result['has_messages_section'] and screen_unchanged:
+                    messages_section_count += 1
+                    if messages_section_count <= 3:  # Only print first 3 times
+                        print(f"[DEBUG] 'Messages' section exists - 'No results' under it doesn't mean unavailable")
+                    elif messages_section_count == 4:
+                        print(f"[DEBUG] 'Messages' section still exists - reducing debug output...")
+
+                # Early exit if we've seen "Messages section exists" too many times
+                if messages_section_count >= max_repeated_messages:
+                    search_time = time.time() - search_start
+                    print(f"[EARLY_EXIT] Seen 'Messages section' {messages_section_count} times with no results - chat likely doesn't exist")
+                    print(f"[EARLY_EXIT] Exiting search after {search_time:.2f}s instead of waiting full timeout")
+                    leave_search(driver)
+                    return False
 
                 # Wait before next check
-                time.sleep(0.5)
-                elapsed_time = time.time() - wait_start
-
-                # Only show wait message every 3 seconds to reduce spam
-                if elapsed_time - last_message_time >= 3.0:
-                    #print(f"[WAIT] Still waiting for results... ({elapsed_time:.1f}s / {max_wait_time}s)")
-                    last_message_time = elapsed_time
+                time.sleep(SCREEN_POLL_INTERVAL)
 
             except Exception as e:
+                if needs_recovery(e):
+                    raise
                 print(f"[ERROR] Error while waiting: {str(e)}")
-                time.sleep(0.5)
+                time.sleep(SCREEN_POLL_INTERVAL)
 
         # Timeout reached without finding either condition
         search_time = time.time() - search_start
         print(f"[TIMEOUT] Neither 'No results' nor chat under 'Chats' found after {search_time:.2f}s - assuming not found")
-        # Go back to main screen
-        driver.press_keycode(4)  # Back button
-        time.sleep(0.5)
+        leave_search(driver)
         return False
 
     except Exception as e:
+        if needs_recovery(e):
+            raise  # Not a "not found": the session has to be recovered by the caller
         search_time = time.time() - search_start
         print(f"[ERROR] Error searching for chat '{chat_name}' after {search_time:.2f}s: {str(e)}")
         return False
 
-def process_target_chats(driver):
-    """Main function to send messages to specific chats listed in txt/chat_name.txt"""
+# Forward-to-many: send the daily message once to a staging chat, then forward it in batches
+FORWARD_STAGING_CHAT = None      # Chat the message is staged in (e.g. your own "Message yourself" chat), set with --forward-via
+FORWARD_BATCH_SIZE = 5           # WhatsApp forwards a message to at most 5 chats at once
+FORWARD_LONG_PRESS_MS = 800      # Long-press duration that selects a message bubble
+FORWARD_PICKER_RESULT_WAIT = 4.0 # Max seconds for the forward picker search to show a chat
+FORWARD_STATS = {'batches': 0, 'forwarded': 0, 'unresolved': 0, 'failed_batches': 0}
+
+MESSAGE_BUBBLE_IDS = ('com.whatsapp:id/message_text', 'com.whatsapp:id/image')
+
+def find_last_message_center(snapshot):
+    """Tap point of the newest (bottom-most) message bubble in an open conversation"""
+    newest = None
+    for node in snapshot.iter():
+        if node.get('resource-id') not in MESSAGE_BUBBLE_IDS or not is_node_displayed(node):
+            continue
+        bounds = parse_bounds(node.get('bounds'))
+        if bounds and (newest is None or bounds[3] > newest[3]):
+            newest = bounds
+    return bounds_center(newest) if newest else None
+
+def is_forward_picker_screen(snapshot):
+    """Check if a parsed hierarchy is the forward picker (chat rows with tick boxes)"""
+    return snapshot_has_id(snapshot, 'com.whatsapp:id/contactpicker_row_name')
+
+def is_in_chat(snapshot, clean_name):
+    """Check if the open conversation is the given chat (header name, 'Name (You)' for your own chat)"""
+    if not is_conversation_screen(snapshot):
+        return False
+    for node in snapshot.iter():
+        if node.get('resource-id') == 'com.whatsapp:id/conversation_contact_name':
+            return clean_name.lower() in (node.get('text') or '').lower()
+    return True  # Header not readable, assume the chat didn't change
+
+def open_forward_picker(driver):
+    """Long-press the newest message in the open chat and open WhatsApp's forward picker"""
+    center = find_last_message_center(get_ui_snapshot(driver))
+    if center is None:
+        print("[FORWARD] No message bubble found to forward")
+        return False
+    driver.tap([center], FORWARD_LONG_PRESS_MS)
+    reason, _ = wait_for_screen_settled(
+        driver, condition=lambda snapshot: snapshot_has_id(snapshot, 'com.whatsapp:id/menuitem_forward'),
+        timeout=3.0, label="message selection", settle_early=False)
+    if reason != 'condition':
+        print("[FORWARD] Long-press did not select the message")
+        return False
+    forward_action = find_ui_element(driver, 'forward_action')
+    if forward_action is None:
+        print("[FORWARD] Forward action not found in the selection toolbar")
+        return False
+    forward_action.click()
+    reason, _ = wait_for_screen_settled(driver, condition=is_forward_picker_screen, timeout=5.0, label="forward picker",
+                                       settle_early=False)
+    return reason == 'condition'
+
+def select_forward_recipient(driver, clean_name, max_wait_time=FORWARD_PICKER_RESULT_WAIT):
+    """Search the forward picker for one chat and tick it, True only for a single exact name match"""
+    search_input = find_ui_element(driver, 'search_input')
+    if search_input is None:
+        search_button = find_ui_element(driver, 'search_button', timeout=3)
+        if search_button is None:
+            print("[FORWARD] Forward picker search not found")
+            return False
+        search_button.click()
+        search_input = find_ui_element(driver, 'search_input', timeout=3)
+    if not enter_text(driver, 'picker', clean_name, search_input):
+        return False
+
+    deadline = time.time() + max_wait_time
+    while time.time() < deadline:
+        rows = []
+        no_results = False
+        for node in get_ui_snapshot(driver).iter():
+            if node.get('resource-id') == 'com.whatsapp:id/contactpicker_row_name' and is_node_displayed(node):
+                rows.append(node)
+            elif 'No results' in (node.get('text') or ''):
+                no_results = True
+        exact = [node for node in rows if (node.get('text') or '').strip().lower() == clean_name.lower()]
+        if len(exact) == 1:
+            driver.tap([bounds_center(parse_bounds(exact[0].get('bounds')))])
+            return True
+        if len(exact) > 1 or no_results:
+            # Ambiguous or unknown here, the per-chat search handles it
+            return False
+        time.sleep(SCREEN_POLL_INTERVAL)
+    return False
+
+@timed_step("forward_batch")
+def forward_to_batch(driver, batch):
+    """Forward the staged message to one batch of (original_row, chat_name, clean_name) entries
+
+    Returns (sent, unresolved): sent is None when the picker could not be used or the send was not
+    confirmed, unresolved are the entries the picker search could not match.
+    """
+    if not open_forward_picker(driver):
+        return None, list(batch)
+
+    selected = []
+    unresolved = []
+    for entry in batch:
+        if select_forward_recipient(driver, entry[2]):
+            selected.append(entry)
+        else:
+            print(f"[FORWARD] '{entry[2]}' not resolved in the forward picker, leaving it to the per-chat path")
+            unresolved.append(entry)
+
+    if not selected:
+        # Close the picker search and the picker itself, back to the staging chat
+        navigate_to(driver, SCREEN_CONVERSATION)
+        return [], unresolved
+
+    driver.find_element(*get_locators('send_button')[0]).click()
+    reason, _ = wait_for_screen_settled(driver, condition=is_conversation_screen, timeout=8.0, label="forward send",
+                                       settle_early=False)
+    if reason != 'condition':
+        print(f"[FORWARD] Forward to {len(selected)} chats not confirmed")
+        return None, unresolved
+    return selected, unresolved
+
+def is_forwardable_chat(chat_name):
+    """Phone numbers (intent) and deferred chats (probe search) always take the per-chat path"""
+    return not normalize_phone_number(chat_name) and not is_chat_deferred(chat_name)
+
+def run_forward_campaign(driver, chat_entries, daily_message, device_photo_path, campaign_store, campaign_id):
+    """Stage the daily message in FORWARD_STAGING_CHAT and forward it to the target chats in batches
+
+    Forwarded chats are recorded as done in the campaign store. Chats the picker can't resolve
+    (plus phone numbers and deferred chats) are left unprocessed for the per-chat path.
+    Returns the forwarded (original_row, chat_name) entries, None if the message couldn't be staged.
+    """
+    staging_name = clean_chat_name(FORWARD_STAGING_CHAT)
+    print(f"\n[FORWARD] Staging the message in '{staging_name}', then forwarding to {FORWARD_BATCH_SIZE} chats at a time")
+    print(f"[FORWARD] Forwarded copies carry no @mention and show WhatsApp's 'Forwarded' label")
+    if not open_chat(driver, FORWARD_STAGING_CHAT, staging_name):
+        print(f"[FORWARD] Staging chat '{staging_name}' not found, using the per-chat path for every chat")
+        return None
+    if device_photo_path:
+        staged = send_message_with_photo(driver, daily_message, device_photo_path, normalize_phone_number(FORWARD_STAGING_CHAT))
+    else:
+        staged = send_message_to_chat(driver, daily_message)
+    # An unconfirmed staging send could leave an older bubble as the last message, never forward that
+    if staged is not True:
+        print("[FORWARD] Failed to send the message to the staging chat, using the per-chat path for every chat")
+        go_back_to_chat_list(driver)
+        return None
+
+    forwarded = []
+    entries = iter(chat_entries)
+    while True:
+        batch = []
+        for original_row, chat_name in entries:
+            if is_chat_processed(campaign_store, campaign_id, chat_name):
+                continue
+            if not is_forwardable_chat(chat_name):
+                continue  # Intent / probe search in the per-chat path
+            batch.append((original_row, chat_name, clean_chat_name(chat_name)))
+            if len(batch) == FORWARD_BATCH_SIZE:
+                break
+        if not batch:
+            break
+
+        FORWARD_STATS['batches'] += 1
+        batch_start = time.time()
+        print(f"\n[FORWARD] Batch {FORWARD_STATS['batches']}: {', '.join(entry[2] for entry in batch)}")
+        for original_row, chat_name, _ in batch:
+            mark_recipient_status(campaign_store, campaign_id, chat_name, 'sending', original_row)
+        sent, unresolved = forward_to_batch(driver, batch)
+        per_chat_time = (time.time() - batch_start) / len(batch)
+
+        # Unresolved chats go straight back to pending for the per-chat path (any worker's)
+        for original_row, chat_name, _ in unresolved:
+            FORWARD_STATS['unresolved'] += 1
+            mark_recipient_status(campaign_store, campaign_id, chat_name, 'pending', original_row)
+        if sent is None:
+            FORWARD_STATS['failed_batches'] += 1
+            # The forward may have gone out, never send these chats twice
+            for original_row, chat_name, clean_name in batch:
+                if (original_row, chat_name, clean_name) not in unresolved:
+                    record_chat_result(campaign_store, campaign_id, original_row, chat_name, 'failed',
+                                       error_class='forward_unconfirmed', message_time=per_chat_time)
+            print("[FORWARD] Stopping forwarding, remaining chats go through the per-chat path")
+            break
+
+        for original_row, chat_name, _ in sent:
+            record_chat_result(campaign_store, campaign_id, original_row, chat_name, 'done', message_time=per_chat_time)
+            record_metric("chat_total", per_chat_time, "ok", path="forward")
+            forwarded.append((original_row, chat_name))
+        FORWARD_STATS['forwarded'] += len(sent)
+        print(f"[FORWARD] Forwarded to {len(sent)}/{len(batch)} chats in {time.time() - batch_start:.2f}s")
+
+        # Forwarding to a single chat opens that chat, go back to the staging chat for the next batch
+        if not is_in_chat(get_ui_snapshot(driver), staging_name):
+            go_back_to_chat_list(driver)
+            if not open_chat(driver, FORWARD_STAGING_CHAT, staging_name):
+                print(f"[FORWARD] Could not reopen '{staging_name}', remaining chats go through the per-chat path")
+                return forwarded
+
+    # Staging chat (or a picker left open by a failed batch) back to the chat list
+    navigate_to(driver, SCREEN_HOME)
+    return forwarded
+
+def order_entries_by_not_found(entries):
+    """Move chats that keep failing to be found to the end of the queue (or drop them with 'skip')"""
+    deferred_entries = [entry for entry in entries if is_chat_deferred(entry[1])]
+    if not deferred_entries:
+        return entries
+
+    deferred_names = set(entry[1] for entry in deferred_entries)
+    active_entries = [entry for entry in entries if entry[1] not in deferred_names]
+    if NOT_FOUND_POLICY == "skip":
+        print(f"[NOT_FOUND] Skipping {len(deferred_entries)} chats not found on {NOT_FOUND_STRIKE_LIMIT}+ recent days (use --revalidate-not-found to re-check)")
+        return active_entries
+    print(f"[NOT_FOUND] Deferring {len(deferred_entries)} chats not found on {NOT_FOUND_STRIKE_LIMIT}+ recent days to the end of the queue")
+    return active_entries + deferred_entries
+
+def process_target_chats(driver, worker_id=None):
+    """Main function to send messages to specific chats listed in txt/chat_name.txt
+
+    With worker_id (multi-device worker), chats are claimed one at a time from today's campaign
+    in the shared store instead of the interactive selection menu.
+    """
     # Log script start time
     log_script_event("start", "WhatsApp automation script started")
 
-    print("Starting to process target chats from txt/chat_name.txt...")
+    campaign_store = get_campaign_store()
+    campaign_id = get_campaign_id(campaign_store)
 
-    # Analyze chat entries and show selection menu
-    analysis = analyze_chat_entries()
-    if analysis is None:
-        print("Failed to analyze chat entries. Stopping automation.")
-        return
+    if worker_id is not None:
+        total_chats = get_queue_counts(campaign_store, campaign_id).get('pending', 0)
+        chat_entries = iter_work_queue(campaign_store, campaign_id, worker_id)
+        print(f"[QUEUE] Worker {worker_id} pulling from shared queue ({total_chats} chats pending)")
+    else:
+        print("Starting to process target chats from txt/chat_name.txt...")
 
-    # Show interactive selection menu
-    selection = show_selection_menu(analysis)
-    if selection is None:
-        print("No selection made. Stopping automation.")
-        return
+        # Analyze chat entries and show selection menu
+        analysis = analyze_chat_entries()
+        if analysis is None:
+            print("Failed to analyze chat entries. Stopping automation.")
+            return
+
+        # Show interactive selection menu
+        selection = show_selection_menu(analysis)
+        if selection is None:
+            print("No selection made. Stopping automation.")
+            return
 
-    # Extract selected chat names (only the chat names, not the line numbers)
-    target_chat_names = [entry[1] for entry in selection['entries']]
+        # Chats that keep failing to be found go to the end of the queue (or are skipped)
+        selection['entries'] = order_entries_by_not_found(selection['entries'])
 
-    print(f"\n[TARGET] Selected Processing Plan:")
-    print(f"   - Mode: {selection['mode']}")
-    print(f"   - Rows: {selection['start']} to {selection['end']}")
-    print(f"   - Total chats to process: {len(target_chat_names)}")
-    print(f"   - First few chats: {', '.join(target_chat_names[:3])}{'...' if len(target_chat_names) > 3 else ''}")
-    print("="*60)
+        # Extract selected chat names (only the chat names, not the line numbers)
+        target_chat_names = [entry[1] for entry in selection['entries']]
+        total_chats = len(target_chat_names)
+        chat_entries = selection['entries']
+
+        print(f"\n[TARGET] Selected Processing Plan:")
+        print(f"   - Mode: {selection['mode']}")
+        print(f"   - Rows: {selection['start']} to {selection['end']}")
+        print(f"   - Total chats to process: {total_chats}")
+        print(f"   - First few chats: {', '.join(target_chat_names[:3])}{'...' if total_chats > 3 else ''}")
+        print("="*60)
 
     # Read the daily message
     daily_message = read_daily_message()
@@ -1728,7 +3848,7 @@ def process_target_chats(driver):
     print(f"Daily message to send: {daily_message}")
 
     # Check and transfer daily photo
-    photo_path = get_daily_photo_path()
+    photo_path = optimize_daily_photo(get_daily_photo_path())
     device_photo_path = None
     send_photo = False
 
@@ -1745,24 +3865,46 @@ def process_target_chats(driver):
     else:
         print("No daily photo found in daily_photos/ folder. Will send text messages only.")
 
-    # Load previously processed chats for today
-    processed_chats, log_file = load_processed_chats_today()
+    # Today's campaign in the store tells which chats were already processed
+    get_campaign_id(campaign_store, message=daily_message)
+    print(f"Loaded {count_processed_chats(campaign_store, campaign_id)} previously processed chats from {CAMPAIGN_STORE_FILE}")
     overall_start = time.time()
 
     successful_chats = []
     failed_chats = []
 
-    # Counter for photo re-transfer every 5 chats
+    # Counter for photo re-check every 5 chats
     chats_since_photo_transfer = 0
-    PHOTO_TRANSFER_INTERVAL = 5  # Re-transfer photo every 5 chats
+    PHOTO_TRANSFER_INTERVAL = 5  # Re-check photo every 5 chats
 
-    print(f"\n[INFO] Starting to process {len(target_chat_names)} target chats")
-
-    for i, (original_row, target_chat_name) in enumerate(selection['entries']):
+    if FORWARD_STAGING_CHAT:
+        forward_entries = chat_entries
+        if worker_id is not None:
+            # Never claim chats the forward path skips: other workers take them per chat meanwhile
+            forward_entries = iter_work_queue(campaign_store, campaign_id, worker_id, accept=is_forwardable_chat)
+        try:
+            forwarded = run_forward_campaign(driver, forward_entries, daily_message, device_photo_path if send_photo else None,
+                                             campaign_store, campaign_id)
+            successful_chats.extend(forwarded or [])
+        except Exception as forward_error:
+            print(f"[FORWARD] Forwarding stopped by an error, continuing per chat: {forward_error}")
+            go_back_to_chat_list(driver)
+        # Anything still claimed (a batch cut short by an error) goes back to pending for the per-chat path
+        release_claims(campaign_store, campaign_id, SELECTED_ADB_DEVICE)
+        if worker_id is not None:
+            chat_entries = iter_work_queue(campaign_store, campaign_id, worker_id)
+
+    print(f"\n[INFO] Starting to process {total_chats} target chats")
+
+    for i, (original_row, target_chat_name) in enumerate(chat_entries):
         chat_processing_start = time.time()
 
-        # Check if driver session is still alive before processing
-        if not is_driver_alive(driver):
+        # A device that keeps failing is paused (single device) or handed back to the queue (worker)
+        if not wait_for_circuit_breaker(worker_mode=worker_id is not None):
+            break
+
+        # The heartbeat flags a dead session, no round trip before every chat
+        if is_session_suspect(driver):
             print(f"[WARNING] Driver session lost, attempting recovery...")
             recovered_driver = recover_session(driver, max_attempts=3)
             if recovered_driver:
@@ -1773,29 +3915,29 @@ def process_target_chats(driver):
                 break
             # Re-transfer photo if needed after session recovery
             if photo_path and send_photo:
-                print(f"[RECOVERY] Re-transferring photo after session recovery...")
+                print(f"[RECOVERY] Re-checking photo after session recovery...")
                 device_photo_path = transfer_photo_to_device(driver, photo_path)
                 if not device_photo_path:
                     send_photo = False
                     print("[RECOVERY] Photo re-transfer failed, will send text only")
 
         # Skip if already processed today
-        if target_chat_name in processed_chats:
-            print(f"[\033[92m{i+1}/{len(target_chat_names)}\033[0m] [SKIP] Already processed today: {target_chat_name} (Row {original_row})")
+        if is_chat_processed(campaign_store, campaign_id, target_chat_name):
+            print(f"[\033[92m{i+1}/{total_chats}\033[0m] [SKIP] Already processed today: {target_chat_name} (Row {original_row})")
             continue
 
-        print(f"\n[\033[92m{i+1}/{len(target_chat_names)}\033[0m] Processing: {target_chat_name} (Row {original_row})")
+        print(f"\n[\033[92m{i+1}/{total_chats}\033[0m] Processing: {target_chat_name} (Row {original_row})")
 
-        # Re-transfer photo every 5 chats if photo sending is enabled
+        # Re-check the photo every 5 chats (pushed again only if it is missing or changed)
         if send_photo and chats_since_photo_transfer >= PHOTO_TRANSFER_INTERVAL:
-            print(f"[PHOTO] Re-transferring photo (every {PHOTO_TRANSFER_INTERVAL} chats)...")
-            new_photo_path = get_daily_photo_path()
+            print(f"[PHOTO] Re-checking photo on device (every {PHOTO_TRANSFER_INTERVAL} chats)...")
+            new_photo_path = optimize_daily_photo(get_daily_photo_path())
             if new_photo_path:
                 new_device_photo_path = transfer_photo_to_device(driver, new_photo_path)
                 if new_device_photo_path:
                     device_photo_path = new_device_photo_path
                     chats_since_photo_transfer = 0
-                    print(f"[PHOTO] Photo re-transferred successfully")
+                    print(f"[PHOTO] Photo available on device")
                 else:
                     print(f"[PHOTO] Re-transfer failed, using previous photo")
             else:
@@ -1807,13 +3949,15 @@ def process_target_chats(driver):
         # Search for the specific chat using search functionality with enhanced error handling
         search_start = time.time()
         try:
-            chat_found = safe_operation(search_and_find_chat, driver, clean_name, retry_count=1)
+            chat_found = open_chat(driver, target_chat_name, clean_name, probe=is_chat_deferred(target_chat_name))
         except Exception as search_error:
             print(f"[ERROR] Search function failed: {search_error}")
-            # Try session recovery if it's a driver-related error
-            driver_errors = ["session", "connection", "socket", "timeout", "network"]
-            if any(error_term in str(search_error).lower() for error_term in driver_errors):
-                print("[ERROR] Detected driver-related error, attempting session recovery...")
+            # Recover only when the error type says the session is gone, selector timeouts are not
+            error_type = classify_error(search_error, driver)
+            if ERROR_POLICIES[error_type]['action'] == 'recover':
+                print(f"[ERROR] {error_type}, attempting session recovery...")
+                record_device_failure(error_type)
+                ERROR_STATS[error_type]['recoveries'] += 1
                 recovered_driver = recover_session(driver, max_attempts=2)
                 if recovered_driver:
                     driver = recovered_driver
@@ -1831,24 +3975,29 @@ def process_target_chats(driver):
         search_time = time.time() - search_start
 
         if chat_found:
+            clear_not_found_chat(target_chat_name)
             try:
                 # Chat is already opened by search_and_find_chat function
                 # Prepare personalized message with @mention
                 personalized_message = f"@{clean_name} {daily_message}"
+                phone_number = normalize_phone_number(target_chat_name)
                 print(f"[MESSAGE] Personalized: @{clean_name}")
 
                 # Send the daily message (with photo if available)
+                mark_recipient_status(campaign_store, campaign_id, target_chat_name, 'sending', original_row)
                 message_start = time.time()
                 try:
                     if send_photo:
-                        success = send_message_with_photo(driver, personalized_message)
+                        success = send_message_with_photo(driver, personalized_message, device_photo_path, phone_number)
                     else:
                         success = send_message_to_chat(driver, personalized_message)
                 except Exception as message_error:
                     print(f"[ERROR] Message sending failed: {message_error}")
-                    # Check if it's a session error
-                    if not is_driver_alive(driver):
-                        print(f"[WARNING] Session lost during message sending, attempting recovery...")
+                    error_type = classify_error(message_error, driver)
+                    if ERROR_POLICIES[error_type]['action'] == 'recover':
+                        print(f"[WARNING] {error_type} during message sending, attempting recovery...")
+                        record_device_failure(error_type)
+                        ERROR_STATS[error_type]['recoveries'] += 1
                         driver = recover_session(driver)
                         if driver:
                             # Try to find and open the chat again
@@ -1856,7 +4005,7 @@ def process_target_chats(driver):
                             if chat_found_retry:
                                 try:
                                     if send_photo:
-                                        success = send_message_with_photo(driver, personalized_message)
+                                        success = send_message_with_photo(driver, personalized_message, device_photo_path, phone_number)
                                     else:
                                         success = send_message_to_chat(driver, personalized_message)
                                 except:
@@ -1873,8 +4022,12 @@ def process_target_chats(driver):
                     message_type = "message + photo" if send_photo else "message"
                     print(f"[SUCCESS] Successfully sent {message_type} to: {target_chat_name} (Row {original_row})")
                     successful_chats.append((original_row, target_chat_name))
-                    processed_chats.add(target_chat_name)
-                    save_processed_chat(log_file, f"Row{original_row}: {target_chat_name}")
+                    note_successful_send()
+                    record_device_success()
+                    # Unconfirmed sends count as done (no resend), flagged in the attempt for review
+                    record_chat_result(campaign_store, campaign_id, original_row, target_chat_name, 'done',
+                                       error_class=SEND_UNCONFIRMED if success == SEND_UNCONFIRMED else None,
+                                       search_time=search_time, message_time=message_time)
 
                     # Increment counter for photo re-transfer
                     if send_photo:
@@ -1884,31 +4037,39 @@ def process_target_chats(driver):
                     message_type = "message + photo" if send_photo else "message"
                     print(f"[ERROR] Failed to send {message_type} to: {target_chat_name} (Row {original_row})")
                     failed_chats.append((original_row, target_chat_name))
-                    processed_chats.add(target_chat_name)
-                    save_processed_chat(log_file, f"FAILED Row{original_row}: {target_chat_name}")
+                    record_chat_result(campaign_store, campaign_id, original_row, target_chat_name, 'failed',
+                                       error_class='send_failed', search_time=search_time, message_time=message_time)
 
-                # Go back to chat list
+                # Go back to chat list (or only to the search results in a search session)
                 back_start = time.time()
-                print(f"🔙 Going back to chat list...")
+                print(f"🔙 Going back to {'search results' if SEARCH_SESSION else 'chat list'}...")
                 if driver:  # Check if driver is not None
                     try:
-                        driver.press_keycode(4)  # KEYCODE_BACK
-                        time.sleep(1)
+                        back_targets = (SCREEN_HOME,) + SEARCH_SESSION_SCREENS if SEARCH_SESSION else SCREEN_HOME
+                        screen, _ = navigate_to(driver, back_targets)
                         back_time = time.time() - back_start
-                        print(f"[CHECKED] Returned to chat list in {back_time:.2f}s")
+                        if screen == SCREEN_HOME or screen in SEARCH_SESSION_SCREENS:
+                            print(f"[CHECKED] Returned to {screen.replace('_', ' ')} in {back_time:.2f}s")
+                        else:
+                            print(f"[WARNING] Ended on '{screen}' instead of the chat list after {back_time:.2f}s")
                     except Exception as back_error:
                         print(f"[ERROR] Failed to go back to chat list: {back_error}")
                         back_time = time.time() - back_start
-                        # Try session recovery
-                        driver = recover_session(driver)
-                        if not driver:
-                            print(f"[ERROR] Session recovery failed, stopping automation")
-                            break
+                        error_type = classify_error(back_error, driver)
+                        if ERROR_POLICIES[error_type]['action'] == 'recover':
+                            record_device_failure(error_type)
+                            ERROR_STATS[error_type]['recoveries'] += 1
+                            driver = recover_session(driver)
+                            if not driver:
+                                print(f"[ERROR] Session recovery failed, stopping automation")
+                                break
                 else:
                     print(f"[ERROR] Driver is None, cannot go back to chat list")
                     back_time = time.time() - back_start
 
                 total_chat_time = time.time() - chat_processing_start
+                record_metric("back_to_list", back_time)
+                record_metric("chat_total", total_chat_time, "ok" if success else "fail")
                 print(f"[TIME] Total time for {target_chat_name}: {total_chat_time:.2f}s")
                 print(f"   - Search + open: {search_time:.2f}s")
                 print(f"   - Message sending: {message_time:.2f}s")
@@ -1918,6 +4079,8 @@ def process_target_chats(driver):
             except Exception as e:
                 print(f"[ERROR] Error processing chat '{target_chat_name}' (Row {original_row}): {str(e)}")
                 failed_chats.append((original_row, target_chat_name))
+                record_chat_result(campaign_store, campaign_id, original_row, target_chat_name, 'failed',
+                                   error_class=classify_error(e), error=str(e), search_time=search_time)
                 go_back_to_chat_list(driver)
                 continue
         else:
@@ -1931,8 +4094,9 @@ def process_target_chats(driver):
             log_not_found_chat(target_chat_name, original_row)
 
             failed_chats.append((original_row, target_chat_name))
-            processed_chats.add(target_chat_name)
-            save_processed_chat(log_file, f"NOT_FOUND Row{original_row}: {target_chat_name}")
+            record_chat_result(campaign_store, campaign_id, original_row, target_chat_name, 'not_found',
+                               error_class='not_found', search_time=search_time)
+            record_metric("chat_total", time.time() - chat_processing_start, "not_found")
 
             print(f"[NEXT] Quickly moving to next chat...")
             continue
@@ -1940,10 +4104,28 @@ def process_target_chats(driver):
     overall_time = time.time() - overall_start
     print(f"\n[INFO] Processing complete! Total time: {overall_time:.2f}s")
     print(f"[INFO] Summary:")
-    print(f"   - Total target chats: {len(target_chat_names)}")
+    print(f"   - Total target chats: {total_chats}")
     print(f"   - Successfully processed: {len(successful_chats)}")
     print(f"   - Failed/Not found: {len(failed_chats)}")
-    print(f"   - Average time per chat: {overall_time/len(target_chat_names):.2f}s")
+    print(f"   - Average time per chat: {overall_time/max(total_chats, 1):.2f}s")
+    print(f"   - Resolved-chat cache: {RESOLVED_CHAT_CACHE_STATS['hits']} hits, {RESOLVED_CHAT_CACHE_STATS['misses']} misses, {RESOLVED_CHAT_CACHE_STATS['invalidations']} invalidations")
+    if photo_path:
+        print(f"   - Photo cache: {PHOTO_CACHE_STATS['hits']} hits, {PHOTO_CACHE_STATS['misses']} misses, {PHOTO_CACHE_STATS['bytes_saved'] / (1024 * 1024):.1f}MB not re-pushed")
+    save_locator_stats()
+    print(f"   - Locator stats: {CAMPAIGN_STORE_FILE} (python whatsapp.py --locator-stats)")
+    save_latency_model()
+    print_latency_model()
+    print_recovery_stats()
+    print_error_stats()
+    print_heartbeat_stats()
+    print_text_input_stats()
+    if SEARCH_SESSION:
+        print(f"   - Search session: reused {SEARCH_SESSION_STATS['reused']}x, search opened {SEARCH_SESSION_STATS['opened']}x")
+    if FORWARD_STAGING_CHAT:
+        print(f"   - Forwarded: {FORWARD_STATS['forwarded']} chats in {FORWARD_STATS['batches']} batches, {FORWARD_STATS['unresolved']} unresolved, {FORWARD_STATS['failed_batches']} failed batches")
+    print_metrics_summary()
+    write_metrics_textfile()
+    print(f"   - Metrics: {get_metrics_jsonl_file()} and {get_metrics_prom_file()}")
 
     if successful_chats:
         print(f"\n[SUCCESS] Successfully sent messages to {len(successful_chats)} chats:")
@@ -1959,36 +4141,331 @@ def process_target_chats(driver):
     summary_message = f"Script completed - Processed: {len(successful_chats)}, Failed: {len(failed_chats)}, Total time: {overall_time:.2f}s"
     log_script_event("end", summary_message)
 
+def revalidate_not_found_chats(driver):
+    """Re-check every chat in the negative cache with a full search, clearing the ones found again"""
+    chats = get_not_found_chats()
+    print(f"\n[REVALIDATE] Re-checking {len(chats)} chats from the negative cache...")
+    found_again = []
+
+    for i, chat_name in enumerate(chats):
+        clean_name = clean_chat_name(chat_name)
+        print(f"\n[REVALIDATE] [{i+1}/{len(chats)}] {chat_name}")
+        try:
+            chat_found = search_and_find_chat(driver, clean_name)
+        except Exception as e:
+            print(f"[REVALIDATE] Search failed: {e}")
+            continue
+
+        if chat_found:
+            found_again.append(chat_name)
+            clear_not_found_chat(chat_name)
+            go_back_to_chat_list(driver)
+
+    print(f"\n[REVALIDATE] Done: {len(found_again)}/{len(chats)} chats found again and cleared")
+    for chat_name in found_again:
+        print(f"  - {chat_name}")
+    log_script_event("revalidate", f"Negative cache revalidated - {len(found_again)}/{len(chats)} found again")
+
+def match_device_config_name(model):
+    """Find the DEVICE_CONFIGS entry for an adb model string (e.g. 'Redmi_9A' -> 'Redmi 9A')"""
+    normalized_model = model.replace('_', ' ').strip().lower()
+    if not normalized_model or normalized_model == 'unknown':
+        return None
+    for device_name in DEVICE_CONFIGS:
+        normalized_name = device_name.lower()
+        if normalized_model == normalized_name or normalized_model in normalized_name or normalized_name in normalized_model:
+            return device_name
+    return None
+
+def is_appium_server_running(port):
+    """Check if an Appium server answers /status on the given port"""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/status", timeout=2) as response:
+            return response.status == 200
+    except Exception:
+        return False
+
+def start_appium_server(port, timeout=30):
+    """Start an Appium server on the given port (same flags as start_appium_device*.bat)
+
+    Returns (process, log file), both None when appium isn't installed.
+    """
+    appium_cmd = shutil.which('appium')
+    if not appium_cmd:
+        print(f"[MULTI] 'appium' not found in PATH, start the server for port {port} manually")
+        return None, None
+
+    log_file = open(f"txt/appium_{port}.log", 'a', encoding='utf-8')
+    process = subprocess.Popen([appium_cmd, 'server', '--port', str(port), '--session-override', '--log-level', 'info'],
+                               stdout=log_file, stderr=subprocess.STDOUT)
+    wait_start = time.time()
+    while time.time() - wait_start < timeout:
+        if is_appium_server_running(port):
+            print(f"[MULTI] Appium server ready on port {port} ({time.time() - wait_start:.1f}s)")
+            return process, log_file
+        time.sleep(1)
+    print(f"[MULTI] Appium server on port {port} did not come up within {timeout}s")
+    return process, log_file
+
+# What the coordinator started and has to stop again: workers and Appium servers (Popen, log file)
+MULTI_DEVICE = {'workers': [], 'servers': [], 'campaign_id': None}
+WORKER_STOP_TIMEOUT = 30  # Seconds a terminated worker gets to release its chats and quit its session
+
+def stop_appium_servers(servers):
+    """Stop Appium servers this script started (a list of (process, log file)) and close their logs"""
+    while servers:
+        process, log_file = servers.pop()
+        if process.poll() is None:
+            print(f"[MULTI] Stopping Appium server (pid {process.pid})")
+            process.terminate()
+            try:
+                process.wait(timeout=SESSION_QUIT_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        log_file.close()
+
+def stop_multi_device():
+    """Coordinator exit: stop workers still running, close their logs, then stop the servers it started"""
+    for worker in MULTI_DEVICE['workers']:
+        if worker['finished']:
+            continue
+        worker['finished'] = True
+        if worker['process'].poll() is None:
+            print(f"[MULTI] Stopping worker {worker['udid']}...")
+            worker['process'].terminate()
+            try:
+                worker['process'].wait(timeout=WORKER_STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                worker['process'].kill()
+                worker['process'].wait()
+        worker['log'].close()
+        try:
+            # A killed worker couldn't hand its claimed chats back itself
+            release_claims(get_campaign_store(), MULTI_DEVICE['campaign_id'], worker['udid'])
+        except Exception as e:
+            print(f"[MULTI] Failed to release chats of {worker['udid']}: {e}")
+    stop_appium_servers(MULTI_DEVICE['servers'])
+
+def run_multi_device(base_port):
+    """Run one worker process per connected device, all pulling chats from one shared queue"""
+    print("\n" + "="*60)
+    print("[MULTI] MULTI-DEVICE CAMPAIGN")
+    print("="*60)
+
+    devices = get_adb_devices()
+    if not devices:
+        print("[ERROR] No ADB devices found!")
+        return
+
+    analysis = analyze_chat_entries()
+    if analysis is None:
+        print("Failed to analyze chat entries. Stopping automation.")
+        return
+    selection = show_selection_menu(analysis)
+    if selection is None:
+        print("No selection made. Stopping automation.")
+        return
+    entries = order_entries_by_not_found(selection['entries'])
+
+    # One campaign per day: re-running after a crash resumes the same queue
+    os.makedirs('txt', exist_ok=True)
+    today = get_gmt7_time().strftime('%Y%m%d')
+    campaign_store = get_campaign_store()
+    campaign_id = get_campaign_id(campaign_store)
+    MULTI_DEVICE['campaign_id'] = campaign_id
+    released = release_claims(campaign_store, campaign_id)
+    if released:
+        print(f"[MULTI] Re-queued {released} chats claimed by workers of a previous run")
+    added = fill_work_queue(campaign_store, campaign_id, entries)
+    counts = get_queue_counts(campaign_store, campaign_id)
+    print(f"[MULTI] Campaign queue in {CAMPAIGN_STORE_FILE}: {added} new chats, status counts: {counts}")
+    if counts.get('sending'):
+        print(f"[WARNING] {counts['sending']} chats were mid-send when a worker died - check them manually, they are not re-sent")
+
+    try:
+        workers = MULTI_DEVICE['workers']
+        for idx, device in enumerate(devices):
+            config_name = match_device_config_name(device['model'])
+            if not config_name:
+                print(f"\n[MULTI] No coordinate config matches model '{device['model']}' ({device['udid']})")
+                selected_config = select_device_config()
+                if selected_config is None:
+                    print(f"[MULTI] Skipping device {device['udid']}")
+                    continue
+                config_name = next(name for name, config in DEVICE_CONFIGS.items() if config is selected_config)
+
+            port = base_port + idx
+            if not is_appium_server_running(port):
+                process, log_file = start_appium_server(port)
+                if process is not None:
+                    MULTI_DEVICE['servers'].append((process, log_file))
+
+            safe_udid = re.sub(r'[^A-Za-z0-9_.-]', '_', device['udid'])
+            log_path = f"txt/worker_{safe_udid}_{today}.log"
+            cmd = [sys.executable, '-u', os.path.abspath(__file__), '--worker',
+                   '--udid', device['udid'],
+                   '--port', str(port),
+                   '--system-port', str(MULTI_DEVICE_SYSTEM_PORT_BASE + idx),
+                   '--device-config', config_name]
+            if FORWARD_STAGING_CHAT:
+                cmd += ['--forward-via', FORWARD_STAGING_CHAT]
+            if not SEARCH_SESSION:
+                cmd.append('--no-search-session')
+            if STANDBY_ENABLED:
+                cmd.append('--standby')
+            if not HEARTBEAT_ENABLED:
+                cmd.append('--no-heartbeat')
+            worker_env = dict(os.environ, PYTHONIOENCODING='utf-8')
+            log_handle = open(log_path, 'a', encoding='utf-8')
+            process = subprocess.Popen(cmd, stdout=log_handle, stderr=subprocess.STDOUT, env=worker_env)
+            workers.append({'udid': device['udid'], 'process': process, 'log': log_handle, 'finished': False})
+            print(f"[MULTI] Worker {idx+1}: {device['udid']} ({config_name}) on port {port}, log: {log_path}")
+
+        if not workers:
+            print("[ERROR] No workers started")
+            return
+
+        campaign_start = time.time()
+        while not all(worker['finished'] for worker in workers):
+            time.sleep(10)
+            for worker in workers:
+                if worker['finished'] or worker['process'].poll() is None:
+                    continue
+                worker['finished'] = True
+                worker['log'].close()
+                released = release_claims(campaign_store, campaign_id, worker['udid'])
+                print(f"[MULTI] Worker {worker['udid']} exited (code {worker['process'].returncode}), re-queued {released} claimed chats")
+            counts = get_queue_counts(campaign_store, campaign_id)
+            elapsed = time.time() - campaign_start
+            done = counts.get('done', 0) + counts.get('failed', 0) + counts.get('not_found', 0)
+            print(f"[MULTI] {elapsed:.0f}s - done: {counts.get('done', 0)}, failed: {counts.get('failed', 0)}, "
+                  f"not found: {counts.get('not_found', 0)}, pending: {counts.get('pending', 0)}, "
+                  f"in progress: {counts.get('claimed', 0) + counts.get('sending', 0)} "
+                  f"({done / max(elapsed, 1) * 3600:.0f} chats/hour)")
+
+        counts = get_queue_counts(campaign_store, campaign_id)
+        print(f"\n[MULTI] Campaign finished in {time.time() - campaign_start:.0f}s: {counts}")
+        if counts.get('pending'):
+            print(f"[MULTI] {counts['pending']} chats still pending (all workers stopped) - run again to resume")
+        log_script_event("multi_device", f"Campaign finished with {len(workers)} devices - {counts}")
+    finally:
+        # Normally every worker has exited; after an error or Ctrl+C this stops the rest
+        stop_multi_device()
+
+# What cleanup_run has to undo; filled in by main() as the run sets things up
+RUN_STATE = {'worker_id': None, 'cleaned_up': False}
+
+def cleanup_run(driver=None):
+    """Undo everything the run changed, once: worker claims, coordinator workers/servers, screen
+    setting, session, standby servers
+
+    Called from main()'s finally and from signal_handler (Ctrl+C), each step on its own so one
+    failure doesn't skip the rest.
+    """
+    if RUN_STATE['cleaned_up']:
+        return
+    RUN_STATE['cleaned_up'] = True
+    driver = HEARTBEAT['driver'] or driver  # A recovery may have replaced the session
+    if RUN_STATE['worker_id']:
+        try:
+            # Chats claimed but not yet being sent go back to the shared queue
+            store = get_campaign_store()
+            if store.in_transaction:  # Interrupted mid-transaction
+                store.execute("ROLLBACK")
+            release_claims(store, get_campaign_id(store), RUN_STATE['worker_id'])
+        except Exception as e:
+            print(f"[WORKER] Failed to release claimed chats: {e}")
+    stop_multi_device()
+    stop_heartbeat()
+    restore_stay_awake(driver)
+    if driver:
+        print("Closing Appium session...")
+        quit_driver_quietly(driver, timeout=SESSION_QUIT_TIMEOUT)
+    stop_standby_servers()
+
 def main():
     """Main function to control screen and unlock"""
-    global APPIUM_PORT
+    global APPIUM_PORT, APPIUM_SYSTEM_PORT, SELECTED_ADB_DEVICE, SELECTED_DEVICE_CONFIG, SELECTED_DEVICE_NAME
+    global FORWARD_STAGING_CHAT, SEARCH_SESSION, STANDBY_ENABLED, HEARTBEAT_ENABLED
     driver = None
 
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description='WhatsApp automation script')
     parser.add_argument('--port', type=int, default=4723,
                       help='Appium server port (default: 4723)')
+    parser.add_argument('--revalidate-not-found', action='store_true',
+                      help='Re-check all chats in the not-found cache instead of sending messages')
+    parser.add_argument('--multi-device', action='store_true',
+                      help='Run all connected devices in parallel from one shared queue (ports start at --port)')
+    # Worker options, passed by --multi-device to each device process
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--udid', help=argparse.SUPPRESS)
+    parser.add_argument('--system-port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--device-config', help=argparse.SUPPRESS)
+    parser.add_argument('--import-history', action='store_true',
+                      help='Import the old txt/ processed, not_found and script_log files into the campaign store and exit')
+    parser.add_argument('--locator-stats', action='store_true',
+                      help='Show which selector wins for each element per device model and exit')
+    parser.add_argument('--forward-via', metavar='CHAT',
+                      help='Send the message once to CHAT, then forward it to the target chats in batches of 5')
+    parser.add_argument('--no-search-session', action='store_true',
+                      help='Go back to the chat list and re-open search for every chat')
+    parser.add_argument('--standby', action='store_true',
+                      help=f'Keep a warm standby Appium server on port +{STANDBY_PORT_OFFSET} for fast failover')
+    parser.add_argument('--no-heartbeat', action='store_true',
+                      help='Check the session with a round trip before every chat instead of a background heartbeat')
     args = parser.parse_args()
+    HEARTBEAT_ENABLED = HEARTBEAT_ENABLED and not args.no_heartbeat
+    FORWARD_STAGING_CHAT = args.forward_via or FORWARD_STAGING_CHAT
+    STANDBY_ENABLED = STANDBY_ENABLED or args.standby
+    SEARCH_SESSION = SEARCH_SESSION and not args.no_search_session
+
+    if args.import_history:
+        import_txt_history(get_campaign_store())
+        return
+
+    if args.locator_stats:
+        print_locator_stats()
+        return
+
+    if args.multi_device:
+        run_multi_device(args.port)
+        return
 
     # Set the Appium port from command line argument
     APPIUM_PORT = args.port
     print(f"[CONFIG] Using Appium server port: {APPIUM_PORT}")
 
+    RUN_STATE['worker_id'] = args.udid if args.worker else None
     try:
-        # First, select ADB device
-        adb_device = select_adb_device()
-        if adb_device is None:
-            print("[ERROR] No ADB device selected. Exiting...")
-            return
-
-        # Second, select device configuration (coordinate settings)
-        device_config = select_device_config()
-        if device_config is None:
-            print("[ERROR] No device configuration selected. Exiting...")
-            return
+        if args.worker:
+            # Non-interactive: the coordinator already picked device, coordinates and chats
+            SELECTED_ADB_DEVICE = args.udid
+            SELECTED_DEVICE_CONFIG = DEVICE_CONFIGS[args.device_config]
+            SELECTED_DEVICE_NAME = args.device_config
+            APPIUM_SYSTEM_PORT = args.system_port
+            print(f"[WORKER] Device {args.udid} ({args.device_config}), queue: {CAMPAIGN_STORE_FILE}")
+        else:
+            # First, select ADB device
+            adb_device = select_adb_device()
+            if adb_device is None:
+                print("[ERROR] No ADB device selected. Exiting...")
+                return
+
+            # Second, select device configuration (coordinate settings)
+            device_config = select_device_config()
+            if device_config is None:
+                print("[ERROR] No device configuration selected. Exiting...")
+                return
 
         print("\nStarting Appium session...")
         driver = setup_driver()
+        if STANDBY_ENABLED:
+            STANDBY['port'] = APPIUM_PORT + STANDBY_PORT_OFFSET
+            STANDBY['system_port'] = (APPIUM_SYSTEM_PORT or MULTI_DEVICE_SYSTEM_PORT_BASE) + STANDBY_PORT_OFFSET
+            start_standby_rebuild()
+        start_heartbeat(driver)
+        enable_stay_awake(driver)
         
         print("Attempting to turn on screen and unlock device...")
         success = turn_screen_on_and_unlock(driver)
@@ -2001,11 +4478,15 @@ def main():
             
             if whatsapp_success:
                 print("WhatsApp is now open and ready for use!")
+                check_locator_stats_version(driver)
                 # Brief pause to ensure app is fully loaded
                 time.sleep(1.8)
                 
-                # Process target chats from txt/chat_name.txt and send daily messages
-                process_target_chats(driver)
+                if args.revalidate_not_found:
+                    revalidate_not_found_chats(driver)
+                else:
+                    # Process target chats from txt/chat_name.txt and send daily messages
+                    process_target_chats(driver, worker_id=args.udid if args.worker else None)
                 
             else:
                 print("Failed to open WhatsApp, but device is unlocked")
@@ -2022,9 +4503,7 @@ def main():
         print("4. Device is detected (adb devices)")
         
     finally:
-        if driver:
-            print("Closing Appium session...")
-            driver.quit()
+        cleanup_run(driver)
 
 if __name__ == "__main__":
     # Set up signal handlers for stopping